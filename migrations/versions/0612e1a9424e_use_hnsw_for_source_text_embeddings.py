@@ -0,0 +1,31 @@
+"""Use HNSW for source text embeddings
+
+Revision ID: 0612e1a9424e
+Revises: e392df570767
+Create Date: 2025-08-18 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0612e1a9424e'
+down_revision = 'e392df570767'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("DROP INDEX IF EXISTS idx_source_text_embedding")
+    op.execute(
+        "CREATE INDEX idx_source_text_embedding ON source_texts "
+        "USING hnsw (embedding halfvec_cosine_ops) WITH (m = 24, ef_construction = 128)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_source_text_embedding")
+    op.execute(
+        "CREATE INDEX idx_source_text_embedding ON source_texts "
+        "USING ivfflat (embedding halfvec_cosine_ops)"
+    )
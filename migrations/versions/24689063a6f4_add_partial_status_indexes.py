@@ -0,0 +1,50 @@
+"""Add partial status indexes for OCR pages and queries
+
+Revision ID: 24689063a6f4
+Revises: 557b2a637c72
+Create Date: 2025-08-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '24689063a6f4'
+down_revision = '557b2a637c72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Replace the full status index with a partial one over unfinished pages
+    op.execute("DROP INDEX IF EXISTS idx_ocr_status")
+    op.create_index(
+        'idx_ocr_status_pending',
+        'ocr_pages',
+        ['status'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'processing', 'failed')")
+    )
+
+    op.create_index(
+        'idx_queries_status_pending',
+        'queries',
+        ['status'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'processing')")
+    )
+
+    op.create_index(
+        'idx_queries_conversation_sequence',
+        'queries',
+        ['conversation_id', 'message_sequence'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('idx_queries_conversation_sequence', table_name='queries')
+    op.drop_index('idx_queries_status_pending', table_name='queries')
+    op.drop_index('idx_ocr_status_pending', table_name='ocr_pages')
+    op.create_index('idx_ocr_status', 'ocr_pages', ['status'], unique=False)
@@ -0,0 +1,24 @@
+"""Store SourceText content hash as raw BYTEA digest
+
+Revision ID: 557b2a637c72
+Revises: e9082891cac7
+Create Date: 2025-08-18 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '557b2a637c72'
+down_revision = 'e9082891cac7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Convert 64-char hex SHA-256 strings into their 32-byte binary form
+    op.execute("ALTER TABLE source_texts ALTER COLUMN content_hash TYPE bytea USING decode(content_hash, 'hex')")
+
+
+def downgrade():
+    op.execute("ALTER TABLE source_texts ALTER COLUMN content_hash TYPE varchar(64) USING encode(content_hash, 'hex')")
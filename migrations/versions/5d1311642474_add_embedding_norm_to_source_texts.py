@@ -0,0 +1,27 @@
+"""Add embedding_norm to source_texts
+
+Revision ID: 5d1311642474
+Revises: 83c442d67186
+Create Date: 2025-08-18 18:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1311642474'
+down_revision = '83c442d67186'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('source_texts', sa.Column('embedding_norm', sa.Float(), nullable=True))
+
+    # Backfill existing chunks; new rows get the norm from the application at insert time
+    op.execute("UPDATE source_texts SET embedding_norm = l2_norm(embedding) WHERE embedding IS NOT NULL")
+
+
+def downgrade():
+    op.drop_column('source_texts', 'embedding_norm')
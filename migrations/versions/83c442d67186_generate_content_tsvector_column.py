@@ -0,0 +1,64 @@
+"""Generate content_tsvector from content instead of a trigger
+
+Revision ID: 83c442d67186
+Revises: b22ca59b282c
+Create Date: 2025-08-18 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '83c442d67186'
+down_revision = 'b22ca59b282c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("DROP TRIGGER IF EXISTS update_source_text_tsvector ON source_texts")
+    op.execute("DROP FUNCTION IF EXISTS update_content_tsvector()")
+
+    # A plain column cannot be altered into a generated one, so recreate it (drops its index too)
+    op.execute("ALTER TABLE source_texts DROP COLUMN content_tsvector")
+    op.execute("""
+        ALTER TABLE source_texts
+        ADD COLUMN content_tsvector tsvector
+        GENERATED ALWAYS AS (to_tsvector('dutch', coalesce(content, ''))) STORED
+    """)
+    op.create_index(
+        'idx_source_text_tsvector_gin',
+        'source_texts',
+        ['content_tsvector'],
+        unique=False,
+        postgresql_using='gin'
+    )
+
+
+def downgrade():
+    op.execute("ALTER TABLE source_texts DROP COLUMN content_tsvector")
+    op.execute("ALTER TABLE source_texts ADD COLUMN content_tsvector tsvector")
+    op.execute("UPDATE source_texts SET content_tsvector = to_tsvector('dutch', coalesce(content, ''))")
+    op.create_index(
+        'idx_source_text_tsvector_gin',
+        'source_texts',
+        ['content_tsvector'],
+        unique=False,
+        postgresql_using='gin'
+    )
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_content_tsvector()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.content_tsvector := to_tsvector('dutch', COALESCE(NEW.content, ''));
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER update_source_text_tsvector
+        BEFORE INSERT OR UPDATE OF content ON source_texts
+        FOR EACH ROW
+        EXECUTE FUNCTION update_content_tsvector();
+    """)
@@ -0,0 +1,50 @@
+"""Add trigram indexes on person and place names
+
+Revision ID: b22ca59b282c
+Revises: 0612e1a9424e
+Create Date: 2025-08-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b22ca59b282c'
+down_revision = '0612e1a9424e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.create_index(
+        'idx_person_surname_trgm',
+        'persons',
+        ['surname'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'surname': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'idx_person_given_names_trgm',
+        'persons',
+        ['given_names'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'given_names': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'idx_place_name_trgm',
+        'places',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    op.drop_index('idx_place_name_trgm', table_name='places')
+    op.drop_index('idx_person_given_names_trgm', table_name='persons')
+    op.drop_index('idx_person_surname_trgm', table_name='persons')
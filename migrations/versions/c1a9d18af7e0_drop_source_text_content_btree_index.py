@@ -0,0 +1,24 @@
+"""Drop full-value BTREE index on source_texts.content
+
+Revision ID: c1a9d18af7e0
+Revises: 24689063a6f4
+Create Date: 2025-08-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1a9d18af7e0'
+down_revision = '24689063a6f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyword filtering goes through idx_source_text_tsvector_gin instead
+    op.execute("DROP INDEX IF EXISTS idx_source_text_content")
+
+
+def downgrade():
+    op.create_index('idx_source_text_content', 'source_texts', ['content'], unique=False)
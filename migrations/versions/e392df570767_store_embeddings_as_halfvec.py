@@ -0,0 +1,48 @@
+"""Store embeddings as halfvec
+
+Revision ID: e392df570767
+Revises: c1a9d18af7e0
+Create Date: 2025-08-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e392df570767'
+down_revision = 'c1a9d18af7e0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The vector_cosine_ops index cannot survive the type change, rebuild it afterwards
+    op.execute("DROP INDEX IF EXISTS idx_source_text_embedding")
+    op.execute(
+        "ALTER TABLE source_texts ALTER COLUMN embedding TYPE halfvec(1024) "
+        "USING embedding::halfvec(1024)"
+    )
+    op.execute(
+        "ALTER TABLE queries ALTER COLUMN question_embedding TYPE halfvec(1024) "
+        "USING question_embedding::halfvec(1024)"
+    )
+    op.execute(
+        "CREATE INDEX idx_source_text_embedding ON source_texts "
+        "USING ivfflat (embedding halfvec_cosine_ops)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_source_text_embedding")
+    op.execute(
+        "ALTER TABLE queries ALTER COLUMN question_embedding TYPE vector(1024) "
+        "USING question_embedding::vector(1024)"
+    )
+    op.execute(
+        "ALTER TABLE source_texts ALTER COLUMN embedding TYPE vector(1024) "
+        "USING embedding::vector(1024)"
+    )
+    op.execute(
+        "CREATE INDEX idx_source_text_embedding ON source_texts "
+        "USING ivfflat (embedding vector_cosine_ops)"
+    )
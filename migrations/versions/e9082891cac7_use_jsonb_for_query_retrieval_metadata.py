@@ -0,0 +1,37 @@
+"""Use JSONB for query retrieval metadata
+
+Revision ID: e9082891cac7
+Revises: 834f49f974c7
+Create Date: 2025-08-18 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9082891cac7'
+down_revision = '834f49f974c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Convert retrieval metadata from JSON text to parsed binary JSONB
+    op.execute("ALTER TABLE queries ALTER COLUMN retrieved_chunks TYPE jsonb USING retrieved_chunks::jsonb")
+    op.execute("ALTER TABLE queries ALTER COLUMN similarity_scores TYPE jsonb USING similarity_scores::jsonb")
+
+    # GIN index so containment queries (@>) on retrieved chunks use an index lookup
+    op.create_index(
+        'idx_queries_retrieved_gin',
+        'queries',
+        ['retrieved_chunks'],
+        unique=False,
+        postgresql_using='gin'
+    )
+
+
+def downgrade():
+    op.drop_index('idx_queries_retrieved_gin', table_name='queries')
+
+    op.execute("ALTER TABLE queries ALTER COLUMN similarity_scores TYPE json USING similarity_scores::json")
+    op.execute("ALTER TABLE queries ALTER COLUMN retrieved_chunks TYPE json USING retrieved_chunks::json")
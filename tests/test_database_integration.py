@@ -16,7 +16,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from tests.conftest import BaseTestConfig
 from web_app import Config, create_app
 from web_app.database import db, init_db
-from web_app.database.models import Person, Place, SourceText, TextCorpus
+from web_app.database.models import Marriage, Person, Place, SourceText, TextCorpus
 
 
 class DatabaseTestConfig(BaseTestConfig):
@@ -88,6 +88,11 @@ class TestBusinessLogicConstraints:
             assert person_simple.full_name == "Maria Jansen"
             assert person_simple.display_name == "Jansen, Maria"
 
+            # Memoized names follow changes to the name components
+            person_simple.surname = "de Vries"
+            assert person_simple.full_name == "Maria de Vries"
+            assert person_simple.display_name == "de Vries, Maria"
+
     def test_family_relationship_tracking(self, app):
         """Test our family relationship tracking logic"""
         with app.app_context():
@@ -114,6 +119,26 @@ class TestBusinessLogicConstraints:
             assert mother in child1.parents
             assert len(child1.parents) == 2
 
+    def test_all_marriages_covers_both_sides(self, app):
+        """Test that marriages are found whichever side the person is recorded on"""
+        with app.app_context():
+            db.create_all()
+
+            johannes = Person(given_names="Johannes", surname="Berg")
+            maria = Person(given_names="Maria", surname="Jansen")
+            anna = Person(given_names="Anna", surname="Smit")
+            db.session.add_all([johannes, maria, anna])
+            db.session.flush()
+
+            db.session.add_all([
+                Marriage(person1_id=johannes.id, person2_id=maria.id),
+                Marriage(person1_id=anna.id, person2_id=johannes.id),
+            ])
+            db.session.flush()
+
+            assert len(johannes.all_marriages) == 2
+            assert len(maria.all_marriages) == 1
+
     def test_extraction_metadata_tracking(self, app):
         """Test our extraction metadata tracking"""
         with app.app_context():
@@ -267,6 +292,41 @@ class TestRAGFunctionality:
             assert chunk.content_hash is None  # Not set in this test
 
 
+    def test_conversation_sequence_allocated_on_insert(self, app):
+        """Test that queries in a conversation are numbered by the database"""
+        import uuid
+
+        from web_app.repositories.rag_repository import RAGRepository
+
+        with app.app_context():
+            db.create_all()
+
+            corpus = TextCorpus(name="Test Corpus", description="Test")
+            db.session.add(corpus)
+            db.session.flush()
+
+            repository = RAGRepository(db.session)
+            conversation_id = uuid.uuid4()
+            first = repository.create_query(corpus_id=corpus.id, conversation_id=conversation_id, question="Q1")
+            second = repository.create_query(corpus_id=corpus.id, conversation_id=conversation_id, question="Q2")
+
+            assert first.message_sequence == 1
+            assert second.message_sequence == 2
+
+
+class TestHnswConfiguration:
+    """Test HNSW parameter suggestions in SourceText model"""
+
+    def test_parameters_grow_with_corpus_size(self):
+        """Test that larger corpora get denser graphs and wider searches"""
+        small = SourceText.auto_configure_hnsw(1_000)
+        medium = SourceText.auto_configure_hnsw(500_000)
+        large = SourceText.auto_configure_hnsw(5_000_000)
+
+        assert small['m'] < medium['m'] < large['m']
+        assert small['ef_search'] < medium['ef_search'] < large['ef_search']
+        assert medium['ef_search'] == SourceText.HNSW_EF_SEARCH
+
 
 class TestCosineSimilarity:
     """Test cosine similarity calculation in SourceText model"""
@@ -321,6 +381,35 @@ class TestCosineSimilarity:
         expected = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
         assert similarity == pytest.approx(expected, abs=1e-6)
 
+    def test_returns_python_float(self):
+        """Test that the similarity is returned as a plain float"""
+        assert isinstance(SourceText.calculate_cosine_similarity([1, 0], [1, 0]), float)
+        assert isinstance(SourceText.calculate_cosine_similarity([1, 0], [0, 1]), float)
+
+    def test_precomputed_norms(self):
+        """Test that precomputed norms give the same result as computing them"""
+        vec1 = [1.0, 2.0, 3.0]
+        vec2 = [4.0, 5.0, 6.0]
+        expected = SourceText.calculate_cosine_similarity(vec1, vec2)
+
+        assert SourceText.calculate_cosine_similarity(
+            vec1, vec2, norm_a=np.linalg.norm(vec1), norm_b=np.linalg.norm(vec2)
+        ) == pytest.approx(expected)
+        assert SourceText.calculate_cosine_similarity(
+            vec1, vec2, norm_a=np.linalg.norm(vec1)
+        ) == pytest.approx(expected)
+        assert SourceText.calculate_cosine_similarity(vec1, vec2, norm_a=0.0, norm_b=1.0) == 0.0
+
+    def test_float32_array_input(self):
+        """Test that float32 embeddings match the float64 result"""
+        vec1 = np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32)
+        vec2 = np.array([0.4, 0.3, 0.2, 0.1], dtype=np.float32)
+        similarity = SourceText.calculate_cosine_similarity(vec1, vec2)
+
+        expected = SourceText.calculate_cosine_similarity(vec1.astype(np.float64), vec2.astype(np.float64))
+        assert similarity == pytest.approx(expected, abs=1e-5)
+        assert SourceText.calculate_cosine_similarity(np.zeros(4, dtype=np.float32), vec2) == 0.0
+
     def test_mixed_input_types(self):
         """Test that mixing lists and numpy arrays works"""
         vec1 = [1, 2, 3]
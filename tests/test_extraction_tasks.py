@@ -114,7 +114,7 @@ class TestExtractionTaskManager:
         """Test creating extractor with default configuration"""
         # Clear environment variables that might affect test
         env_backup = {}
-        for key in ['OLLAMA_HOST', 'OLLAMA_PORT', 'OLLAMA_MODEL']:
+        for key in ['OLLAMA_HOST', 'OLLAMA_PORT', 'OLLAMA_MODEL', 'LLM_BACKEND', 'LLM_CACHE_DIR']:
             env_backup[key] = os.environ.get(key)
             if key in os.environ:
                 del os.environ[key]
@@ -127,7 +127,9 @@ class TestExtractionTaskManager:
                 text_file=temp_text_file,
                 ollama_host='192.168.1.234',
                 ollama_port=11434,
-                ollama_model='aya:35b-23'
+                ollama_model='aya:35b-23',
+                backend='ollama',
+                cache_dir=None
             )
         finally:
             # Restore environment variables
@@ -140,6 +142,8 @@ class TestExtractionTaskManager:
         os.environ['OLLAMA_HOST'] = 'localhost'
         os.environ['OLLAMA_PORT'] = '8080'
         os.environ['OLLAMA_MODEL'] = 'llama2'
+        os.environ['LLM_BACKEND'] = 'vllm'
+        os.environ['LLM_CACHE_DIR'] = '/tmp/llm_cache'
 
         try:
             manager = ExtractionTaskManager('test-task-id', temp_text_file)
@@ -149,11 +153,13 @@ class TestExtractionTaskManager:
                 text_file=temp_text_file,
                 ollama_host='localhost',
                 ollama_port=8080,
-                ollama_model='llama2'
+                ollama_model='llama2',
+                backend='vllm',
+                cache_dir='/tmp/llm_cache'
             )
         finally:
             # Clean up environment variables
-            for key in ['OLLAMA_HOST', 'OLLAMA_PORT', 'OLLAMA_MODEL']:
+            for key in ['OLLAMA_HOST', 'OLLAMA_PORT', 'OLLAMA_MODEL', 'LLM_BACKEND', 'LLM_CACHE_DIR']:
                 if key in os.environ:
                     del os.environ[key]
 
@@ -571,6 +577,31 @@ class TestExtractionTaskManagerIntegration:
         assert 'processing' in states
         assert 'saving' in states
 
+        mock_extractor.close.assert_called_once()
+
+    @patch('web_app.services.text_processing_service.TextProcessingService')
+    def test_run_closes_extractor_on_failure(self, mock_text_processor_class, temp_text_file, mock_extractor,
+                                             mock_prompt_service, mock_repository, mock_current_task,
+                                             mock_logger):
+        """Test the extractor is closed when the workflow fails"""
+        mock_text_processor = Mock()
+        mock_text_processor_class.return_value = mock_text_processor
+        mock_text_processor.process_corpus_with_anchors.return_value = [
+            {'content': 'chunk1', 'chunk_number': 0, 'genealogical_context': {}}
+        ]
+
+        mock_extractor.extract_from_chunk.return_value = {"families": [], "isolated_individuals": []}
+        mock_prompt_service.return_value.get_active_prompt.return_value = None
+        mock_repository.save_extraction_data.side_effect = RuntimeError("Database error")
+
+        manager = ExtractionTaskManager('test-task-id', temp_text_file)
+        manager.progress = MockTaskProgressRepository('test-task-id')
+
+        with pytest.raises(RuntimeError, match="Database error"):
+            manager.run()
+
+        mock_extractor.close.assert_called_once()
+
     @patch('web_app.services.text_processing_service.TextProcessingService')
     def test_run_with_custom_prompt(self, mock_text_processor_class, temp_text_file, mock_extractor,
                                               mock_prompt_service, mock_repository, mock_current_task, mock_logger):
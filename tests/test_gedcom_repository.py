@@ -5,6 +5,7 @@ import uuid
 from unittest.mock import Mock
 
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
 from web_app.database.models import Family, Occupation, Person, Place
 from web_app.repositories.gedcom_repository import GedcomRepository
@@ -325,15 +326,6 @@ class TestGedcomRepository:
         mock_query.filter_by.return_value.first.return_value = None
         mock_db_session.query.return_value = mock_query
 
-        # Mock the new place that will be created
-        new_place_id = str(uuid.uuid4())
-
-        # We need to simulate what happens when Place() is called and added
-        def mock_add(place):
-            place.id = new_place_id
-
-        mock_db_session.add.side_effect = mock_add
-
         repository.get_or_create_place('New Place')
 
         # Should query database first
@@ -346,13 +338,25 @@ class TestGedcomRepository:
         assert isinstance(added_place, Place)
         assert added_place.name == 'New Place'
 
-        # Should flush to get ID
-        mock_db_session.flush.assert_called_once()
+        # Id is assigned up front, so no flush is needed per place
+        assert isinstance(added_place.id, uuid.UUID)
+        mock_db_session.flush.assert_not_called()
 
         # Should cache the place
         assert 'New Place' in repository.place_cache
         assert repository.place_cache['New Place'] == added_place
 
+    def test_get_or_create_place_rolls_back_on_error(self, repository, mock_db_session):
+        """Test a failed place lookup rolls the session back"""
+        mock_db_session.query.side_effect = SQLAlchemyError("autoflush failed")
+
+        with pytest.raises(SQLAlchemyError):
+            repository.get_or_create_place('Amsterdam')
+
+        mock_db_session.rollback.assert_called_once()
+        mock_db_session.flush.assert_not_called()
+        assert 'Amsterdam' not in repository.place_cache
+
     def test_get_or_create_place_whitespace_trimmed(self, repository, mock_db_session, db):
         """Test that place names are trimmed"""
         place = Mock()
@@ -401,6 +405,23 @@ class TestGedcomRepository:
 
         # Clean up handled by test fixture
 
+    def test_prefetch_places_resolves_all_records(self, db):
+        """Integration test: prefetching resolves person and family places in one batch"""
+        repository = GedcomRepository()
+        persons = [
+            {'gedcom_id': 'I1', 'birth_place': 'Amsterdam', 'death_place': 'Utrecht'},
+            {'gedcom_id': 'I2', 'baptism_place': 'Amsterdam'}
+        ]
+        families = [{'gedcom_id': 'F1', 'marriage_place': 'Gameren'}]
+
+        repository.prefetch_places(persons, families)
+
+        assert set(repository.place_id_cache) == {'Amsterdam', 'Utrecht', 'Gameren'}
+        assert Place.query.count() == 3
+
+        person = repository.create_person(persons[0])
+        assert person.birth_place_id == repository.place_id_cache['Amsterdam']
+
     def test_integration_family_workflow(self, db):
         """Integration test: complete family creation workflow"""
 
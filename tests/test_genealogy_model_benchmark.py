@@ -14,6 +14,11 @@ import requests
 from web_app.pdf_processing.genealogy_model_benchmark import GenealogyModelBenchmark
 
 
+def stream_lines(text):
+    """Build the NDJSON lines of a streamed Ollama generate response"""
+    return [json.dumps({'response': text, 'done': True}).encode()]
+
+
 class TestGenealogyModelBenchmark:
     """Test genealogy model benchmark functionality"""
 
@@ -70,7 +75,7 @@ class TestGenealogyModelBenchmark:
 
         assert benchmark.models_to_test == expected_models
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_check_ollama_running_success(self, mock_get, app):
         """Test Ollama running check when service is available"""
         mock_response = Mock()
@@ -83,7 +88,7 @@ class TestGenealogyModelBenchmark:
         assert result is True
         mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=5)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_check_ollama_running_failure(self, mock_get, app):
         """Test Ollama running check when service is not available"""
         mock_get.side_effect = requests.exceptions.RequestException("Connection failed")
@@ -94,7 +99,7 @@ class TestGenealogyModelBenchmark:
         assert result is False
         mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=5)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_check_ollama_running_error_status(self, mock_get, app):
         """Test Ollama running check with error status"""
         mock_response = Mock()
@@ -106,6 +111,34 @@ class TestGenealogyModelBenchmark:
 
         assert result is False
 
+    def test_session_reused_and_closed(self, app):
+        """Test requests share a pooled session that closes with the context manager"""
+        with patch.object(requests.Session, 'close') as mock_close:
+            with GenealogyModelBenchmark() as benchmark:
+                assert isinstance(benchmark.session, requests.Session)
+                mock_close.assert_not_called()
+        mock_close.assert_called_once()
+
+    @patch('subprocess.run')
+    @patch('requests.Session.get')
+    def test_install_skips_models_listed_by_ollama(self, mock_get, mock_run, app):
+        """Test models reported by /api/tags are not pulled again"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'models': [{'name': 'qwen2.5:7b'}, {'name': 'mistral:latest'}]}
+        mock_get.return_value = mock_response
+        mock_run.return_value = Mock(returncode=0, stderr="")
+
+        benchmark = GenealogyModelBenchmark()
+        assert benchmark.check_ollama_running() is True
+
+        assert benchmark.install_model("qwen2.5:7b") is True
+        assert benchmark.install_model("mistral") is True
+        mock_run.assert_not_called()
+
+        assert benchmark.install_model("llama3.2:3b") is True
+        mock_run.assert_called_once()
+
     @patch('subprocess.run')
     def test_install_model_success(self, mock_run, app):
         """Test successful model installation"""
@@ -175,14 +208,26 @@ class TestGenealogyModelBenchmark:
         assert "marriage_date" in prompt
         assert "confidence" in prompt
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    def test_prompts_share_prefix_and_keep_model_loaded(self, mock_post, app):
+        """Test case prompts start with the shared prefix and request keep_alive"""
+        mock_post.return_value = Mock(status_code=500)
+        benchmark = GenealogyModelBenchmark()
+
+        prompts = [benchmark.create_genealogy_prompt(case['text']) for case in benchmark.test_cases]
+        assert all(prompt.startswith(benchmark.PROMPT_PREFIX) for prompt in prompts)
+
+        benchmark.test_model_on_case("qwen2.5:7b", benchmark.test_cases[0])
+        payload = mock_post.call_args.kwargs['json']
+        assert payload['keep_alive'] == benchmark.KEEP_ALIVE
+        assert payload['prompt'] == prompts[0]
+
+    @patch('requests.Session.post')
     def test_test_model_on_case_success(self, mock_post, app):
         """Test successful model testing on a case"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'response': '{"people": [{"given_names": "Jan", "surname": "Jansen", "confidence": 0.9}]}'
-        }
+        mock_response.iter_lines.return_value = stream_lines('{"people": [{"given_names": "Jan", "surname": "Jansen", "confidence": 0.9}]}')
         mock_post.return_value = mock_response
 
         benchmark = GenealogyModelBenchmark()
@@ -198,7 +243,7 @@ class TestGenealogyModelBenchmark:
         assert result['accuracy_score'] == 0.5  # 1/2 = 0.5
         assert result['json_valid'] is True
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_test_model_on_case_http_error(self, mock_post, app):
         """Test model testing with HTTP error"""
         mock_response = Mock()
@@ -215,14 +260,12 @@ class TestGenealogyModelBenchmark:
         assert result['error'] == "HTTP 500"
         assert result['response_time'] == 1.0
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_test_model_on_case_no_json(self, mock_post, app):
         """Test model testing with no JSON in response"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'response': 'This is not JSON format'
-        }
+        mock_response.iter_lines.return_value = stream_lines('This is not JSON format')
         mock_post.return_value = mock_response
 
         benchmark = GenealogyModelBenchmark()
@@ -235,14 +278,12 @@ class TestGenealogyModelBenchmark:
         assert result['error'] == "No JSON found in response"
         assert result['response_time'] == 1.0
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_test_model_on_case_invalid_json(self, mock_post, app):
         """Test model testing with invalid JSON"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'response': '{"people": [invalid json}'
-        }
+        mock_response.iter_lines.return_value = stream_lines('{"people": [invalid json}')
         mock_post.return_value = mock_response
 
         benchmark = GenealogyModelBenchmark()
@@ -256,7 +297,26 @@ class TestGenealogyModelBenchmark:
         assert result['response_time'] == 1.0
         assert result['json_valid'] is False
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    def test_test_model_on_case_malformed_stream_line(self, mock_post, app):
+        """Test a garbled NDJSON line becomes an error result instead of raising"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.iter_lines.return_value = [b'{"response": "{\\"people\\": ["}', b'{"response": tru']
+        mock_post.return_value = mock_response
+
+        benchmark = GenealogyModelBenchmark()
+        test_case = benchmark.test_cases[0]
+
+        with patch('time.time', side_effect=[0, 1.0]):
+            result = benchmark.test_model_on_case("qwen2.5:7b", test_case)
+
+        assert "Invalid stream" in result['error']
+        assert result['response_time'] == 1.0
+        assert result['json_valid'] is False
+        mock_response.close.assert_called_once()
+
+    @patch('requests.Session.post')
     def test_test_model_on_case_request_exception(self, mock_post, app):
         """Test model testing with request exception"""
         mock_post.side_effect = requests.exceptions.RequestException("Connection failed")
@@ -270,14 +330,12 @@ class TestGenealogyModelBenchmark:
         assert 'error' in result
         assert result['error'] == "Connection failed"
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_test_model_on_case_perfect_accuracy(self, mock_post, app):
         """Test model testing with perfect accuracy"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'response': '{"people": [{"given_names": "Jan"}, {"given_names": "Piet"}]}'
-        }
+        mock_response.iter_lines.return_value = stream_lines('{"people": [{"given_names": "Jan"}, {"given_names": "Piet"}]}')
         mock_post.return_value = mock_response
 
         benchmark = GenealogyModelBenchmark()
@@ -291,14 +349,12 @@ class TestGenealogyModelBenchmark:
         assert result['expected_people'] == 2
         assert result['accuracy_score'] == 1.0
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_test_model_on_case_over_accuracy(self, mock_post, app):
         """Test model testing with more people found than expected"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'response': '{"people": [{"given_names": "Jan"}, {"given_names": "Piet"}, {"given_names": "Klaas"}]}'
-        }
+        mock_response.iter_lines.return_value = stream_lines('{"people": [{"given_names": "Jan"}, {"given_names": "Piet"}, {"given_names": "Klaas"}]}')
         mock_post.return_value = mock_response
 
         benchmark = GenealogyModelBenchmark()
@@ -377,6 +433,90 @@ class TestGenealogyModelBenchmark:
         assert result['avg_accuracy'] == 0.0
         assert result['overall_score'] == 0.0
 
+    def test_parallelism_settings(self, app):
+        """Test parallelism defaults and overrides"""
+        benchmark = GenealogyModelBenchmark()
+        assert 1 <= benchmark.max_parallel_models <= len(benchmark.models_to_test)
+        assert 1 <= benchmark.max_parallel_cases <= len(benchmark.test_cases)
+
+        benchmark = GenealogyModelBenchmark(max_parallel_models=2, max_parallel_cases=1)
+        assert benchmark.max_parallel_models == 2
+        assert benchmark.max_parallel_cases == 1
+
+    def test_benchmark_model_keeps_case_order(self, app):
+        """Test concurrent test cases are reported in test case order"""
+        benchmark = GenealogyModelBenchmark(max_parallel_cases=3)
+
+        def fake_test(model_name, test_case, prompt=None):
+            return {'success': True, 'accuracy_score': 1.0, 'response_time': 1.0,
+                    'text': test_case['text']}
+
+        with patch.object(benchmark, 'test_model_on_case', side_effect=fake_test):
+            result = benchmark.benchmark_model("qwen2.5:7b")
+
+        assert [r['test_case'] for r in result['test_cases']] == [
+            case['name'] for case in benchmark.test_cases
+        ]
+        assert [r['text'] for r in result['test_cases']] == [
+            case['text'] for case in benchmark.test_cases
+        ]
+
+    def test_benchmark_model_resumes_from_checkpoint(self, app):
+        """Test checkpointed cases are reused and new results are appended"""
+        benchmark = GenealogyModelBenchmark(max_parallel_cases=2)
+        first_case = benchmark.test_cases[0]['name']
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint = Path(temp_dir) / "benchmark.jsonl"
+            checkpoint.write_text(
+                json.dumps({"model": "qwen2.5:7b", "case": first_case,
+                            "result": {"success": True, "accuracy_score": 0.5, "response_time": 2.0}})
+                + "\n" + '{"model": "qwen2.5:7b", "ca'  # truncated by an interrupted write
+            )
+
+            assert benchmark.load_checkpoint(str(checkpoint)) == 1
+
+            fake_result = {'success': True, 'accuracy_score': 1.0, 'response_time': 1.0}
+            with patch.object(benchmark, 'test_model_on_case', return_value=fake_result) as mock_test:
+                result = benchmark.benchmark_model("qwen2.5:7b")
+
+            assert mock_test.call_count == len(benchmark.test_cases) - 1
+            assert result['test_cases'][0]['accuracy_score'] == 0.5
+
+            entries = [json.loads(line) for line in checkpoint.read_text().splitlines()[1:]]
+            assert sorted(entry['case'] for entry in entries) == sorted(
+                case['name'] for case in benchmark.test_cases[1:]
+            )
+
+    def test_benchmark_model_reruns_failed_checkpointed_cases(self, app):
+        """Test checkpointed errors and incomplete entries are run again on resume"""
+        benchmark = GenealogyModelBenchmark(max_parallel_cases=2)
+        first_case, second_case = (case['name'] for case in benchmark.test_cases[:2])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint = Path(temp_dir) / "benchmark.jsonl"
+            checkpoint.write_text(
+                json.dumps({"model": "qwen2.5:7b", "case": first_case,
+                            "result": {"error": "HTTP 500", "response_time": 0.1}}) + "\n"
+                + json.dumps({"model": "qwen2.5:7b", "case": second_case}) + "\n"
+            )
+
+            assert benchmark.load_checkpoint(str(checkpoint)) == 0
+
+            results = [{'error': 'Connection refused', 'response_time': 0.1}] + [
+                {'success': True, 'accuracy_score': 1.0, 'response_time': 1.0}
+            ] * (len(benchmark.test_cases) - 1)
+            with patch.object(benchmark, 'test_model_on_case', side_effect=results) as mock_test:
+                benchmark.benchmark_model("qwen2.5:7b")
+
+            assert mock_test.call_count == len(benchmark.test_cases)
+            assert {call.args[1]['name'] for call in mock_test.call_args_list} >= {first_case, second_case}
+
+            # The failure is not recorded, so a later resume runs it again
+            entries = [json.loads(line) for line in checkpoint.read_text().splitlines()[2:]]
+            assert len(entries) == len(benchmark.test_cases) - 1
+            assert all('error' not in entry['result'] for entry in entries)
+
     def test_run_full_benchmark_ollama_not_running(self, app):
         """Test full benchmark when Ollama is not running"""
         benchmark = GenealogyModelBenchmark()
@@ -436,6 +576,51 @@ class TestGenealogyModelBenchmark:
         assert benchmark.results == {}
 
 
+    def test_run_full_benchmark_early_stop(self, app):
+        """Test dominated models stop early while the leader runs every case"""
+        benchmark = GenealogyModelBenchmark()
+        benchmark.models_to_test = ['good:model', 'bad:model']
+
+        def fake_test(model_name, test_case, prompt=None):
+            if model_name == 'good:model':
+                return {'success': True, 'accuracy_score': 1.0, 'response_time': 1.0}
+            return {'error': 'No JSON found in response', 'response_time': 1.0}
+
+        with patch.object(benchmark, 'check_ollama_running', return_value=True):
+            with patch.object(benchmark, 'test_model_on_case', side_effect=fake_test):
+                results = benchmark.run_full_benchmark(
+                    install_models=False, early_stop=True, confidence=0.8, min_cases=1
+                )
+
+        assert len(results['good:model']['test_cases']) == 3
+        assert results['good:model']['stopped_early'] is False
+        assert results['good:model']['overall_score'] == 1.0
+        assert len(results['bad:model']['test_cases']) == 1
+        assert results['bad:model']['stopped_early'] is True
+        assert results['bad:model']['success_rate'] == 0.0
+
+    def test_dominated_models_keeps_close_models(self, app):
+        """Test models with similar results are not stopped"""
+        results = {
+            'a': [{'success': True, 'accuracy_score': 1.0}],
+            'b': [{'success': True, 'accuracy_score': 0.9}],
+        }
+        assert GenealogyModelBenchmark._dominated_models(results, confidence=0.95) == []
+
+    def test_dominated_models_stops_clearly_worse_model(self, app):
+        """Test a clearly worse model is dominated, with repeatable results"""
+        results = {
+            'good': [{'success': True, 'accuracy_score': 1.0}] * 4,
+            'bad': [{'error': 'No JSON found in response'}] * 4,
+        }
+        dominated = GenealogyModelBenchmark._dominated_models(results, confidence=0.95)
+
+        assert dominated == ['bad']
+        assert all(
+            GenealogyModelBenchmark._dominated_models(results, confidence=0.95) == dominated
+            for _ in range(5)
+        )
+
     def test_save_results(self, app):
         """Test saving results to file"""
         benchmark = GenealogyModelBenchmark()
@@ -463,6 +648,23 @@ class TestGenealogyModelBenchmark:
         finally:
             Path(output_file).unlink()
 
+    def test_save_results_compact(self, app):
+        """Test compact output has no indentation and round-trips"""
+        benchmark = GenealogyModelBenchmark()
+        benchmark.results = {'qwen2.5:7b': {'overall_score': 0.85, 'test_cases': [{'test_case': 'Één'}]}}
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            output_file = f.name
+
+        try:
+            benchmark.save_results(output_file, compact=True)
+
+            content = Path(output_file).read_text(encoding='utf-8')
+            assert '\n' not in content
+            assert json.loads(content) == benchmark.results
+        finally:
+            Path(output_file).unlink()
+
     def test_save_results_empty(self, app):
         """Test saving empty results"""
         benchmark = GenealogyModelBenchmark()
@@ -5,7 +5,7 @@ Tests for GenealogyDataRepository
 
 import pytest
 
-from web_app.database.models import Family, Person, Place
+from web_app.database.models import Family, Marriage, Person, Place
 from web_app.repositories.genealogy_repository import GenealogyDataRepository
 
 
@@ -128,6 +128,17 @@ class TestGenealogyDataRepository:
         assert place.id == existing_place.id
         assert "Amsterdam" in repository.place_cache
 
+    def test_get_or_create_place_normalizes_name(self, repository, db):
+        """Test single lookups normalize names like the batch path does"""
+        place_ids = repository.prefetch_place_ids(["Den Haag"])
+
+        place = repository.get_or_create_place(" Den  Haag ")
+
+        assert place.id == place_ids["Den Haag"]
+        assert place.name == "Den Haag"
+        assert "Den Haag" in repository.place_cache
+        assert Place.query.count() == 1
+
     def test_get_or_create_place_cached(self, repository):
         """Test getting place from cache"""
         cached_place = Place(name="Amsterdam")
@@ -137,6 +148,18 @@ class TestGenealogyDataRepository:
 
         assert place is cached_place
 
+    def test_place_cache_evicts_least_recently_used(self, repository):
+        """Test the place cache stays bounded and keeps recently used places"""
+        repository.place_cache.max_size = 2
+        amsterdam = Place(name="Amsterdam")
+        repository.place_cache["Amsterdam"] = amsterdam
+        repository.place_cache["Leiden"] = Place(name="Leiden")
+
+        assert repository.get_or_create_place("Amsterdam") is amsterdam
+        repository.place_cache["Utrecht"] = Place(name="Utrecht")
+
+        assert list(repository.place_cache) == ["Amsterdam", "Utrecht"]
+
     def test_get_or_create_place_empty_name(self, repository):
         """Test handling empty place name"""
         place = repository.get_or_create_place("")
@@ -146,6 +169,21 @@ class TestGenealogyDataRepository:
         place = repository.get_or_create_place(None)
         assert place is None
 
+    def test_prefetch_place_ids(self, repository, db):
+        """Test resolving place names in one batch with normalized names"""
+        existing_place = Place(name="Amsterdam")
+        db.session.add(existing_place)
+        db.session.flush()
+
+        place_ids = repository.prefetch_place_ids(["Amsterdam", " Den  Haag ", "Den Haag", "", None])
+
+        assert place_ids["Amsterdam"] == existing_place.id
+        assert "Den Haag" in place_ids
+        assert Place.query.count() == 2
+        assert repository.get_place_id("Den Haag ") == place_ids["Den Haag"]
+        # Only the place that wasn't stored yet counts as created
+        assert repository.places_created == 1
+
     def test_parse_generation_valid(self, repository):
         """Test parsing valid generation strings"""
         assert repository._parse_generation("3") == 3
@@ -208,3 +246,27 @@ class TestGenealogyDataRepository:
         # Verify data was saved
         assert Family.query.count() == 1
         assert Person.query.count() >= 3  # Father, mother, child + isolated
+
+        # Relationships are wired without flushing each person for its id
+        family = Family.query.one()
+        assert family.father.given_names == 'John'
+        assert family.mother.given_names == 'Jane'
+        assert [child.given_names for child in family.children] == ['Johnny']
+        marriage = Marriage.query.one()
+        assert (marriage.person1_id, marriage.person2_id) == (family.father_id, family.mother_id)
+
+    def test_save_extraction_data_bulk_inserts_isolated_individuals(self, repository, db):
+        """Test isolated individuals are inserted with resolved places and confidence"""
+        isolated_individuals = [
+            {'given_names': 'Bob', 'surname': 'Jones', 'birth_place': 'Gameren', 'confidence_score': 0.8},
+            {'name': 'Piet van der Berg', 'death_place': ' Gameren '}
+        ]
+
+        result = repository.save_extraction_data([], isolated_individuals)
+
+        assert result['people_created'] == 2
+        assert result['places_created'] == 1
+        bob = Person.query.filter_by(given_names='Bob').one()
+        assert bob.birth_place.name == 'Gameren'
+        assert bob.confidence_score == 0.8
+        assert Person.query.filter_by(surname='Berg').count() == 1
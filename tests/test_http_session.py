@@ -0,0 +1,22 @@
+"""
+Tests for pooled HTTP sessions
+"""
+
+from web_app.shared.http_session import RETRY_STATUSES, create_http_session
+
+
+class TestCreateHttpSession:
+    """Test session pooling and retry configuration"""
+
+    def test_pool_and_retry_configuration(self):
+        """Test adapters retry busy statuses with backoff and keep connections pooled"""
+        session = create_http_session(pool_maxsize=8, retries=2, backoff_factor=0.1)
+
+        adapter = session.get_adapter('http://localhost:11434/api/generate')
+        assert adapter._pool_maxsize == 8
+        assert adapter.max_retries.total == 2
+        assert adapter.max_retries.backoff_factor == 0.1
+        assert set(adapter.max_retries.status_forcelist) == set(RETRY_STATUSES)
+        assert adapter.max_retries.is_retry('POST', 503)
+        assert not adapter.max_retries.is_retry('POST', 500)
+        session.close()
@@ -7,9 +7,15 @@ import tempfile
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import pytest
 import requests
 
-from web_app.pdf_processing.llm_genealogy_extractor import LLMGenealogyExtractor
+from web_app.pdf_processing.llm_genealogy_extractor import EXTRACTION_SCHEMA, LLMGenealogyExtractor
+
+
+def stream_lines(text):
+    """Build the NDJSON lines of a streamed Ollama generate response"""
+    return [json.dumps({'response': text, 'done': True}).encode()]
 
 
 class TestLLMGenealogyExtractor:
@@ -43,7 +49,7 @@ class TestLLMGenealogyExtractor:
             assert extractor.ollama_model == "llama3:8b"
             assert extractor.ollama_base_url == "http://localhost:8080"
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_check_ollama_available(self, mock_get, app):
         """Test Ollama availability check when service is running"""
         mock_response = Mock()
@@ -56,7 +62,26 @@ class TestLLMGenealogyExtractor:
         assert result is True
         mock_get.assert_called_with("http://192.168.1.234:11434/api/tags", timeout=5)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
+    def test_check_ollama_warns_when_model_missing(self, mock_get, app, caplog):
+        """Test a warning is logged when the configured model is not pulled"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'models': [{'name': 'llama3:latest'}]}
+        mock_get.return_value = mock_response
+
+        LLMGenealogyExtractor(ollama_model="llama3")
+        assert "is not installed" not in caplog.text
+
+        LLMGenealogyExtractor(ollama_model="aya:35b-23-q8_0")
+        assert "Model aya:35b-23-q8_0 is not installed" in caplog.text
+
+    def test_initialization_unknown_backend(self, app):
+        """Test an unsupported backend is rejected"""
+        with pytest.raises(ValueError, match="Unknown LLM backend"):
+            LLMGenealogyExtractor(backend="llamacpp")
+
+    @patch('requests.Session.get')
     def test_check_ollama_unavailable(self, mock_get, app):
         """Test Ollama availability check when service is not running"""
         mock_get.side_effect = requests.exceptions.RequestException("Connection failed")
@@ -65,7 +90,7 @@ class TestLLMGenealogyExtractor:
         result = extractor.check_ollama()
         assert result is False
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_check_ollama_error_status(self, mock_get, app):
         """Test Ollama availability check with error status"""
         mock_response = Mock()
@@ -76,12 +101,12 @@ class TestLLMGenealogyExtractor:
         result = extractor.check_ollama()
         assert result is False
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_query_ollama_success(self, mock_post, app):
         """Test successful Ollama query"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {'response': 'Generated genealogy data'}
+        mock_response.iter_lines.return_value = stream_lines('Generated genealogy data')
         mock_post.return_value = mock_response
 
         with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=True):
@@ -95,21 +120,25 @@ class TestLLMGenealogyExtractor:
             json={
                 "model": "aya:35b-23",
                 "prompt": "Test prompt",
-                "stream": False,
+                "stream": True,
+                "format": "json",
+                "keep_alive": "30m",
                 "options": {
                     "temperature": 0.1,
-                    "top_p": 0.9
+                    "top_p": 0.9,
+                    "num_ctx": 8192
                 }
             },
+            stream=True,
             timeout=120
         )
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_query_ollama_with_custom_model(self, mock_post, app):
         """Test Ollama query with custom model"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {'response': 'Custom model response'}
+        mock_response.iter_lines.return_value = stream_lines('Custom model response')
         mock_post.return_value = mock_response
 
         with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=True):
@@ -122,7 +151,33 @@ class TestLLMGenealogyExtractor:
         call_args = mock_post.call_args
         assert call_args[1]['json']['model'] == "llama3:8b"
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    def test_query_vllm_success(self, mock_post, app):
+        """Test vLLM queries use the OpenAI-compatible completions API"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'choices': [{'text': '{"families": []}'}]}
+        mock_post.return_value = mock_response
+
+        extractor = LLMGenealogyExtractor(ollama_host="localhost", ollama_port=8000,
+                                          ollama_model="neuralmagic/Llama-3.1-8B-Instruct-FP8",
+                                          backend="vllm")
+
+        assert extractor.query_vllm("Test prompt") == '{"families": []}'
+        mock_post.assert_called_once_with(
+            "http://localhost:8000/v1/completions",
+            json={
+                "model": "neuralmagic/Llama-3.1-8B-Instruct-FP8",
+                "prompt": "Test prompt",
+                "temperature": 0.1,
+                "top_p": 0.9,
+                "max_tokens": 2048,
+                "guided_json": EXTRACTION_SCHEMA
+            },
+            timeout=120
+        )
+
+    @patch('requests.Session.post')
     def test_query_ollama_failure(self, mock_post, app):
         """Test Ollama query with request failure"""
         mock_post.side_effect = requests.exceptions.RequestException("Network error")
@@ -133,7 +188,7 @@ class TestLLMGenealogyExtractor:
         result = extractor.query_ollama("Test prompt")
         assert result is None
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_query_ollama_error_status(self, mock_post, app):
         """Test Ollama query with error HTTP status"""
         mock_response = Mock()
@@ -161,6 +216,22 @@ class TestLLMGenealogyExtractor:
         assert "isolated_individuals" in prompt
         assert "JSON" in prompt
 
+    def test_prompt_template_cached_until_refresh(self, app):
+        """Test the active prompt is fetched once and again after refresh_prompt"""
+        with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=False):
+            extractor = LLMGenealogyExtractor()
+
+        active_prompt = Mock(prompt_text="Extract: {text_chunk}")
+        with patch.object(extractor.prompt_service, 'get_active_prompt',
+                          return_value=active_prompt) as mock_get_active:
+            assert extractor.create_genealogy_prompt("a") == "Extract: a"
+            assert extractor.create_genealogy_prompt("b") == "Extract: b"
+            mock_get_active.assert_called_once()
+
+            extractor.refresh_prompt()
+            extractor.create_genealogy_prompt("c")
+            assert mock_get_active.call_count == 2
+
     def test_split_text_intelligently_basic(self, app):
         """Test basic text splitting functionality"""
         with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=False):
@@ -220,6 +291,72 @@ class TestLLMGenealogyExtractor:
         chunks = extractor.split_text_intelligently("")
         assert chunks == []
 
+    def test_split_text_intelligently_long_section_split_by_tokens(self, app):
+        """Test oversized sections are split at line breaks instead of truncated"""
+        with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=False):
+            extractor = LLMGenealogyExtractor()
+        extractor.MAX_CHUNK_TOKENS = 60
+
+        records = [f"{i}. Jan van der Berg * {1800 + i} Amsterdam, landbouwer te Gameren" for i in range(40)]
+        chunks = extractor.split_text_intelligently("EERSTE GENERATIE\n" + "\n".join(records))
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert chunk.startswith("EERSTE GENERATIE\n\n")
+            assert extractor.count_tokens(chunk.split("\n\n", 1)[1]) <= 60
+        # Every record survives intact in exactly one chunk
+        lines = [line for chunk in chunks for line in chunk.split("\n\n", 1)[1].split("\n")]
+        assert lines == records
+
+    def test_iter_chunks_matches_split_text(self, app):
+        """Test streaming chunks from the file matches splitting the full text"""
+        text = (
+            "=== PAGE 1 ===\nEERSTE GENERATIE\n"
+            + "Jan van der Berg * 1850 Amsterdam, landbouwer te Gameren. " * 3
+            + "\n1.1. Kinderen van Jan van der Berg:\n"
+            + "a. Piet van der Berg * 1875, b. Marië van der Berg * 1877 te Culemborg. " * 3
+            + "\n" + "=" * 50 + "\nTweede generatie\n### FILE: 002.txt ###\n"
+            + "Willem van der Berg ~ Haaften 1901, arbeider, x Gorinchem 1925. " * 3
+        )
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
+            temp_file.write(text)
+            temp_path = temp_file.name
+
+        try:
+            with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=False):
+                extractor = LLMGenealogyExtractor(text_file=temp_path)
+
+            expected = extractor.split_text_intelligently(text)
+            assert len(expected) == 3
+            assert list(extractor.iter_chunks()) == expected
+        finally:
+            Path(temp_path).unlink()
+
+    def test_iter_chunks_removes_markers_before_generation_split(self, app):
+        """Test a page marker inside a generation header doesn't hide the header"""
+        text = (
+            "EERSTE\n=== PAGE 1 ===\nGENERATIE\n"
+            + "Jan van der Berg * 1850 Amsterdam, landbouwer te Gameren.\n" * 4
+            + "TWEEDE " + "=" * 30 + " GENERATIE\n"
+            + "Willem van der Berg ~ Haaften 1901, arbeider, x Gorinchem 1925.\n" * 4
+        )
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
+            temp_file.write(text)
+            temp_path = temp_file.name
+
+        try:
+            with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=False):
+                extractor = LLMGenealogyExtractor(text_file=temp_path)
+
+            # Small blocks so headers and records straddle block boundaries
+            with patch('web_app.pdf_processing.llm_genealogy_extractor._STREAM_BLOCK_SIZE', 40):
+                chunks = list(extractor.iter_chunks())
+
+            assert chunks == extractor.split_text_intelligently(text)
+            assert [chunk.split("\n\n", 1)[0] for chunk in chunks] == ["EERSTE GENERATIE", "TWEEDE GENERATIE"]
+        finally:
+            Path(temp_path).unlink()
+
     @patch.object(LLMGenealogyExtractor, 'query_ollama')
     def test_extract_from_chunk_valid_json(self, mock_query, app):
         """Test extraction from chunk with valid JSON response"""
@@ -246,6 +383,41 @@ class TestLLMGenealogyExtractor:
         result = extractor.extract_from_chunk("Test text", custom_prompt="Test prompt")
         assert result == valid_json
 
+    @patch.object(LLMGenealogyExtractor, 'query_ollama')
+    def test_extract_from_chunk_caches_parsed_result(self, mock_query, app):
+        """Test repeated prompts are answered from the cache with independent copies"""
+        mock_query.return_value = '{"families": [{"family_id": "1"}], "isolated_individuals": []}'
+
+        with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=True):
+            extractor = LLMGenealogyExtractor()
+
+        first = extractor.extract_from_chunk("Test text", custom_prompt="Prompt {text_chunk}")
+        first["families"][0]["chunk_id"] = 7
+        second = extractor.extract_from_chunk("Test text", custom_prompt="Prompt {text_chunk}")
+
+        mock_query.assert_called_once()
+        assert second == {"families": [{"family_id": "1"}], "isolated_individuals": []}
+
+        extractor.extract_from_chunk("Other text", custom_prompt="Prompt {text_chunk}")
+        assert mock_query.call_count == 2
+
+    @patch.object(LLMGenealogyExtractor, 'query_ollama')
+    def test_extract_from_chunk_persists_cache_across_runs(self, mock_query, app):
+        """Test results cached on disk are reused by a new extractor"""
+        mock_query.return_value = '{"families": [{"family_id": "1"}], "isolated_individuals": []}'
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=True):
+                first_run = LLMGenealogyExtractor(cache_dir=cache_dir)
+                second_run = LLMGenealogyExtractor(cache_dir=cache_dir)
+
+            first = first_run.extract_from_chunk("Test text", custom_prompt="Prompt {text_chunk}")
+            second = second_run.extract_from_chunk("Test text", custom_prompt="Prompt {text_chunk}")
+
+            mock_query.assert_called_once()
+            assert second == first
+            assert [p.suffix for p in Path(cache_dir).iterdir()] == ['.json']
+
     @patch.object(LLMGenealogyExtractor, 'query_ollama')
     def test_extract_from_chunk_invalid_json(self, mock_query, app):
         """Test extraction from chunk with invalid JSON response"""
@@ -337,6 +509,50 @@ class TestLLMGenealogyExtractor:
         finally:
             Path(temp_path).unlink()
 
+    @patch.object(LLMGenealogyExtractor, 'iter_chunks')
+    @patch.object(LLMGenealogyExtractor, 'extract_from_chunk')
+    def test_process_all_text_concurrent_keeps_chunk_order(self, mock_extract, mock_chunks, app):
+        """Test chunks extracted concurrently are merged in chunk order with one prompt lookup"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as temp_file:
+            temp_file.write("content")
+            temp_path = temp_file.name
+
+        try:
+            with patch.object(LLMGenealogyExtractor, 'check_ollama', return_value=True):
+                extractor = LLMGenealogyExtractor(text_file=temp_path, max_concurrent_requests=3)
+
+            mock_chunks.return_value = iter([f"chunk {i}" for i in range(20)])
+            mock_extract.side_effect = lambda chunk, custom_prompt=None: {
+                "families": [], "isolated_individuals": [{"name": chunk}]
+            }
+
+            with patch.object(extractor, 'get_prompt_template',
+                              return_value="T: {text_chunk}") as mock_template:
+                extractor.process_all_text()
+
+            mock_template.assert_called_once()
+            assert all(call.kwargs['custom_prompt'] == "T: {text_chunk}"
+                       for call in mock_extract.call_args_list)
+            individuals = extractor.results["isolated_individuals"]
+            assert [p["name"] for p in individuals] == [f"chunk {i}" for i in range(20)]
+            assert [p["chunk_id"] for p in individuals] == list(range(20))
+        finally:
+            Path(temp_path).unlink()
+
+    def test_annotate_chunk_data_tags_every_entity(self):
+        """Test chunk annotation tags families, their members and isolated individuals"""
+        father, child = {"given_names": "Jan"}, {"given_names": "Piet"}
+        chunk_data = {
+            "families": [{"parents": {"father": father, "mother": None}, "children": [child]}],
+            "isolated_individuals": [{"given_names": "Maria"}]
+        }
+
+        families, individuals = LLMGenealogyExtractor._annotate_chunk_data(chunk_data, 3)
+
+        assert families[0]["chunk_id"] == 3 and families[0]["extraction_method"] == "llm"
+        assert father["chunk_id"] == 3 and child["chunk_id"] == 3
+        assert individuals == [{"given_names": "Maria", "chunk_id": 3, "extraction_method": "llm"}]
+
     @patch.object(LLMGenealogyExtractor, 'extract_from_chunk')
     def test_process_all_text_ollama_failure(self, mock_extract, app):
         """Test processing with Ollama extraction failures"""
@@ -0,0 +1,76 @@
+"""
+Tests for extracting JSON from LLM responses
+"""
+
+import json
+from unittest.mock import Mock
+
+import pytest
+
+from web_app.shared.llm_json import JsonObjectScanner, extract_json_object, read_streamed_generation
+
+
+class TestExtractJsonObject:
+    """Test JSON extraction from free-form LLM output"""
+
+    def test_plain_object(self):
+        """Test a response that is only JSON"""
+        assert extract_json_object('{"people": []}') == {"people": []}
+
+    def test_surrounding_text_with_braces(self):
+        """Test trailing text containing braces is ignored"""
+        response = 'Here is the data:\n{"families": [{"id": 1}]}\nNote: {unsure} about dates'
+        assert extract_json_object(response) == {"families": [{"id": 1}]}
+
+    def test_braces_inside_strings(self):
+        """Test braces inside JSON strings don't end the object early"""
+        response = '{"note": "uses {curly} braces", "n": 2} trailing'
+        assert extract_json_object(response) == {"note": "uses {curly} braces", "n": 2}
+
+    def test_prose_braces_before_json(self):
+        """Test braces in text before the JSON are skipped"""
+        response = 'Maybe {unsure} about this:\n{"families": [], "note": "a } b"}\nDone'
+        assert extract_json_object(response) == {"families": [], "note": "a } b"}
+
+    def test_no_json(self):
+        """Test responses without an object return None"""
+        assert extract_json_object("This is not JSON format") is None
+
+    def test_invalid_json_raises(self):
+        """Test malformed JSON raises a decode error"""
+        with pytest.raises(json.JSONDecodeError):
+            extract_json_object('{"people": [invalid json}')
+
+
+class TestStreamedGeneration:
+    """Test incremental detection of JSON in streamed responses"""
+
+    def test_scanner_ignores_braces_in_strings_and_prose(self):
+        """Test the scanner completes only when the JSON object closes"""
+        scanner = JsonObjectScanner()
+        assert scanner.feed('Sure {maybe} ') is False
+        assert scanner.feed('{"a": "x}') is False
+        assert scanner.feed('", "b": [1, {') is False
+        assert scanner.feed('}]}') is True
+
+    def test_stops_reading_once_json_is_complete(self):
+        """Test the stream is closed without reading tokens after the object"""
+        fragments = ['Here ', '{"people"', ': []}', ' and more', ' text']
+        response = Mock()
+        response.iter_lines.return_value = iter(
+            json.dumps({'response': fragment, 'done': False}).encode() for fragment in fragments
+        )
+
+        assert read_streamed_generation(response) == 'Here {"people": []}'
+        response.close.assert_called_once()
+
+    def test_reads_until_done_without_json(self):
+        """Test plain text responses are read until Ollama reports done"""
+        response = Mock()
+        response.iter_lines.return_value = [
+            json.dumps({'response': 'No ', 'done': False}).encode(),
+            b'',
+            json.dumps({'response': 'JSON', 'done': True}).encode(),
+        ]
+
+        assert read_streamed_generation(response) == 'No JSON'
@@ -69,6 +69,13 @@ class TestOCRDatabaseIntegration:
         assert processor._detect_language("") == 'unknown'
         assert processor._detect_language(None) == 'unknown'
 
+    @patch('web_app.pdf_processing.ocr_processor.detect')
+    def test_detect_language_stopwords_skip_langdetect(self, mock_detect, processor):
+        """Test clear Dutch or English text is classified without langdetect"""
+        assert processor._detect_language("Jan van der Berg, zoon van Piet, werd geboren te Gameren") == 'nl'
+        assert processor._detect_language("He was born in Leiden and married the daughter of Jan") == 'en'
+        mock_detect.assert_not_called()
+
     @patch('web_app.pdf_processing.ocr_processor.detect')
     def test_detect_language_fallback(self, mock_detect, processor):
         """Test language detection fallback on error"""
@@ -118,18 +125,23 @@ class TestOCRDatabaseIntegration:
 
         # Mock pixmap
         mock_pix = Mock()
-        mock_pix.tobytes.return_value = b"fake_image_data"
+        mock_pix.width, mock_pix.height = 2, 1
+        mock_pix.samples = b"fake_image_data"
         mock_page.get_pixmap.return_value = mock_pix
 
         # Mock PIL Image
         mock_image_obj = Mock()
-        mock_image.open.return_value = mock_image_obj
+        mock_image.frombytes.return_value = mock_image_obj
 
         pdf_path = Path("001.pdf")
         result = processor._pdf_to_image(pdf_path, sample_batch_id, 1)
 
         assert result['success'] is True
         assert result['image'] == mock_image_obj
+        mock_image.frombytes.assert_called_once_with("L", (2, 1), b"fake_image_data")
+        mock_page.get_pixmap.assert_called_once_with(
+            matrix=mock_fitz.Matrix.return_value, colorspace=mock_fitz.csGRAY, alpha=False
+        )
         mock_doc.close.assert_called_once()
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract')
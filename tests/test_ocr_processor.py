@@ -2,10 +2,12 @@
 Tests for OCR processor functionality
 """
 
+import tempfile
+import threading
 from pathlib import Path
 from unittest.mock import MagicMock, Mock, mock_open, patch
 
-import numpy as np
+from PIL import Image
 
 from web_app.pdf_processing.ocr_processor import PDFOCRProcessor
 
@@ -36,17 +38,14 @@ class TestPDFOCRProcessor:
             mock_mkdir.assert_called_once_with(exist_ok=True)
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd')
-    @patch('web_app.pdf_processing.ocr_processor.cv2.cvtColor')
-    @patch('web_app.pdf_processing.ocr_processor.np.array')
-    def test_detect_text_orientation_success(self, mock_array, mock_cvtcolor, mock_osd):
+    def test_detect_text_orientation_success(self, mock_osd):
         """Test successful text orientation detection"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
             processor = PDFOCRProcessor()
 
             # Mock PIL Image
             mock_image = Mock()
-            mock_array.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
-            mock_cvtcolor.return_value = np.zeros((100, 100), dtype=np.uint8)
+            mock_image.convert.return_value = Image.new('L', (100, 80))
 
             # Mock OSD output
             mock_osd.return_value = "Orientation: 0\nRotate: 90\nOrientation confidence: 2.83"
@@ -57,85 +56,48 @@ class TestPDFOCRProcessor:
             mock_osd.assert_called_once()
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd')
-    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data')
-    @patch('web_app.pdf_processing.ocr_processor.cv2.cvtColor')
-    @patch('web_app.pdf_processing.ocr_processor.np.array')
-    def test_detect_text_orientation_fallback(self, mock_array, mock_cvtcolor, mock_image_to_data, mock_osd):
-        """Test text orientation detection with fallback method"""
+    def test_detect_text_orientation_downscales_large_pages(self, mock_osd):
+        """Test orientation detection runs on a reduced copy of large pages"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
             processor = PDFOCRProcessor()
 
-            # Mock PIL Image
             mock_image = Mock()
-            mock_image.rotate.return_value = Mock()
-            mock_array.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
-            mock_cvtcolor.return_value = np.zeros((100, 100), dtype=np.uint8)
-
-            # Mock OSD to fail
-            mock_osd.side_effect = Exception("OSD failed")
+            mock_image.convert.return_value = Image.new('L', (1600, 2400))
+            mock_osd.return_value = "Rotate: 180"
 
-            # Mock image_to_data to return different confidences for different rotations
-            mock_image_to_data.side_effect = [
-                {'conf': ['10', '20', '30']},  # 0 degrees: avg 20
-                {'conf': ['40', '50', '60']},  # 90 degrees: avg 50
-                {'conf': ['5', '15', '25']},   # 180 degrees: avg 15
-                {'conf': ['30', '40', '50']}   # 270 degrees: avg 40
-            ]
-
-            rotation = processor.detect_text_orientation(mock_image)
-
-            assert rotation == 90  # Should pick the rotation with highest confidence (50)
-            assert mock_image_to_data.call_count == 4  # Called for each rotation
+            assert processor.detect_text_orientation(mock_image) == 180
+            assert mock_osd.call_args.args[0].shape == (1200, 800)
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd')
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data')
-    @patch('web_app.pdf_processing.ocr_processor.cv2.cvtColor')
-    @patch('web_app.pdf_processing.ocr_processor.np.array')
-    def test_detect_text_orientation_no_confidence(self, mock_array, mock_cvtcolor, mock_image_to_data, mock_osd):
-        """Test text orientation detection when no confidence data available"""
+    def test_detect_text_orientation_osd_failure_assumes_upright(self, mock_image_to_data, mock_osd):
+        """Test a failed OSD pass assumes 0 degrees without extra OCR passes"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
             processor = PDFOCRProcessor()
 
             # Mock PIL Image
             mock_image = Mock()
-            mock_image.rotate.return_value = Mock()
-            mock_array.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
-            mock_cvtcolor.return_value = np.zeros((100, 100), dtype=np.uint8)
+            mock_image.convert.return_value = Image.new('L', (100, 80))
 
             # Mock OSD to fail
             mock_osd.side_effect = Exception("OSD failed")
 
-            # Mock image_to_data to return no valid confidences
-            mock_image_to_data.return_value = {'conf': ['-1', '0', '-1']}
-
             rotation = processor.detect_text_orientation(mock_image)
 
-            assert rotation == 0  # Should default to 0 when no valid confidences
+            assert rotation == 0
+            mock_image_to_data.assert_not_called()
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd')
-    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data')
-    @patch('web_app.pdf_processing.ocr_processor.cv2.cvtColor')
-    @patch('web_app.pdf_processing.ocr_processor.np.array')
-    def test_detect_text_orientation_all_fail(self, mock_array, mock_cvtcolor, mock_image_to_data, mock_osd):
-        """Test text orientation detection when all methods fail"""
+    def test_detect_text_orientation_no_rotation_in_osd(self, mock_osd):
+        """Test OSD output without a Rotate line assumes 0 degrees"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
             processor = PDFOCRProcessor()
 
-            # Mock PIL Image
             mock_image = Mock()
-            mock_image.rotate.side_effect = Exception("Rotation failed")
-            mock_array.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
-            mock_cvtcolor.return_value = np.zeros((100, 100), dtype=np.uint8)
+            mock_image.convert.return_value = Image.new('L', (100, 80))
+            mock_osd.return_value = "Orientation: 0"
 
-            # Mock OSD to fail
-            mock_osd.side_effect = Exception("OSD failed")
-
-            # Mock image_to_data to fail
-            mock_image_to_data.side_effect = Exception("Data extraction failed")
-
-            rotation = processor.detect_text_orientation(mock_image)
-
-            assert rotation == 0  # Should default to 0 when everything fails
+            assert processor.detect_text_orientation(mock_image) == 0
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
     @patch('web_app.pdf_processing.ocr_processor.ImageOps.autocontrast')
@@ -159,6 +121,43 @@ class TestPDFOCRProcessor:
 
             assert text == "Extracted text from image"
             mock_image_to_string.assert_called_once_with(mock_enhanced_image, config=processor.tesseract_config)
+            mock_autocontrast.assert_called_once_with(mock_enhanced_image, cutoff=processor.AUTOCONTRAST_CUTOFF)
+
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.grayscale')
+    def test_extract_text_from_image_grayscale_page_not_converted(self, mock_grayscale, mock_image_to_string):
+        """Test pages rendered as grayscale skip the grayscale conversion"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            page = Image.new('L', (100, 80))
+            mock_image_to_string.return_value = "Page text"
+
+            with patch.object(processor, 'detect_text_orientation', return_value=0):
+                assert processor.extract_text_from_image(page) == "Page text"
+
+            mock_grayscale.assert_not_called()
+            assert mock_image_to_string.call_args.args[0].mode == 'L'
+
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.autocontrast')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.grayscale')
+    def test_extract_text_from_image_without_enhancement(self, mock_grayscale, mock_autocontrast,
+                                                         mock_image_to_string):
+        """Test preprocessing is skipped when enhancement is disabled"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor(enhance=False)
+
+            mock_image = Mock()
+            mock_image_to_string.return_value = "Plain text"
+
+            with patch.object(processor, 'detect_text_orientation', return_value=0):
+                text = processor.extract_text_from_image(mock_image)
+
+            assert text == "Plain text"
+            mock_grayscale.assert_not_called()
+            mock_autocontrast.assert_not_called()
+            mock_image_to_string.assert_called_once_with(mock_image, config=processor.tesseract_config)
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
     @patch('web_app.pdf_processing.ocr_processor.ImageOps.autocontrast')
@@ -170,11 +169,11 @@ class TestPDFOCRProcessor:
 
             # Mock PIL Image
             mock_image = Mock()
-            mock_rotated_image = Mock()
-            mock_image.rotate.return_value = mock_rotated_image
             mock_enhanced_image = Mock()
             mock_grayscale.return_value = mock_enhanced_image
             mock_autocontrast.return_value = mock_enhanced_image
+            mock_rotated_image = Mock()
+            mock_enhanced_image.rotate.return_value = mock_rotated_image
 
             # Mock text extraction
             mock_image_to_string.return_value = "Rotated text"
@@ -183,7 +182,59 @@ class TestPDFOCRProcessor:
                 text = processor.extract_text_from_image(mock_image)
 
             assert text == "Rotated text"
-            mock_image.rotate.assert_called_once_with(90, expand=True)
+            mock_grayscale.assert_called_once_with(mock_image)
+            mock_enhanced_image.rotate.assert_called_once_with(90, expand=True)
+            mock_image_to_string.assert_called_once_with(mock_rotated_image, config=processor.tesseract_config)
+
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.autocontrast')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.grayscale')
+    def test_extract_text_from_image_known_rotation(self, mock_grayscale, mock_autocontrast,
+                                                    mock_image_to_data, mock_image_to_string):
+        """Test a known rotation skips orientation detection when OCR is confident"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_image = Mock()
+            mock_image_to_data.return_value = {
+                'text': ['Jan', 'Jansen', '', '* 1800', 'Leiden'],
+                'conf': ['91', '88', '-1', '79', '85'],
+                'block_num': [1, 1, 1, 1, 2],
+                'par_num': [1, 1, 1, 1, 1],
+                'line_num': [1, 1, 1, 2, 1],
+            }
+
+            with patch.object(processor, 'detect_text_orientation') as mock_detect:
+                text = processor.extract_text_from_image(mock_image, rotation=180)
+
+            assert text == "Jan Jansen\n* 1800\n\nLeiden"
+            mock_detect.assert_not_called()
+            mock_image_to_string.assert_not_called()
+            mock_autocontrast.return_value.rotate.assert_called_once_with(180, expand=True)
+
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
+    @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.autocontrast')
+    @patch('web_app.pdf_processing.ocr_processor.ImageOps.grayscale')
+    def test_extract_text_from_image_known_rotation_low_confidence(self, mock_grayscale, mock_autocontrast,
+                                                                   mock_image_to_data, mock_image_to_string):
+        """Test a known rotation is re-detected when OCR confidence is low"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_image = Mock()
+            mock_image_to_data.return_value = {
+                'text': ['xq', 'zz'], 'conf': ['12', '20'],
+                'block_num': [1, 1], 'par_num': [1, 1], 'line_num': [1, 1],
+            }
+            mock_image_to_string.return_value = "Upright text"
+
+            with patch.object(processor, 'detect_text_orientation', return_value=0) as mock_detect:
+                text = processor.extract_text_from_image(mock_image, rotation=180)
+
+            assert text == "Upright text"
+            mock_detect.assert_called_once_with(mock_image)
 
     @patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string')
     def test_extract_text_from_image_exception(self, mock_image_to_string):
@@ -203,33 +254,28 @@ class TestPDFOCRProcessor:
             assert text == ""
 
     @patch('web_app.pdf_processing.ocr_processor.fitz.open')
-    @patch('web_app.pdf_processing.ocr_processor.Image.open')
-    @patch('web_app.pdf_processing.ocr_processor.tempfile.NamedTemporaryFile')
-    @patch('web_app.pdf_processing.ocr_processor.os.unlink')
-    def test_process_pdf_success(self, mock_unlink, mock_tempfile, mock_image_open, mock_fitz_open):
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_process_pdf_success(self, mock_frombytes, mock_fitz_open):
         """Test successful PDF processing"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
-            processor = PDFOCRProcessor()
+            # Fixed scale so render calibration doesn't add pixmap conversions
+            processor = PDFOCRProcessor(render_scale=2)
 
             # Mock PDF document
             mock_page = Mock()
             mock_pix = Mock()
-            mock_pix.tobytes.return_value = b"fake image data"
+            mock_pix.samples = b"fake image data"
             mock_page.get_pixmap.return_value = mock_pix
+            mock_page.get_text.return_value = ""  # Scanned page without a text layer
 
             mock_doc = MagicMock()
             mock_doc.__len__.return_value = 2
             mock_doc.load_page.return_value = mock_page
             mock_fitz_open.return_value = mock_doc
 
-            # Mock temporary file
-            mock_temp = Mock()
-            mock_temp.name = "/tmp/test.ppm"
-            mock_tempfile.return_value.__enter__.return_value = mock_temp
-
             # Mock PIL Image
             mock_image = Mock()
-            mock_image_open.return_value = mock_image
+            mock_frombytes.return_value = mock_image
 
             # Mock text extraction
             with patch.object(processor, 'extract_text_from_image', return_value="Page text"):
@@ -239,7 +285,84 @@ class TestPDFOCRProcessor:
             assert "=== PAGE 2 ===" in text
             assert "Page text" in text
             mock_doc.close.assert_called_once()
-            assert mock_unlink.call_count == 2  # Called for each page
+            assert mock_frombytes.call_count == 2  # Built from pixmap samples for each page
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_process_pdf_parallel_keeps_page_order(self, mock_frombytes, mock_fitz_open):
+        """Test pages OCR'd concurrently are joined in page order"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor(max_workers=3)
+
+            pages = []
+            for page_num in range(10):
+                mock_page = Mock()
+                mock_page.get_pixmap.return_value.samples = f"page {page_num}".encode()
+                mock_page.get_text.return_value = ""
+                pages.append(mock_page)
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = len(pages)
+            mock_doc.load_page.side_effect = pages.__getitem__
+            mock_fitz_open.return_value = mock_doc
+            mock_frombytes.side_effect = lambda mode, size, samples: samples.decode()
+
+            with patch.object(processor, 'extract_text_from_image', side_effect=lambda image, rotation=None: f"text of {image}"):
+                text = processor.process_pdf(Path("test.pdf"))
+
+            expected = "\n".join(f"=== PAGE {i + 1} ===\ntext of page {i}\n" for i in range(10))
+            assert text == expected
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_process_pdf_detects_orientation_once(self, mock_frombytes, mock_fitz_open):
+        """Test the first page's rotation is reused for the rest of the document"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 3
+            mock_fitz_open.return_value = mock_doc
+
+            with patch.object(processor, 'detect_text_orientation', return_value=180) as mock_detect, \
+                 patch.object(processor, 'extract_text_from_image', return_value="Page text") as mock_extract:
+                processor.process_pdf(Path("test.pdf"))
+
+            mock_detect.assert_called_once()
+            assert [call.args[1] for call in mock_extract.call_args_list] == [180, 180, 180]
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    def test_process_pdf_uses_embedded_text_layer(self, mock_fitz_open):
+        """Test pages with a text layer skip rendering and OCR unless OCR is forced"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor(render_scale=2)
+
+            mock_page = Mock()
+            mock_page.get_text.return_value = "  Jan Jansen, geboren 12 maart 1800 te Leiden, zoon van Gerrit Jansen  \n"
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 2
+            mock_doc.load_page.return_value = mock_page
+            mock_fitz_open.return_value = mock_doc
+
+            with patch.object(processor, 'extract_text_from_image', return_value="OCR text") as mock_extract:
+                text = processor.process_pdf(Path("searchable.pdf"))
+
+            assert text == (
+                "=== PAGE 1 ===\nJan Jansen, geboren 12 maart 1800 te Leiden, zoon van Gerrit Jansen\n\n"
+                "=== PAGE 2 ===\nJan Jansen, geboren 12 maart 1800 te Leiden, zoon van Gerrit Jansen\n"
+            )
+            mock_page.get_text.assert_called_with("text")
+            mock_page.get_pixmap.assert_not_called()
+            mock_extract.assert_not_called()
+
+            processor.force_ocr = True
+            with patch('web_app.pdf_processing.ocr_processor.Image.frombytes'), \
+                 patch.object(processor, 'detect_text_orientation', return_value=0), \
+                 patch.object(processor, 'extract_text_from_image', return_value="OCR text") as mock_extract:
+                text = processor.process_pdf(Path("searchable.pdf"))
+
+            assert "OCR text" in text
+            assert mock_extract.call_count == 2
 
     @patch('web_app.pdf_processing.ocr_processor.fitz.open')
     def test_process_pdf_exception(self, mock_fitz_open):
@@ -255,10 +378,22 @@ class TestPDFOCRProcessor:
             assert text == ""
 
     @patch('web_app.pdf_processing.ocr_processor.fitz.open')
-    @patch('web_app.pdf_processing.ocr_processor.Image.open')
-    @patch('web_app.pdf_processing.ocr_processor.tempfile.NamedTemporaryFile')
-    @patch('web_app.pdf_processing.ocr_processor.os.unlink')
-    def test_process_pdf_no_text(self, mock_unlink, mock_tempfile, mock_image_open, mock_fitz_open):
+    def test_process_pdf_closes_document_on_page_error(self, mock_fitz_open):
+        """Test the PDF is closed even when a page fails to load"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 1
+            mock_doc.load_page.side_effect = RuntimeError("damaged page")
+            mock_fitz_open.return_value = mock_doc
+
+            assert processor.process_pdf(Path("test.pdf")) == ""
+            mock_doc.close.assert_called_once()
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_process_pdf_no_text(self, mock_frombytes, mock_fitz_open):
         """Test PDF processing when no text is extracted"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
             processor = PDFOCRProcessor()
@@ -266,22 +401,18 @@ class TestPDFOCRProcessor:
             # Mock PDF document
             mock_page = Mock()
             mock_pix = Mock()
-            mock_pix.tobytes.return_value = b"fake image data"
+            mock_pix.samples = b"fake image data"
             mock_page.get_pixmap.return_value = mock_pix
+            mock_page.get_text.return_value = ""  # Scanned page without a text layer
 
             mock_doc = MagicMock()
             mock_doc.__len__.return_value = 1
             mock_doc.load_page.return_value = mock_page
             mock_fitz_open.return_value = mock_doc
 
-            # Mock temporary file
-            mock_temp = Mock()
-            mock_temp.name = "/tmp/test.ppm"
-            mock_tempfile.return_value.__enter__.return_value = mock_temp
-
             # Mock PIL Image
             mock_image = Mock()
-            mock_image_open.return_value = mock_image
+            mock_frombytes.return_value = mock_image
 
             # Mock text extraction to return empty string
             with patch.object(processor, 'extract_text_from_image', return_value=""):
@@ -323,7 +454,7 @@ class TestPDFOCRProcessor:
             mock_pdf_dir.glob.return_value = [mock_pdf1, mock_pdf2]
 
             # Mock file processing
-            with patch.object(processor, 'process_pdf', return_value="PDF text") as mock_process, \
+            with patch.object(processor, '_submit_pdf_pages', return_value=[(0, "PDF text")]) as mock_process, \
                  patch.object(processor, 'create_consolidated_text') as mock_create, \
                  patch('builtins.open', mock_open()):
 
@@ -357,18 +488,87 @@ class TestPDFOCRProcessor:
             mock_pdf_dir.glob.return_value = [mock_pdf2, mock_pdf3, mock_pdf1]
 
             # Mock file processing
-            with patch.object(processor, 'process_pdf', return_value="PDF text") as mock_process, \
+            with patch.object(processor, '_submit_pdf_pages', return_value=[(0, "PDF text")]) as mock_process, \
                  patch.object(processor, 'create_consolidated_text'), \
-                 patch('builtins.open', mock_open()):
+                 patch('builtins.open', mock_open()) as mock_file:
 
                 processor.process_all_pdfs(mock_pdf_dir)
 
             # Should process only valid numeric files (1.pdf and 3.pdf)
             assert mock_process.call_count == 2
-            # Should be called in sorted order (1.pdf then 3.pdf)
-            call_args = [call[0][0] for call in mock_process.call_args_list]
-            assert call_args[0] == mock_pdf1
-            assert call_args[1] == mock_pdf3
+            assert {call[0][0] for call in mock_process.call_args_list} == {mock_pdf1, mock_pdf3}
+            # OCR overlaps across PDFs, but text files are written in sorted order
+            assert [call[0][0].name for call in mock_file.call_args_list] == ["1.txt", "3.txt"]
+
+    def test_process_all_pdfs_skips_up_to_date_text(self):
+        """Test PDFs whose text file is newer are not OCR'd again unless requested"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_dir = Path(temp_dir)
+            processor = PDFOCRProcessor(output_dir=str(pdf_dir / "text"))
+            (pdf_dir / "1.pdf").write_bytes(b"%PDF-1.4 done")
+            (pdf_dir / "2.pdf").write_bytes(b"%PDF-1.4 new")
+            (processor.output_dir / "1.txt").write_text("existing text", encoding='utf-8')
+
+            with patch.object(processor, '_submit_pdf_pages', return_value=[(0, "PDF text")]) as mock_process, \
+                 patch.object(processor, 'create_consolidated_text'):
+                processor.process_all_pdfs(pdf_dir)
+                assert [call.args[0].name for call in mock_process.call_args_list] == ["2.pdf"]
+                assert (processor.output_dir / "1.txt").read_text(encoding='utf-8') == "existing text"
+
+                mock_process.reset_mock()
+                processor.process_all_pdfs(pdf_dir, skip_existing=False)
+                assert mock_process.call_count == 2
+
+    def test_process_all_pdfs_numeric_order(self):
+        """Test numbered PDFs are saved in numeric rather than lexical order"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_dir = Path(temp_dir)
+            processor = PDFOCRProcessor(output_dir=str(pdf_dir / "text"))
+            for name in ("10.pdf", "2.pdf", "1.pdf", "cover.pdf"):
+                (pdf_dir / name).write_bytes(b"%PDF-1.4")
+
+            with patch.object(processor, '_submit_pdf_pages', side_effect=lambda pdf, executor, outstanding: [(0, pdf.stem)]), \
+                 patch.object(processor, 'create_consolidated_text'), \
+                 patch('builtins.open', mock_open()) as mock_file:
+                processor.process_all_pdfs(pdf_dir)
+
+            assert [call.args[0].name for call in mock_file.call_args_list] == ["1.txt", "2.txt", "10.txt"]
+            written = [call.args[0] for call in mock_file.return_value.write.call_args_list]
+            assert written == [f"=== PAGE 1 ===\n{stem}\n" for stem in ("1", "2", "10")]
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_process_all_pdfs_shares_one_ocr_pool(self, mock_frombytes, mock_fitz_open):
+        """Test PDFs are rendered on the calling thread and OCR'd in one shared pool"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_dir = Path(temp_dir)
+            processor = PDFOCRProcessor(output_dir=str(pdf_dir / "text"), max_workers=2, render_scale=2)
+            for name in ("1.pdf", "2.pdf", "3.pdf"):
+                (pdf_dir / name).write_bytes(b"%PDF-1.4")
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 1
+            mock_doc.load_page.return_value.get_text.return_value = ""
+            mock_fitz_open.return_value = mock_doc
+
+            render_threads = set()
+            ocr_threads = set()
+            mock_frombytes.side_effect = lambda *args: render_threads.add(threading.current_thread()) or Mock()
+
+            def fake_ocr(image, rotation=None):
+                ocr_threads.add(threading.current_thread().name)
+                return "page text"
+
+            with patch.object(processor, 'detect_text_orientation', return_value=0), \
+                 patch.object(processor, 'extract_text_from_image', side_effect=fake_ocr), \
+                 patch.object(processor, 'create_consolidated_text'):
+                processor.process_all_pdfs(pdf_dir)
+
+            # PyMuPDF isn't thread-safe, so every page is rendered on one thread
+            assert render_threads == {threading.current_thread()}
+            assert len(ocr_threads) <= 2
+            for name in ("1", "2", "3"):
+                assert (processor.output_dir / f"{name}.txt").read_text(encoding='utf-8') == "=== PAGE 1 ===\npage text\n"
 
     def test_process_all_pdfs_empty_text(self):
         """Test processing PDFs when some return empty text"""
@@ -384,7 +584,7 @@ class TestPDFOCRProcessor:
             mock_pdf_dir.glob.return_value = [mock_pdf1]
 
             # Mock file processing to return empty text
-            with patch.object(processor, 'process_pdf', return_value=""), \
+            with patch.object(processor, '_submit_pdf_pages', return_value=[]), \
                  patch.object(processor, 'create_consolidated_text'), \
                  patch('builtins.open', mock_open()) as mock_file:
 
@@ -411,7 +611,25 @@ class TestPDFOCRProcessor:
             mock_file.assert_called_once()
             handle = mock_file.return_value
             # Check that header was written
-            handle.write.assert_any_call("FAMILY BOOK - CONSOLIDATED TEXT\n")
+            handle.write.assert_any_call(b"FAMILY BOOK - CONSOLIDATED TEXT\n" + b"=" * 50 + b"\n\n")
+
+    def test_create_consolidated_text_contents(self):
+        """Test page files are copied verbatim in numeric order between separators"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            processor = PDFOCRProcessor(output_dir=temp_dir)
+            (output_dir / "10.txt").write_text("tiende pagina", encoding='utf-8')
+            (output_dir / "2.txt").write_text("Geboren te Één\n", encoding='utf-8')
+            (output_dir / "consolidated_text.txt").write_text("stale", encoding='utf-8')
+
+            processor.create_consolidated_text()
+
+            separator = "\n" + "=" * 50 + "\n\n"
+            assert (output_dir / "consolidated_text.txt").read_text(encoding='utf-8') == (
+                "FAMILY BOOK - CONSOLIDATED TEXT\n" + "=" * 50 + "\n\n"
+                + "### FILE: 2.txt ###\nGeboren te Één\n" + separator
+                + "### FILE: 10.txt ###\ntiende pagina" + separator
+            )
 
     def test_create_consolidated_text_with_files(self):
         """Test creating consolidated text with existing files"""
@@ -491,34 +709,95 @@ class TestPDFOCRProcessor:
             assert '-l nld+eng' in config
 
     def test_matrix_scaling_factor(self):
-        """Test that PDF to image conversion uses correct scaling"""
+        """Test that PDF to image conversion uses the configured scaling"""
         with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
-            processor = PDFOCRProcessor()
+            processor = PDFOCRProcessor(render_scale=2)
 
             # Mock fitz objects
             mock_page = Mock()
             mock_pix = Mock()
-            mock_pix.tobytes.return_value = b"fake image data"
+            mock_pix.samples = b"fake image data"
             mock_page.get_pixmap.return_value = mock_pix
+            mock_page.get_text.return_value = ""  # Scanned page without a text layer
 
             mock_doc = MagicMock()
             mock_doc.__len__.return_value = 1
             mock_doc.load_page.return_value = mock_page
 
-            # Mock temporary file
-            mock_temp = Mock()
-            mock_temp.name = "/tmp/test.ppm"
-
             with patch('web_app.pdf_processing.ocr_processor.fitz.open', return_value=mock_doc), \
                  patch('web_app.pdf_processing.ocr_processor.fitz.Matrix') as mock_matrix, \
-                 patch('web_app.pdf_processing.ocr_processor.Image.open'), \
-                 patch('web_app.pdf_processing.ocr_processor.tempfile.NamedTemporaryFile') as mock_tempfile, \
-                 patch('web_app.pdf_processing.ocr_processor.os.unlink'), \
+                 patch('web_app.pdf_processing.ocr_processor.Image.frombytes'), \
                  patch.object(processor, 'extract_text_from_image', return_value=""):
 
-                mock_tempfile.return_value.__enter__.return_value = mock_temp
-
                 processor.process_pdf(Path("test.pdf"))
 
                 # Should use 2x scaling for better quality
                 mock_matrix.assert_called_once_with(2, 2)
+
+    def test_render_scale_calibration_prefers_lower_scale(self):
+        """Test the lower scale is chosen when it OCRs almost as confidently"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            with patch.object(processor, '_render_page'), \
+                 patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data') as mock_image_to_data:
+                mock_image_to_data.side_effect = [{'conf': ['90', '86']}, {'conf': ['88', '85', '-1']}]
+                assert processor._calibrate_render_scale(Mock()) == 1.5
+
+                mock_image_to_data.side_effect = [{'conf': ['90', '86']}, {'conf': ['70', '60']}]
+                assert processor._calibrate_render_scale(Mock()) == 2.0
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_render_scale_calibrated_once(self, mock_frombytes, mock_fitz_open):
+        """Test the calibrated scale is reused for later pages and PDFs"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 2
+            mock_fitz_open.return_value = mock_doc
+
+            with patch.object(processor, '_calibrate_render_scale', return_value=1.5) as mock_calibrate, \
+                 patch('web_app.pdf_processing.ocr_processor.fitz.Matrix') as mock_matrix, \
+                 patch.object(processor, 'detect_text_orientation', return_value=0), \
+                 patch.object(processor, 'extract_text_from_image', return_value="Page text"):
+                processor.process_pdf(Path("first.pdf"))
+                processor.process_pdf(Path("second.pdf"))
+
+            mock_calibrate.assert_called_once()
+            assert processor.render_scale == 1.5
+            assert all(call.args == (1.5, 1.5) for call in mock_matrix.call_args_list)
+
+    @patch('web_app.pdf_processing.ocr_processor.fitz.open')
+    @patch('web_app.pdf_processing.ocr_processor.Image.frombytes')
+    def test_render_scale_calibrated_once_across_threads(self, mock_frombytes, mock_fitz_open):
+        """Test PDFs processed on several threads share a single calibration"""
+        with patch('web_app.pdf_processing.ocr_processor.Path.mkdir'):
+            processor = PDFOCRProcessor()
+
+            mock_doc = MagicMock()
+            mock_doc.__len__.return_value = 1
+            mock_fitz_open.return_value = mock_doc
+
+            calibrating = threading.Barrier(2, timeout=0.5)
+
+            def slow_calibration(page):
+                # Give the second thread a chance to reach calibration too
+                try:
+                    calibrating.wait()
+                except threading.BrokenBarrierError:
+                    pass
+                return 1.5
+
+            with patch.object(processor, '_calibrate_render_scale', side_effect=slow_calibration) as mock_calibrate, \
+                 patch.object(processor, 'detect_text_orientation', return_value=0), \
+                 patch.object(processor, 'extract_text_from_image', return_value="Page text"):
+                threads = [threading.Thread(target=processor.process_pdf, args=(Path(f"{n}.pdf"),)) for n in (1, 2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            mock_calibrate.assert_called_once()
+            assert processor.render_scale == 1.5
@@ -26,8 +26,7 @@ class TestOCRTaskManagerWorkflows:
         with patch('web_app.pdf_processing.ocr_processor.fitz.open') as mock_fitz, \
              patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string') as mock_img_to_str, \
              patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd') as mock_osd, \
-             patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data') as mock_data, \
-             patch('web_app.pdf_processing.ocr_processor.tempfile.NamedTemporaryFile') as mock_tempfile:
+             patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data') as mock_data:
             
             # Setup fitz mocks for PDF parsing
             mock_doc = Mock()
@@ -37,22 +36,18 @@ class TestOCRTaskManagerWorkflows:
             
             mock_page = Mock()
             mock_doc.load_page.return_value = mock_page
+            mock_page.get_text.return_value = ''  # Scanned page without a text layer
             
             mock_pixmap = Mock()
             mock_page.get_pixmap.return_value = mock_pixmap
-            mock_pixmap.tobytes.return_value = b'fake_image_data'
-            
-            # Setup tempfile mock
-            mock_temp = Mock()
-            mock_temp.name = '/tmp/fake_temp.ppm'
-            mock_tempfile.return_value.__enter__.return_value = mock_temp
+            mock_pixmap.samples = b'fake_image_data'
             
             # Setup pytesseract mocks - return realistic genealogy text
             mock_img_to_str.return_value = "Jan van der Berg\\nGeboren: 15 maart 1845 te Amsterdam"
             mock_osd.return_value = "Orientation in degrees: 0\\nRotate: 0"
             mock_data.return_value = {'conf': [80, 85], 'text': ['Jan', 'van']}
             
-            with patch('PIL.Image.open'):  # Mock PIL image opening
+            with patch('PIL.Image.frombytes'):  # Mock PIL image creation
                 yield {
                     'fitz': mock_fitz,
                     'img_to_str': mock_img_to_str,
@@ -180,7 +175,7 @@ class TestOCRTaskManagerWorkflows:
                      patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_string', return_value="Test text"), \
                      patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_osd', return_value="Orientation: 0"), \
                      patch('web_app.pdf_processing.ocr_processor.pytesseract.image_to_data', return_value={'conf': [80], 'text': ['Test']}), \
-                     patch('PIL.Image.open'):
+                     patch('PIL.Image.frombytes'):
                     
                     # Call the actual Celery task
                     result = process_pdfs_ocr.apply(args=(tmp_dir,))
@@ -439,6 +439,7 @@ class TestRAGChatInterface:
         mock_repo_instance = mock_rag_repository_class.return_value
         mock_repo_instance.get_corpus_by_id.return_value = mock_corpus
         mock_repo_instance.start_new_conversation.return_value = uuid.uuid4()
+        mock_repo_instance.create_query.return_value = Mock(message_sequence=1)
 
         # Mock RAG service
         mock_rag_instance = mock_rag_service_class.return_value
@@ -464,6 +465,7 @@ class TestRAGChatInterface:
         json_data = response.get_json()
         assert json_data['success'] is True
         assert 'answer' in json_data
+        assert json_data['message_sequence'] == 2
 
     def test_chat_ask_missing_question(self, client):
         """Test chat ask with missing question"""
@@ -544,6 +546,7 @@ class TestRAGChatInterface:
         mock_corpus.processing_status = "completed"
         mock_repo_instance = mock_rag_repository_class.return_value
         mock_repo_instance.get_corpus_by_id.return_value = mock_corpus
+        mock_repo_instance.create_query.return_value = Mock(message_sequence=2)
 
         # Mock RAG service
         mock_rag_instance = mock_rag_service_class.return_value
@@ -568,6 +571,7 @@ class TestRAGChatInterface:
         json_data = response.get_json()
         assert json_data['success'] is True
         assert json_data['conversation_id'] == conversation_id
+        assert json_data['message_sequence'] == 3
 
 
 class TestRAGCorpusTransactionTiming:
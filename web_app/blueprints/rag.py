@@ -280,7 +280,6 @@ def chat_ask():
         prompt_id = request.form.get('prompt_id', '').strip()
         similarity_threshold = request.form.get('similarity_threshold', '0.55').strip()
         conversation_id = request.form.get('conversation_id', '').strip() or None
-        message_sequence = int(request.form.get('message_sequence', '1'))
 
         # Validate required fields
         if not question:
@@ -312,7 +311,6 @@ def chat_ask():
         # Create or get conversation ID
         if not conversation_id:
             conversation_id = rag_repository.start_new_conversation(corpus_id)
-            message_sequence = 1
         else:
             # Convert string UUID back to UUID object
             import uuid
@@ -329,11 +327,11 @@ def chat_ask():
             conversation_id=str(conversation_id) if conversation_id else None
         )
 
-        # Store query in database with conversation context using repository
-        rag_repository.create_query(
+        # Store query in database with conversation context using repository;
+        # the repository allocates the message sequence atomically
+        query = rag_repository.create_query(
             corpus_id=corpus_id,
             conversation_id=conversation_id,
-            message_sequence=message_sequence,
             question=question,
             answer=result['answer'],
             retrieved_chunks=result.get('retrieved_chunks', []),
@@ -349,7 +347,7 @@ def chat_ask():
             'retrieved_chunks': result.get('retrieved_chunks', []),
             'similarity_scores': result.get('similarity_scores', []),
             'conversation_id': str(conversation_id),
-            'message_sequence': message_sequence + 1  # Next sequence number
+            'message_sequence': query.message_sequence + 1  # Next sequence number
         })
 
     except ValidationError as e:
@@ -2,19 +2,35 @@
 SQLAlchemy models for Family Wiki entities with proper relationships and RAG support
 """
 
+import math
 import uuid
 from datetime import UTC, datetime
+from functools import cached_property
 
 import numpy as np
-from pgvector.sqlalchemy import Vector
-from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import event, func, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID as POSTGRESQL_UUID
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import object_session, undefer, validates
 from sqlalchemy.types import CHAR, TypeDecorator
 
 from . import db
 
 
+try:
+    import simsimd
+except ImportError:  # Optional SIMD kernels; calculate_cosine_similarity falls back to NumPy
+    simsimd = None
+
+
+def _utcnow():
+    """Timezone-aware current time, shared by every created_at/updated_at default"""
+    return datetime.now(UTC)
+
+
 class UUID(TypeDecorator):
     """Platform-independent UUID type.
 
@@ -24,21 +40,24 @@ class UUID(TypeDecorator):
     impl = CHAR
     cache_ok = True
 
+    # Resolved once per dialect in load_dialect_impl; SQLAlchemy copies this
+    # instance into its per-dialect type cache right after that call
+    _is_pg = False
+
     def load_dialect_impl(self, dialect):
-        if dialect.name == 'postgresql':
+        self._is_pg = dialect.name == 'postgresql'
+        if self._is_pg:
             return dialect.type_descriptor(POSTGRESQL_UUID())
         else:
             return dialect.type_descriptor(CHAR(36))
 
     def process_bind_param(self, value, dialect):
-        if value is None:
+        # The PostgreSQL driver adapts uuid.UUID natively, so pass values straight through
+        if value is None or self._is_pg:
             return value
-        elif dialect.name == 'postgresql':
-            return str(value)
-        else:
-            if not isinstance(value, uuid.UUID):
-                return str(uuid.UUID(value))
-            return str(value)
+        if not isinstance(value, uuid.UUID):
+            return str(uuid.UUID(value))
+        return str(value)
 
     def process_result_value(self, value, dialect):
         if value is None:
@@ -49,6 +68,17 @@ class UUID(TypeDecorator):
             return value
 
 
+class HalfVector(TypeDecorator):
+    """pgvector halfvec column that loads as a float32 numpy array, like Vector does"""
+    impl = HALFVEC
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return np.asarray(value.to_list(), dtype=np.float32)
+
+
 class TextCorpus(db.Model):
     """Model for grouping related source documents for RAG queries"""
     __tablename__ = 'text_corpora'
@@ -59,7 +89,7 @@ class TextCorpus(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
     # Raw content and processing status
-    raw_content = db.Column(db.Text)  # Store uploaded file content
+    raw_content = db.deferred(db.Column(db.Text))  # Store uploaded file content; loaded on access
     processing_status = db.Column(db.String(20), default='pending') # 'pending', 'processing', 'ready', 'failed'
     processing_error = db.Column(db.Text)  # Store error message if processing fails
 
@@ -68,15 +98,29 @@ class TextCorpus(db.Model):
     chunk_size = db.Column(db.Integer, default=1500)  # Larger chunks for better genealogy context
     chunk_overlap = db.Column(db.Integer, default=200)
     query_chunk_limit = db.Column(db.Integer, default=20)  # Number of chunks to retrieve for queries
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     text_chunks = db.relationship('SourceText', back_populates='corpus', cascade='all, delete-orphan')
 
     @hybrid_property
     def chunk_count(self):
-        return len(self.text_chunks)
+        """Number of chunks in this corpus, counted in the database instead of loading them"""
+        session = object_session(self) or db.session
+        return session.scalar(
+            select(func.count(SourceText.id)).where(SourceText.corpus_id == self.id)
+        )
+
+    @chunk_count.inplace.expression
+    @classmethod
+    def _chunk_count_expression(cls):
+        return (
+            select(func.count(SourceText.id))
+            .where(SourceText.corpus_id == cls.id)
+            .correlate_except(SourceText)
+            .scalar_subquery()
+        )
 
     def __repr__(self):
         return f'<TextCorpus {self.name}>'
@@ -94,17 +138,21 @@ class SourceText(db.Model):
     page_number = db.Column(db.Integer)
     chunk_number = db.Column(db.Integer)
 
-    # Text content
-    content = db.Column(db.Text, nullable=False)
-    content_hash = db.Column(db.String(64))  # For deduplication
+    # Text content (deferred like the other large columns below; undefer where the text is needed)
+    content = db.deferred(db.Column(db.Text, nullable=False))
+    content_hash = db.Column(db.LargeBinary(32))  # Raw SHA-256 digest for deduplication
 
     # RAG/Embedding fields
-    embedding = db.Column(Vector(1024))  # pgvector field for embeddings (adjust dimension as needed)
+    embedding = db.deferred(db.Column(HalfVector(1024)))  # pgvector halfvec field for embeddings (adjust dimension as needed)
+    embedding_norm = db.Column(db.Float)  # L2 norm of embedding, stored at insert time
     embedding_model = db.Column(db.String(100))
     token_count = db.Column(db.Integer)
 
     # Additional search fields for hybrid RAG
-    content_tsvector = db.Column(TSVECTOR)  # PostgreSQL tsvector for full-text search
+    # Generated by PostgreSQL from content, so ORM writes never touch it
+    content_tsvector = db.deferred(db.Column(
+        TSVECTOR, db.Computed("to_tsvector('dutch', coalesce(content, ''))", persisted=True)
+    ))
     dm_codes = db.Column(ARRAY(db.String))  # PostgreSQL array of Daitch-Mokotoff Soundex codes
 
     # Genealogical context fields for disambiguation
@@ -115,19 +163,20 @@ class SourceText(db.Model):
     chunk_type = db.Column(db.String(50))  # 'family_group', 'individual_details', 'general'
 
     # Metadata
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     corpus = db.relationship('TextCorpus', back_populates='text_chunks')
 
     # Indexes for search
     __table_args__ = (
-        db.Index('idx_source_text_content', 'content'),
         db.Index('idx_source_text_corpus', 'corpus_id'),
         db.Index('idx_source_text_file_page', 'filename', 'page_number'),
         # pgvector index for similarity search
-        db.Index('idx_source_text_embedding', 'embedding', postgresql_using='ivfflat', postgresql_ops={'embedding': 'vector_cosine_ops'}),
+        db.Index('idx_source_text_embedding', 'embedding', postgresql_using='hnsw',
+                 postgresql_with={'m': 24, 'ef_construction': 128},
+                 postgresql_ops={'embedding': 'halfvec_cosine_ops'}),
         # GIN index for trigram similarity using pg_trgm
         db.Index('idx_source_text_content_gin_trgm', 'content', postgresql_using='gin', postgresql_ops={'content': 'gin_trgm_ops'}),
         # GIN index for full-text search on tsvector
@@ -136,110 +185,98 @@ class SourceText(db.Model):
         db.Index('idx_source_text_dm_codes_gin', 'dm_codes', postgresql_using='gin'),
     )
 
+    # Candidate list size for HNSW scans in find_similar
+    HNSW_EF_SEARCH = 100
+
     @staticmethod
-    def calculate_cosine_similarity(embedding_a, embedding_b):
+    def auto_configure_hnsw(row_count):
+        """Suggest HNSW build and search parameters (m, ef_construction, ef_search) for a corpus size"""
+        if row_count < 100_000:
+            return {'m': 16, 'ef_construction': 64, 'ef_search': 40}
+        if row_count < 1_000_000:
+            return {'m': 24, 'ef_construction': 128, 'ef_search': 100}
+        return {'m': 32, 'ef_construction': 200, 'ef_search': 200}
+
+    @property
+    def content_hash_hex(self):
+        """Hex representation of the content hash for display"""
+        return self.content_hash.hex() if self.content_hash is not None else None
+
+    @staticmethod
+    def calculate_cosine_similarity(embedding_a, embedding_b, norm_a=None, norm_b=None):
         """
         Calculate cosine similarity between two embeddings
 
         Args:
             embedding_a: First embedding (numpy array or list)
             embedding_b: Second embedding (numpy array or list)
+            norm_a: Precomputed L2 norm of embedding_a (e.g. SourceText.embedding_norm), optional
+            norm_b: Precomputed L2 norm of embedding_b, optional
 
         Returns:
             float: Cosine similarity score between -1 and 1
                   1 = identical, 0 = orthogonal, -1 = opposite
         """
-        vec_a = np.array(embedding_a)
-        vec_b = np.array(embedding_b)
+        vec_a = np.asarray(embedding_a)
+        vec_b = np.asarray(embedding_b)
+
+        # With both norms known, only the dot product is left to compute
+        if norm_a is not None and norm_b is not None:
+            denominator = norm_a * norm_b
+            return 0.0 if denominator == 0 else float(np.dot(vec_a, vec_b) / denominator)
 
-        # Calculate dot product
-        dot_product = np.dot(vec_a, vec_b)
+        # Single SIMD call for float32 embeddings when simsimd is installed
+        if simsimd is not None and vec_a.dtype == np.float32 and vec_b.dtype == np.float32:
+            if not (vec_a.any() and vec_b.any()):
+                return 0.0
+            return 1.0 - float(simsimd.cosine(vec_a, vec_b))
 
-        # Calculate norms
-        norm_a = np.linalg.norm(vec_a)
-        norm_b = np.linalg.norm(vec_b)
+        # Product of squared norms, so only one square root is needed
+        squared_a = norm_a * norm_a if norm_a is not None else np.vdot(vec_a, vec_a)
+        squared_b = norm_b * norm_b if norm_b is not None else np.vdot(vec_b, vec_b)
+        denominator = squared_a * squared_b
 
         # Avoid division by zero
-        if norm_a == 0 or norm_b == 0:
+        if denominator == 0:
             return 0.0
 
-        return dot_product / (norm_a * norm_b)
+        return float(np.dot(vec_a, vec_b) / math.sqrt(denominator))
 
     @classmethod
-    def find_similar(cls, query_embedding, corpus_id=None, limit=5, similarity_threshold=0.7):
-        """Find text chunks similar to the query embedding using cosine similarity"""
-        from sqlalchemy import text
-
-        # Convert numpy array to list for pgvector compatibility
-        if hasattr(query_embedding, 'tolist'):
-            query_embedding_list = query_embedding.tolist()
-        elif isinstance(query_embedding, list):
-            query_embedding_list = query_embedding
-        else:
-            query_embedding_list = list(query_embedding)
-
-        # Create vector string for pgvector (format: '[1,2,3,...]')
-        vector_str = '[' + ','.join(map(str, query_embedding_list)) + ']'
-
-        # Build SQL query with proper pgvector vector casting
-        # Use string formatting for the vector literal to avoid parameter binding issues
-        base_query = f"""
-            SELECT id, corpus_id, filename, page_number, chunk_number, content,
-                   content_hash, embedding, embedding_model, token_count,
-                   created_at, updated_at,
-                   embedding <=> '{vector_str}'::vector as distance
-            FROM source_texts
-            WHERE embedding IS NOT NULL
+    def find_similar(cls, query_embedding, corpus_id=None, limit=5, similarity_threshold=0.7,
+                     keywords=None):
+        """Find text chunks similar to the query embedding using cosine similarity
+
+        When keywords are given, only chunks matching them in full-text search are considered.
         """
+        distance = cls.embedding.cosine_distance(np.asarray(query_embedding, dtype=np.float32))
+
+        # PostgreSQL computes the similarity so rows come back ready to return; callers
+        # need the chunk text but not the (deferred) embedding or tsvector
+        stmt = (
+            select(cls, (1.0 - distance).label('similarity'))
+            .options(undefer(cls.content))
+            .where(cls.embedding.isnot(None))
+        )
 
-        params = {}
         if corpus_id:
-            base_query += " AND corpus_id = :corpus_id"
-            params['corpus_id'] = corpus_id
+            stmt = stmt.where(cls.corpus_id == corpus_id)
 
-        base_query += f" ORDER BY embedding <=> '{vector_str}'::vector"
+        if keywords:
+            stmt = stmt.where(cls.content_tsvector.op('@@')(func.plainto_tsquery('dutch', keywords)))
 
-        if limit:
-            base_query += " LIMIT :limit_val"
-            params['limit_val'] = limit
-
-        sql_query = text(base_query)
-
-        # Execute query
-        result = db.session.execute(sql_query, params)
-        rows = result.fetchall()
-
-        # Convert rows back to SourceText objects
-        chunks = []
-        for row in rows:
-            chunk = SourceText()
-            chunk.id = row.id
-            chunk.corpus_id = row.corpus_id
-            chunk.filename = row.filename
-            chunk.page_number = row.page_number
-            chunk.chunk_number = row.chunk_number
-            chunk.content = row.content
-            chunk.content_hash = row.content_hash
-            chunk.embedding = row.embedding
-            chunk.embedding_model = row.embedding_model
-            chunk.token_count = row.token_count
-            chunk.created_at = row.created_at
-            chunk.updated_at = row.updated_at
-
-            # Calculate cosine similarity (1 - cosine_distance)
-            similarity = 1.0 - row.distance if row.distance is not None else None
-
-            chunks.append((chunk, similarity))
-
-        # Filter by similarity threshold if specified
         if similarity_threshold:
-            filtered_results = []
-            for chunk, similarity in chunks:
-                if similarity is not None and similarity >= similarity_threshold:
-                    filtered_results.append((chunk, similarity))
-            return filtered_results
+            # Cosine similarity >= threshold is cosine distance <= 1 - threshold
+            stmt = stmt.where(distance <= 1.0 - similarity_threshold)
 
-        return chunks
+        stmt = stmt.order_by(distance)
+        if limit:
+            stmt = stmt.limit(limit)
+
+        # Widen the HNSW candidate list for this transaction only
+        db.session.execute(text(f"SET LOCAL hnsw.ef_search = {cls.HNSW_EF_SEARCH}"))
+
+        return [tuple(row) for row in db.session.execute(stmt)]
 
     def __repr__(self):
         return f'<SourceText {self.filename}:{self.page_number}:{self.chunk_number}>'
@@ -259,12 +296,12 @@ class Query(db.Model):
 
     # Question and response
     question = db.Column(db.Text, nullable=False)
-    question_embedding = db.Column(Vector(1024))  # pgvector field for question embedding
+    question_embedding = db.Column(HalfVector(1024))  # pgvector halfvec field for question embedding
     answer = db.Column(db.Text)
 
     # RAG metadata
-    retrieved_chunks = db.Column(db.JSON)  # List of chunk IDs that were used
-    similarity_scores = db.Column(db.JSON)  # Similarity scores for retrieved chunks
+    retrieved_chunks = db.Column(JSONB)  # List of chunk IDs that were used
+    similarity_scores = db.Column(JSONB)  # Similarity scores for retrieved chunks
     ollama_model = db.Column(db.String(100))
     prompt_used = db.Column(db.String(255))  # Name of the prompt that was used
     processing_time_ms = db.Column(db.Integer)
@@ -274,12 +311,22 @@ class Query(db.Model):
     error_message = db.Column(db.Text)
 
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
     completed_at = db.Column(db.DateTime)
 
     # Relationships
     corpus = db.relationship('TextCorpus')
 
+    # Indexes for retrieval analytics (e.g. retrieved_chunks @> '["<chunk id>"]')
+    __table_args__ = (
+        db.Index('idx_queries_retrieved_gin', 'retrieved_chunks', postgresql_using='gin'),
+        # Partial index covering only queries that are still in flight
+        db.Index('idx_queries_status_pending', 'status',
+                 postgresql_where=db.text("status IN ('pending', 'processing')")),
+        # Conversation history lookups are ordered by sequence, so index both together
+        db.Index('idx_queries_conversation_sequence', 'conversation_id', 'message_sequence'),
+    )
+
     @classmethod
     def get_conversation(cls, conversation_id):
         """Get all queries in a conversation, ordered by sequence"""
@@ -291,13 +338,21 @@ class Query(db.Model):
         import uuid
         return uuid.uuid4()
 
+    @classmethod
+    def next_sequence_expression(cls, conversation_id):
+        """SQL expression for the next sequence number in a conversation, evaluated by the INSERT itself"""
+        return (
+            select(func.coalesce(func.max(cls.message_sequence), 0) + 1)
+            .where(cls.conversation_id == conversation_id)
+            .scalar_subquery()
+        )
+
     @classmethod
     def get_next_sequence_number(cls, conversation_id):
         """Get the next sequence number for a conversation"""
         if not conversation_id:
             return 1
-        latest = cls.query.filter_by(conversation_id=conversation_id).order_by(cls.message_sequence.desc()).first()
-        return (latest.message_sequence + 1) if latest else 1
+        return db.session.scalar(select(cls.next_sequence_expression(conversation_id)))
 
     @property
     def is_part_of_conversation(self):
@@ -326,8 +381,8 @@ class ExtractionPrompt(db.Model):
     name = db.Column(db.String(255), nullable=False)
     prompt_text = db.Column(db.Text, nullable=False)
     prompt_type = db.Column(db.String(50), nullable=False, default='extraction')  # 'extraction', 'rag', 'research'
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
     description = db.Column(db.Text)
 
     # Template variables documentation
@@ -352,7 +407,7 @@ class OcrPage(db.Model):
     file_path = db.Column(db.String(500))  # Original PDF file path
 
     # OCR results
-    extracted_text = db.Column(db.Text)
+    extracted_text = db.deferred(db.Column(db.Text))
     confidence_score = db.Column(db.Float)  # Overall confidence from OCR
 
     # Processing metadata
@@ -365,15 +420,17 @@ class OcrPage(db.Model):
     error_message = db.Column(db.Text)
 
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Ensure unique pages per batch
     __table_args__ = (
         db.UniqueConstraint('batch_id', 'filename', name='unique_batch_file'),
         db.Index('idx_ocr_batch', 'batch_id'),
         db.Index('idx_ocr_filename', 'filename'),
-        db.Index('idx_ocr_status', 'status'),
+        # Partial index: workers only poll the small set of unfinished/failed pages
+        db.Index('idx_ocr_status_pending', 'status',
+                 postgresql_where=db.text("status IN ('pending', 'processing', 'failed')")),
     )
 
     def __repr__(self):
@@ -433,8 +490,8 @@ class Person(db.Model):
     # Extraction metadata
     extraction_chunk_id = db.Column(db.Integer)
     extraction_method = db.Column(db.String(50), default='llm')
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     birth_place = db.relationship('Place', foreign_keys=[birth_place_id])
@@ -456,6 +513,12 @@ class Person(db.Model):
     # Marriage relationships
     marriages_as_person1 = db.relationship('Marriage', foreign_keys='Marriage.person1_id', back_populates='person1')
     marriages_as_person2 = db.relationship('Marriage', foreign_keys='Marriage.person2_id', back_populates='person2')
+    # Marriages on either side in a single query; read-only, write through the two collections above
+    marriages = db.relationship(
+        'Marriage',
+        primaryjoin='or_(Person.id == Marriage.person1_id, Person.id == Marriage.person2_id)',
+        viewonly=True
+    )
 
     # Event participation
     events = db.relationship('Event', secondary=event_participants, back_populates='participants')
@@ -471,7 +534,19 @@ class Person(db.Model):
     families_as_mother = db.relationship('Family', foreign_keys='Family.mother_id', back_populates='mother')
     families_as_child = db.relationship('Family', secondary='family_children', back_populates='children')
 
-    @property
+    # Trigram indexes so fuzzy and ILIKE '%...%' name lookups can avoid sequential scans
+    __table_args__ = (
+        db.Index('idx_person_surname_trgm', 'surname', postgresql_using='gin', postgresql_ops={'surname': 'gin_trgm_ops'}),
+        db.Index('idx_person_given_names_trgm', 'given_names', postgresql_using='gin', postgresql_ops={'given_names': 'gin_trgm_ops'}),
+    )
+
+    @validates('given_names', 'tussenvoegsel', 'surname')
+    def _reset_cached_names(self, key, value):
+        """Drop memoized names when a name component changes"""
+        _clear_cached_names(self)
+        return value
+
+    @cached_property
     def full_name(self):
         """Get full name with proper Dutch formatting"""
         parts = [self.given_names or '']
@@ -481,7 +556,7 @@ class Person(db.Model):
             parts.append(self.surname)
         return " ".join(filter(None, parts))
 
-    @property
+    @cached_property
     def display_name(self):
         """Get display name (surname, given names)"""
         if self.surname and self.given_names:
@@ -492,12 +567,20 @@ class Person(db.Model):
     @property
     def all_marriages(self):
         """Get all marriages for this person"""
-        return self.marriages_as_person1 + self.marriages_as_person2
+        return self.marriages
 
     def __repr__(self):
         return f'<Person {self.display_name}>'
 
 
+@event.listens_for(Person, 'expire')
+@event.listens_for(Person, 'refresh')
+def _clear_cached_names(person, *args):
+    """Memoized names are derived from column values, so drop them whenever those reload"""
+    person.__dict__.pop('full_name', None)
+    person.__dict__.pop('display_name', None)
+
+
 class Place(db.Model):
     """Model for geographic locations"""
     __tablename__ = 'places'
@@ -511,16 +594,61 @@ class Place(db.Model):
     historical_context = db.Column(db.Text)
 
     # Metadata
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     persons = db.relationship('Person', secondary=person_places, back_populates='places')
     events = db.relationship('Event', back_populates='place')
 
+    # Trigram index for fuzzy place name lookups; exact lookups use the unique index
+    __table_args__ = (
+        db.Index('idx_place_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f'<Place {self.name}>'
 
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """Normalize a place name for lookups (trimmed, internal whitespace collapsed)"""
+        return ' '.join(name.split())
+
+    @classmethod
+    def get_or_create_many(cls, names, session=None, created: set[str] | None = None) -> dict[str, uuid.UUID]:
+        """Resolve place names to ids with one SELECT and at most one INSERT ... ON CONFLICT
+
+        Names this call inserts are added to created, when given.
+        """
+        session = session or db.session
+        wanted = {cls.normalize_name(name) for name in names if name and name.strip()}
+        if not wanted:
+            return {}
+
+        resolved = dict(session.execute(select(cls.name, cls.id).where(cls.name.in_(wanted))).all())
+
+        missing = wanted - resolved.keys()
+        if missing:
+            stmt = (
+                pg_insert(cls)
+                .values([{'name': name} for name in sorted(missing)])
+                .on_conflict_do_nothing(index_elements=['name'])
+                .returning(cls.name, cls.id)
+            )
+            inserted = dict(session.execute(stmt).all())
+            resolved.update(inserted)
+            if created is not None:
+                created.update(inserted)
+
+            # DO NOTHING returns no row for names inserted concurrently by another session
+            missing = wanted - resolved.keys()
+            if missing:
+                resolved.update(
+                    session.execute(select(cls.name, cls.id).where(cls.name.in_(missing))).all()
+                )
+
+        return resolved
+
 
 class Event(db.Model):
     """Model for family events"""
@@ -536,8 +664,8 @@ class Event(db.Model):
     # Metadata
     extraction_chunk_id = db.Column(db.Integer)
     extraction_method = db.Column(db.String(50), default='llm')
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     place = db.relationship('Place', back_populates='events')
@@ -562,7 +690,7 @@ class Marriage(db.Model):
     notes = db.Column(db.Text)
 
     # Metadata
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
 
     # Relationships
     person1 = db.relationship('Person', foreign_keys=[person1_id], back_populates='marriages_as_person1')
@@ -602,8 +730,8 @@ class Family(db.Model):
     # Extraction metadata
     extraction_chunk_id = db.Column(db.Integer)
     extraction_method = db.Column(db.String(50), default='llm')
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     father = db.relationship('Person', foreign_keys=[father_id], back_populates='families_as_father')
@@ -663,8 +791,8 @@ class Source(db.Model):
     confidence = db.Column(db.String(50))  # primary, secondary, etc.
 
     # Metadata
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
 
     # Relationships
     events = db.relationship('Event', secondary=event_sources, back_populates='sources')
@@ -682,7 +810,8 @@ class JobFile(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     content_type = db.Column(db.String(100), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
-    file_data = db.Column(db.LargeBinary, nullable=False)
+    # Deferred: listing and lookup queries only need metadata, the bytes load on first access
+    file_data = db.deferred(db.Column(db.LargeBinary, nullable=False))
 
     # Job information
     task_id = db.Column(db.String(36), nullable=False)  # Celery task ID
@@ -690,7 +819,7 @@ class JobFile(db.Model):
     file_type = db.Column(db.String(20), nullable=False)  # input, output
 
     # Metadata
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=_utcnow)
 
     def __repr__(self):
         return f'<JobFile {self.filename} ({self.job_type})>'
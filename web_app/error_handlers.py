@@ -2,57 +2,104 @@
 Shared error handlers for Flask application and blueprints
 """
 
-from flask import jsonify, render_template, request
+from flask import Response, current_app, g, render_template, request, session
 
 from web_app.shared.logging_config import get_project_logger
 
 
 logger = get_project_logger(__name__)
 
+# Pre-serialized JSON bodies so API errors skip the jsonify round-trip
+_JSON_NOT_FOUND = b'{"error":"Resource not found"}'
+_JSON_METHOD_NOT_ALLOWED = b'{"error":"Method not allowed"}'
+_JSON_INTERNAL_ERROR = b'{"error":"Internal server error"}'
+_JSON_UNEXPECTED_ERROR = b'{"error":"An unexpected error occurred"}'
+
+
+def _json_error(payload, status):
+    """Build a JSON error response from a pre-serialized payload"""
+    return Response(payload, status, mimetype='application/json')
+
+
+def _is_api_request():
+    """Whether the current request expects JSON errors
+
+    Normally precomputed by the before_request hook; computed here when an
+    error is raised before that hook has run.
+    """
+    is_api = g.get('is_api')
+    if is_api is None:
+        is_api = g.is_api = request.path.startswith('/api/') or request.is_json
+    return is_api
+
+
+def _render_error_page(template_name):
+    """Render an error template, reusing the cached output where it is safe to
+
+    The layout highlights the nav button for the current endpoint and shows
+    flashed messages, so the cache is keyed by endpoint and bypassed whenever
+    flashes are pending. Debug mode always renders fresh so template edits
+    show up immediately.
+    """
+    if current_app.debug or '_flashes' in session:
+        return render_template(template_name)
+
+    cache = current_app.extensions.setdefault('error_page_cache', {})
+    key = (template_name, request.endpoint)
+    page = cache.get(key)
+    if page is None:
+        page = cache[key] = render_template(template_name)
+    return page
+
 
 def register_error_handlers(app_or_blueprint):
     """Register error handlers for Flask app or blueprint"""
 
+    @app_or_blueprint.before_request
+    def _mark_api_request():
+        """Classify the request once so error handlers don't repeat the checks"""
+        g.is_api = request.path.startswith('/api/') or request.is_json
+
     @app_or_blueprint.errorhandler(404)
     def not_found_error(error):
         """Handle 404 errors"""
-        logger.warning(f"404 error: {request.url}")
+        logger.warning("404 error: %s", request.url)
 
-        if request.is_json or request.path.startswith('/api/'):
-            return jsonify({'error': 'Resource not found'}), 404
+        if _is_api_request():
+            return _json_error(_JSON_NOT_FOUND, 404)
 
-        return render_template('errors/404.html'), 404
+        return _render_error_page('errors/404.html'), 404
 
     @app_or_blueprint.errorhandler(405)
     def method_not_allowed_error(error):
         """Handle 405 errors"""
-        logger.warning(f"405 error: {request.method} {request.url}")
+        logger.warning("405 error: %s %s", request.method, request.url)
 
-        if request.is_json or request.path.startswith('/api/'):
-            return jsonify({'error': 'Method not allowed'}), 405
+        if _is_api_request():
+            return _json_error(_JSON_METHOD_NOT_ALLOWED, 405)
 
-        return render_template('errors/405.html'), 405
+        return _render_error_page('errors/405.html'), 405
 
     @app_or_blueprint.errorhandler(500)
     def internal_error(error):
         """Handle 500 errors"""
-        logger.error(f"500 error: {request.url} - {str(error)}")
+        logger.error("500 error: %s - %s", request.url, error)
 
-        if request.is_json or request.path.startswith('/api/'):
-            return jsonify({'error': 'Internal server error'}), 500
+        if _is_api_request():
+            return _json_error(_JSON_INTERNAL_ERROR, 500)
 
-        return render_template('errors/500.html'), 500
+        return _render_error_page('errors/500.html'), 500
 
     @app_or_blueprint.errorhandler(Exception)
     def handle_exception(error):
         """Handle all other exceptions"""
-        logger.error(f"Unhandled exception: {request.url} - {str(error)}", exc_info=True)
+        logger.error("Unhandled exception: %s - %s", request.url, error, exc_info=True)
 
-        if request.is_json or request.path.startswith('/api/'):
-            return jsonify({'error': 'An unexpected error occurred'}), 500
+        if _is_api_request():
+            return _json_error(_JSON_UNEXPECTED_ERROR, 500)
 
         # For non-API requests, try to render error page, fallback to simple response
         try:
-            return render_template('errors/500.html'), 500
+            return _render_error_page('errors/500.html'), 500
         except Exception:
             return "<h1>Internal Server Error</h1><p>An unexpected error occurred.</p>", 500
@@ -3,20 +3,36 @@ Model benchmarking service for genealogy extraction
 """
 
 import json
-import re
+import os
+import statistics
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
 
+import numpy as np
 import requests
 from flask import current_app
 
+from web_app.shared.http_session import create_http_session
+from web_app.shared.llm_json import extract_json_object, loads, orjson, read_streamed_generation
 from web_app.shared.logging_config import get_project_logger
 
 
 logger = get_project_logger(__name__)
 
 class GenealogyModelBenchmark:
-    def __init__(self):
+    """Benchmark Ollama models on sample genealogy extraction cases
+
+    Models and test cases are benchmarked concurrently since each test is a
+    blocking HTTP call. Ollama only serves as many requests at once as its
+    OLLAMA_NUM_PARALLEL (per model) and OLLAMA_MAX_LOADED_MODELS settings
+    allow; anything beyond that is queued server-side.
+    """
+
+    def __init__(self, max_parallel_models: int | None = None,
+                 max_parallel_cases: int | None = None):
         self.test_cases = [
             {
                 "name": "Dutch names with dates",
@@ -53,18 +69,70 @@ c. Jan van Zanten, * 1770, + jong""",
 
         self.ollama_base_url = config.get('ollama_base_url', 'http://localhost:11434')
 
+        cpu_count = os.cpu_count() or 1
+        self.max_parallel_models = max_parallel_models or max(
+            1, min(len(self.models_to_test), cpu_count)
+        )
+        self.max_parallel_cases = max_parallel_cases or max(
+            1, min(len(self.test_cases), cpu_count)
+        )
+
+        self.session = create_http_session(
+            pool_maxsize=max(20, self.max_parallel_models * self.max_parallel_cases)
+        )
+
+        # Identical for every model, so build them once
+        self.prompts = [self.create_genealogy_prompt(case["text"]) for case in self.test_cases]
+
+        # Per-case results persisted as JSONL so an interrupted run can resume
+        self.checkpoint_file = None
+        self._completed_cases = {}
+        self._checkpoint_lock = threading.Lock()
+
+        # Populated from /api/tags by check_ollama_running
+        self.installed_models = None
+
         self.results = {}
 
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def check_ollama_running(self) -> bool:
-        """Check if Ollama is running"""
+        """Check if Ollama is running, remembering which models it already has"""
         try:
-            response = requests.get(f"{self.ollama_base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = self.session.get(f"{self.ollama_base_url}/api/tags", timeout=5)
         except requests.RequestException:
             return False
 
+        if response.status_code != 200:
+            return False
+
+        try:
+            self.installed_models = {model['name'] for model in response.json().get('models', [])}
+        except (ValueError, TypeError, KeyError):
+            self.installed_models = None
+        return True
+
+    def is_model_installed(self, model_name: str) -> bool:
+        """Whether the last /api/tags listing included the model"""
+        if not self.installed_models:
+            return False
+        # Ollama lists untagged models with an explicit :latest tag
+        return model_name in self.installed_models or f"{model_name}:latest" in self.installed_models
+
     def install_model(self, model_name: str) -> bool:
         """Install a model using ollama CLI"""
+        if self.is_model_installed(model_name):
+            logger.info(f"Model {model_name} already installed")
+            return True
+
         logger.info(f"Installing {model_name}...")
         try:
             result = subprocess.run(
@@ -87,16 +155,13 @@ c. Jan van Zanten, * 1770, + jong""",
             logger.error(f"Error installing {model_name}: {e}")
             return False
 
-    def create_genealogy_prompt(self, text: str) -> str:
-        """Create standardized prompt for testing"""
-        return f"""You are a Dutch genealogy expert. Extract information about people from this text.
-
-Text: {text}
+    # Shared by every test case so Ollama can reuse the cached prompt prefix
+    PROMPT_PREFIX = """You are a Dutch genealogy expert. Extract information about people from the text below.
 
 Return ONLY valid JSON in this format:
-{{
+{
   "people": [
-    {{
+    {
       "given_names": "first and middle names",
       "surname": "family name",
       "birth_date": "if mentioned with *",
@@ -105,54 +170,75 @@ Return ONLY valid JSON in this format:
       "marriage_date": "if mentioned with x",
       "spouse_name": "if mentioned",
       "confidence": 0.9
-    }}
+    }
   ]
-}}
+}
+
+"""
+
+    # Concurrent `ollama pull` processes when installing missing models
+    MAX_PARALLEL_INSTALLS = 4
 
-JSON:"""
+    # How long Ollama keeps the model (and its KV cache) loaded between cases
+    KEEP_ALIVE = "30m"
 
-    def test_model_on_case(self, model_name: str, test_case: dict) -> dict:
-        """Test a model on one test case"""
-        prompt = self.create_genealogy_prompt(test_case["text"])
+    def create_genealogy_prompt(self, text: str) -> str:
+        """Create standardized prompt for testing"""
+        return f"{self.PROMPT_PREFIX}Text: {text}\n\nJSON:"
+
+    def test_model_on_case(self, model_name: str, test_case: dict, prompt: str | None = None) -> dict:
+        """Test a model on one test case, optionally with its prebuilt prompt"""
+        if prompt is None:
+            prompt = self.create_genealogy_prompt(test_case["text"])
         start_time = time.time()
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.ollama_base_url}/api/generate",
                 json={
                     "model": model_name,
                     "prompt": prompt,
-                    "stream": False,
+                    "stream": True,
+                    "keep_alive": self.KEEP_ALIVE,
                     "options": {
                         "temperature": 0.1,
                         "top_p": 0.9
                     }
                 },
+                stream=True,
                 timeout=120
             )
 
-            response_time = time.time() - start_time
-
             if response.status_code != 200:
+                response.close()
                 return {
                     "error": f"HTTP {response.status_code}",
-                    "response_time": response_time
+                    "response_time": time.time() - start_time
                 }
 
-            response_text = response.json().get('response', '')
-
-            # Extract and parse JSON
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-
-            if not json_match:
+            # Stops generation as soon as the JSON payload is complete
+            try:
+                response_text = read_streamed_generation(response)
+            except ValueError as e:
+                # A truncated or garbled NDJSON line fails this case, not the run
                 return {
-                    "error": "No JSON found in response",
-                    "response_time": response_time,
-                    "response": response_text[:200]
+                    "error": f"Invalid stream: {e}",
+                    "response_time": time.time() - start_time,
+                    "json_valid": False
                 }
+            response_time = time.time() - start_time
 
+            # Extract and parse JSON
             try:
-                parsed_json = json.loads(json_match.group(0))
+                parsed_json = extract_json_object(response_text)
+
+                if parsed_json is None:
+                    return {
+                        "error": "No JSON found in response",
+                        "response_time": response_time,
+                        "response": response_text[:200]
+                    }
+
                 people_found = len(parsed_json.get('people', []))
                 expected_people = test_case["expected_people"]
 
@@ -186,54 +272,172 @@ JSON:"""
                 "response_time": time.time() - start_time
             }
 
+    def load_checkpoint(self, checkpoint_file: str) -> int:
+        """Resume from a JSONL checkpoint, returning the number of completed cases
+
+        Results are appended to the same file as cases finish. A truncated
+        last line from an interrupted write is dropped so new results start
+        on a fresh line. Failed cases are not reused, so they run again.
+        """
+        self.checkpoint_file = checkpoint_file
+        self._completed_cases = {}
+        try:
+            with open(checkpoint_file, 'r+', encoding='utf-8') as f:
+                lines = f.read().split("\n")
+                if lines[-1]:
+                    f.seek(0)
+                    f.write("".join(f"{line}\n" for line in lines[:-1]))
+                    f.truncate()
+        except FileNotFoundError:
+            return 0
+
+        for line in lines[:-1]:
+            try:
+                entry = loads(line)
+                key, result = (entry["model"], entry["case"]), entry["result"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+            if "error" not in result:
+                self._completed_cases[key] = result
+
+        if self._completed_cases:
+            logger.info(f"Resuming benchmark with {len(self._completed_cases)} completed test cases")
+        return len(self._completed_cases)
+
+    def _run_case(self, model_name: str, case_index: int) -> dict:
+        """Run one test case, reusing and recording checkpointed results"""
+        test_case = self.test_cases[case_index]
+        key = (model_name, test_case["name"])
+        if key in self._completed_cases:
+            return dict(self._completed_cases[key])
+
+        result = self.test_model_on_case(model_name, test_case, self.prompts[case_index])
+
+        # Errors are often transient (Ollama restarting, timeouts), so only
+        # completed cases are checkpointed and failures run again on resume
+        if self.checkpoint_file and "error" not in result:
+            line = json.dumps({"model": model_name, "case": test_case["name"], "result": result},
+                              ensure_ascii=False)
+            with self._checkpoint_lock, open(self.checkpoint_file, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        return result
+
     def benchmark_model(self, model_name: str) -> dict:
         """Run full benchmark on a model"""
         logger.info(f"Benchmarking {model_name}...")
 
-        model_results = {
-            "model": model_name,
-            "test_cases": [],
-            "overall_score": 0.0,
-            "avg_response_time": 0.0,
-            "success_rate": 0.0
-        }
+        case_results = [None] * len(self.test_cases)
+        with ThreadPoolExecutor(max_workers=self.max_parallel_cases) as executor:
+            futures = {}
+            for i, test_case in enumerate(self.test_cases):
+                logger.info(f"  Running test case {i+1}/{len(self.test_cases)}: {test_case['name']}")
+                futures[executor.submit(self._run_case, model_name, i)] = i
 
-        successful_tests = 0
-        total_response_time = 0
-        total_accuracy = 0
+            for future in as_completed(futures):
+                case_results[futures[future]] = future.result()
 
-        for i, test_case in enumerate(self.test_cases):
-            logger.info(f"  Running test case {i+1}/{len(self.test_cases)}: {test_case['name']}")
+        return self._summarize_model_results(model_name, case_results)
 
-            result = self.test_model_on_case(model_name, test_case)
+    def _summarize_model_results(self, model_name: str, case_results: list[dict]) -> dict:
+        """Aggregate per-case results (in test case order) into model metrics"""
+        # One (success, accuracy, response_time) row per case
+        rows = []
+        for test_case, result in zip(self.test_cases[:len(case_results)], case_results, strict=True):
             result["test_case"] = test_case["name"]
-            model_results["test_cases"].append(result)
-
-            if result.get("success"):
-                successful_tests += 1
-                total_accuracy += result.get("accuracy_score", 0)
+            success = bool(result.get("success"))
+            rows.append((success, result.get("accuracy_score", 0) if success else 0,
+                         result.get("response_time", 0)))
+
+        if rows:
+            successes, accuracies, response_times = zip(*rows, strict=True)
+            success_rate = sum(successes) / len(rows)
+            avg_accuracy = statistics.fmean(accuracies)
+            avg_response_time = statistics.fmean(response_times)
+        else:
+            success_rate = avg_accuracy = avg_response_time = 0.0
 
-            total_response_time += result.get("response_time", 0)
-
-            # Small delay between tests
-            time.sleep(2)
+        model_results = {
+            "model": model_name,
+            "test_cases": list(case_results),
+            "success_rate": success_rate,
+            "avg_response_time": avg_response_time,
+            "avg_accuracy": avg_accuracy,
+            # Overall score combines success rate and accuracy
+            "overall_score": success_rate * 0.6 + avg_accuracy * 0.4,
+        }
 
-        # Calculate overall metrics
-        model_results["success_rate"] = successful_tests / len(self.test_cases)
-        model_results["avg_response_time"] = total_response_time / len(self.test_cases)
-        model_results["avg_accuracy"] = total_accuracy / len(self.test_cases) if len(self.test_cases) > 0 else 0
+        return model_results
 
-        # Overall score combines success rate and accuracy
-        model_results["overall_score"] = (model_results["success_rate"] * 0.6 +
-                                        model_results["avg_accuracy"] * 0.4)
+    @staticmethod
+    def _dominated_models(case_results: dict[str, list[dict]], confidence: float,
+                          samples: int = 4000, seed: int = 0) -> list[str]:
+        """Find models unlikely to beat the current leader
 
-        return model_results
+        Each model's accuracy gets a Beta(1 + correct, 1 + incorrect)
+        posterior, with partial accuracy counted fractionally. A model is
+        dominated when the Monte Carlo estimate of P(model > leader) falls
+        below 1 - confidence. The sampler is seeded so the same results
+        always stop the same models.
+        """
+        rng = np.random.default_rng(seed)
+        posteriors = {}
+        draws = {}
+        for model_name, results in case_results.items():
+            correct = sum(r.get("accuracy_score", 0) for r in results if r.get("success"))
+            alpha, beta = 1 + correct, 1 + len(results) - correct
+            posteriors[model_name] = alpha / (alpha + beta)
+            draws[model_name] = rng.beta(alpha, beta, samples)
+
+        leader = max(posteriors, key=posteriors.get)
+        return [
+            model_name for model_name in draws
+            if model_name != leader
+            and np.mean(draws[model_name] > draws[leader]) < 1 - confidence
+        ]
 
-    def run_full_benchmark(self, install_models: bool = True) -> dict:
+    def _run_sequential_benchmark(self, models: list[str], confidence: float,
+                                  min_cases: int) -> dict:
+        """Run test cases in rounds across models, dropping dominated models early"""
+        case_results = {model_name: [] for model_name in models}
+        active = list(models)
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_models) as executor:
+            for case_index, test_case in enumerate(self.test_cases):
+                case_number = case_index + 1
+                logger.info(f"Running test case {case_number}/{len(self.test_cases)} "
+                            f"on {len(active)} models: {test_case['name']}")
+                futures = {
+                    model_name: executor.submit(self._run_case, model_name, case_index)
+                    for model_name in active
+                }
+                for model_name, future in futures.items():
+                    case_results[model_name].append(future.result())
+
+                if case_number >= min_cases and case_number < len(self.test_cases) and len(active) > 1:
+                    dominated = self._dominated_models(
+                        {model_name: case_results[model_name] for model_name in active}, confidence
+                    )
+                    for model_name in dominated:
+                        logger.info(f"Stopping {model_name} early after {case_number} test cases")
+                    active = [model_name for model_name in active if model_name not in dominated]
+
+        results = {}
+        for model_name in models:
+            results[model_name] = self._summarize_model_results(model_name, case_results[model_name])
+            results[model_name]["stopped_early"] = len(case_results[model_name]) < len(self.test_cases)
+        return results
+
+    def run_full_benchmark(self, install_models: bool = True, early_stop: bool = False,
+                           confidence: float = 0.95, min_cases: int = 1,
+                           checkpoint_file: str | None = None) -> dict:
         """Run comprehensive benchmark
 
         Args:
             install_models: Whether to auto-install missing models
+            early_stop: Stop testing models that are unlikely to beat the leader
+            confidence: Required confidence that a model is beaten before stopping it
+            min_cases: Test cases every model runs before early stopping applies
+            checkpoint_file: JSONL file to record per-case results in and resume from
 
         Returns:
             Dict with benchmark results
@@ -241,18 +445,34 @@ JSON:"""
         if not self.check_ollama_running():
             raise RuntimeError("Ollama is not running. Please start it with: ollama serve")
 
+        if checkpoint_file:
+            self.load_checkpoint(checkpoint_file)
+
         logger.info("Starting comprehensive genealogy model benchmark...")
         logger.info(f"Will test {len(self.models_to_test)} models on {len(self.test_cases)} test cases")
 
-        for model_name in self.models_to_test:
-            logger.info(f"Testing model: {model_name}")
-
-            if install_models:
-                if not self.install_model(model_name):
+        models = list(self.models_to_test)
+        if install_models:
+            missing = [m for m in self.models_to_test if not self.is_model_installed(m)]
+            with ThreadPoolExecutor(max_workers=self.MAX_PARALLEL_INSTALLS) as executor:
+                installed = dict(zip(missing, executor.map(self.install_model, missing), strict=True))
+            for model_name, success in installed.items():
+                if not success:
                     logger.error(f"Skipping {model_name} due to installation failure")
-                    continue
+            models = [m for m in models if installed.get(m, True)]
+
+        if models and early_stop:
+            self.results.update(self._run_sequential_benchmark(models, confidence, min_cases))
+        elif models:
+            with ThreadPoolExecutor(max_workers=self.max_parallel_models) as executor:
+                futures = {}
+                for model_name in models:
+                    logger.info(f"Testing model: {model_name}")
+                    futures[model_name] = executor.submit(self.benchmark_model, model_name)
 
-            self.results[model_name] = self.benchmark_model(model_name)
+                # Collect in configured order so results stay deterministic
+                for model_name, future in futures.items():
+                    self.results[model_name] = future.result()
 
         logger.info("Benchmark complete!")
         return self.results
@@ -266,47 +486,54 @@ JSON:"""
         if not self.results:
             return {"error": "No results available"}
 
-        # Sort by overall score
-        sorted_results = sorted(
-            self.results.items(),
-            key=lambda x: x[1]["overall_score"],
-            reverse=True
-        )
+        # (model, overall_score, success_rate, avg_accuracy, avg_response_time), best first
+        rows = [
+            (model, r["overall_score"], r["success_rate"], r["avg_accuracy"], r["avg_response_time"])
+            for model, r in self.results.items()
+        ]
+        rows.sort(key=itemgetter(1), reverse=True)
 
         summary = {
             "total_models_tested": len(self.results),
             "total_test_cases": len(self.test_cases),
-            "rankings": []
+            "rankings": [
+                {
+                    "rank": rank,
+                    "model": model,
+                    "overall_score": overall_score,
+                    "success_rate": success_rate,
+                    "avg_accuracy": avg_accuracy,
+                    "avg_response_time": avg_response_time
+                }
+                for rank, (model, overall_score, success_rate, avg_accuracy, avg_response_time)
+                in enumerate(rows, start=1)
+            ],
+            # Add recommendation
+            "recommended_model": rows[0][0],
+            "recommendation_reason": "Best overall performance for Dutch genealogy extraction"
         }
 
-        for i, (model, results) in enumerate(sorted_results):
-            summary["rankings"].append({
-                "rank": i + 1,
-                "model": model,
-                "overall_score": results["overall_score"],
-                "success_rate": results["success_rate"],
-                "avg_accuracy": results["avg_accuracy"],
-                "avg_response_time": results["avg_response_time"]
-            })
-
-        # Add recommendation
-        if sorted_results:
-            winner_name, _ = sorted_results[0]
-            summary["recommended_model"] = winner_name
-            summary["recommendation_reason"] = "Best overall performance for Dutch genealogy extraction"
-
         return summary
 
-    def save_results(self, filename: str = "genealogy_benchmark_results.json") -> str:
+    def save_results(self, filename: str = "genealogy_benchmark_results.json", compact: bool = False) -> str:
         """Save detailed results to JSON
 
         Args:
             filename: Output filename
+            compact: Write without indentation, which is smaller and faster to encode
 
         Returns:
             Path to saved file
         """
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(self.results, option=option))
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                if compact:
+                    json.dump(self.results, f, ensure_ascii=False, separators=(',', ':'))
+                else:
+                    json.dump(self.results, f, indent=2, ensure_ascii=False)
         logger.info(f"Detailed results saved to {filename}")
         return filename
@@ -3,50 +3,154 @@
 LLM-powered genealogy extractor using local models (Ollama)
 """
 
+import copy
+import hashlib
 import json
 import logging
+import mmap
+import os
 import re
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import requests
-
 from web_app.services.prompt_service import PromptService
+from web_app.shared.http_session import create_http_session
+from web_app.shared.llm_json import extract_json_object, loads, read_streamed_generation
+
+
+try:
+    import tiktoken
+except ImportError:  # Optional exact token counts; a character estimate is used instead
+    tiktoken = None
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Page/file markers and separator rules written by the OCR consolidation step
+_CLEANUP_RE = re.compile(r'=== PAGE \d+ ===|### FILE: \d+\.txt ###|={20,}')
+_GENERATION_SPLIT_RE = re.compile(r'(EERSTE|TWEEDE|DERDE|VIERDE|VIJFDE|ZESDE)\s+GENERATIE', re.IGNORECASE)
+_GENERATION_HEADER_RE = re.compile(r'(EERSTE|TWEEDE|DERDE|VIERDE|VIJFDE|ZESDE)', re.IGNORECASE)
+_FAMILY_SPLIT_RE = re.compile(r'(\d+\.?\d*\.\s+Kinderen van [^:]+:)')
+# End of a text that may still grow into a generation header in the next block
+_PARTIAL_GENERATION_RE = re.compile(
+    _GENERATION_HEADER_RE.pattern + r'\s*(?:G(?:E(?:N(?:E(?:R(?:A(?:T(?:IE?)?)?)?)?)?)?)?)?\Z', re.IGNORECASE
+)
+# Bytes of the mapped text file cleaned per step when streaming chunks
+_STREAM_BLOCK_SIZE = 1 << 20
+
+# Break oversized chunks at a paragraph, line or sentence end, in that order
+_CHUNK_BREAKS = ('\n\n', '\n', '. ')
+
+# Top-level shape every extraction prompt must return, used for vLLM guided
+# decoding; the entries themselves are left to the (editable) prompt
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "families": {"type": "array", "items": {"type": "object"}},
+        "isolated_individuals": {"type": "array", "items": {"type": "object"}}
+    },
+    "required": ["families", "isolated_individuals"]
+}
+
+FALLBACK_PROMPT_TEMPLATE = (
+    "Extract genealogical data from this Dutch text: {text_chunk}. "
+    "Return JSON with families and isolated_individuals arrays."
+)
+
 class LLMGenealogyExtractor:
+    # Keep the model resident between chunk requests instead of reloading it
+    KEEP_ALIVE = "30m"
+
+    # Supported inference servers: Ollama, or vLLM's OpenAI-compatible API
+    BACKENDS = ("ollama", "vllm")
+
+    # Completion token budget for vLLM; a chunk's JSON rarely needs more
+    MAX_TOKENS = 2048
+
+    # Ollama context window; its default is too small for the prompt plus a
+    # chunk, and truncating the prompt would defeat Ollama's prefix cache
+    NUM_CTX = 8192
+
+    # Token budget for a chunk's text, leaving room in an 8k context for the
+    # prompt instructions and the completion
+    MAX_CHUNK_TOKENS = 1500
+
+    # Conservative estimate for Dutch text when tiktoken is not installed
+    CHARS_PER_TOKEN = 3
+
     def __init__(self, text_file: str = "extracted_text/consolidated_text.txt",
                  ollama_host: str = "192.168.1.234", ollama_port: int = 11434,
-                 ollama_model: str = "aya:35b-23"):
+                 ollama_model: str = "aya:35b-23", max_concurrent_requests: int = 4,
+                 backend: str = "ollama", cache_dir: str | Path | None = None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{backend}', expected one of {', '.join(self.BACKENDS)}")
+
         self.text_file = Path(text_file)
         self.results = []
+        self.backend = backend
 
         # Configuration
         self.ollama_host = ollama_host
         self.ollama_port = ollama_port
         self.ollama_model = ollama_model
         self.ollama_base_url = f"http://{ollama_host}:{ollama_port}"
+        # Chunks in flight at once; Ollama queues beyond OLLAMA_NUM_PARALLEL
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self.session = create_http_session(pool_maxsize=max(20, self.max_concurrent_requests))
+
+        # Parsed extraction results keyed by a hash of (model, full prompt),
+        # optionally persisted as one JSON file per key so re-runs skip the LLM
+        self.extraction_cache = {}
+        self.cache_dir = Path(cache_dir) if cache_dir else None
 
         # Prompt service for getting active prompt from database
         self.prompt_service = PromptService()
+        self._prompt_template = None
+        self._prompt_loaded_at = 0.0
+
+        self._encoding = tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
 
         # Try to detect available LLM services
-        self.check_ollama()
+        if backend == "ollama":
+            self.check_ollama()
+
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def check_ollama(self) -> bool:
         """Check if Ollama is running locally"""
         try:
-            response = requests.get(f"{self.ollama_base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.ollama_base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get('models', [])
                 logger.info(f"Ollama available at {self.ollama_base_url} with {len(models)} models")
+                self._warn_if_model_missing(models)
                 return True
         except Exception:
             logger.info(f"Ollama not available at {self.ollama_base_url}")
         return False
 
+    def _warn_if_model_missing(self, models: list[dict]) -> None:
+        """Warn when the configured model tag has not been pulled on the server"""
+        try:
+            names = {model['name'] for model in models}
+        except (TypeError, KeyError):
+            return
+        if self.ollama_model not in names and f"{self.ollama_model}:latest" not in names:
+            logger.warning(f"Model {self.ollama_model} is not installed on {self.ollama_base_url}; "
+                           f"run 'ollama pull {self.ollama_model}'")
+
 
     def query_ollama(self, prompt: str, model: str = None) -> str | None:
         """Query Ollama local LLM"""
@@ -54,39 +158,96 @@ class LLMGenealogyExtractor:
             model = self.ollama_model
 
         try:
-            response = requests.post(f"{self.ollama_base_url}/api/generate",
-                                   json={
-                                       "model": model,
-                                       "prompt": prompt,
-                                       "stream": False,
-                                       "options": {
-                                           "temperature": 0.1,  # Low temperature for factual extraction
-                                           "top_p": 0.9
-                                       }
-                                   },
-                                   timeout=120)
+            response = self.session.post(f"{self.ollama_base_url}/api/generate",
+                                       json={
+                                           "model": model,
+                                           "prompt": prompt,
+                                           "stream": True,
+                                           "format": "json",  # Constrain decoding to a JSON object
+                                           "keep_alive": self.KEEP_ALIVE,
+                                           "options": {
+                                               "temperature": 0.1,  # Low temperature for factual extraction
+                                               "top_p": 0.9,
+                                               "num_ctx": self.NUM_CTX
+                                           }
+                                       },
+                                       stream=True,
+                                       timeout=120)
 
             if response.status_code == 200:
-                return response.json().get('response', '')
+                # Stops generation as soon as the JSON payload is complete
+                return read_streamed_generation(response)
+            response.close()
         except Exception as e:
             logger.error(f"Ollama query failed at {self.ollama_base_url}: {e}")
         return None
 
-    def create_genealogy_prompt(self, text_chunk: str) -> str:
-        """Create a specialized prompt for genealogical data extraction using active database prompt"""
+    def query_llm(self, prompt: str) -> str | None:
+        """Query the configured backend and model, returning the raw generated text"""
+        if self.backend == "vllm":
+            return self.query_vllm(prompt)
+        return self.query_ollama(prompt)
+
+    def query_vllm(self, prompt: str, model: str = None) -> str | None:
+        """Query a vLLM server through its OpenAI-compatible completions API"""
+        if model is None:
+            model = self.ollama_model
+
+        try:
+            response = self.session.post(f"{self.ollama_base_url}/v1/completions",
+                                       json={
+                                           "model": model,
+                                           "prompt": prompt,
+                                           "temperature": 0.1,
+                                           "top_p": 0.9,
+                                           "max_tokens": self.MAX_TOKENS,
+                                           "guided_json": EXTRACTION_SCHEMA
+                                       },
+                                       timeout=120)
+
+            if response.status_code == 200:
+                return response.json()["choices"][0]["text"]
+            logger.error(f"vLLM query failed with status {response.status_code}")
+        except Exception as e:
+            logger.error(f"vLLM query failed at {self.ollama_base_url}: {e}")
+        return None
+
+    # Seconds before the active prompt is looked up in the database again
+    PROMPT_CACHE_TTL = 300
+
+    def get_prompt_template(self) -> str:
+        """Get the active prompt template, with a {text_chunk} placeholder
+
+        The database lookup is cached for PROMPT_CACHE_TTL seconds; call
+        refresh_prompt() to pick up a newly activated prompt immediately.
+        """
+        if (self._prompt_template is not None
+                and time.monotonic() - self._prompt_loaded_at < self.PROMPT_CACHE_TTL):
+            return self._prompt_template
+
+        self._prompt_template = self._load_prompt_template()
+        self._prompt_loaded_at = time.monotonic()
+        return self._prompt_template
+
+    def refresh_prompt(self) -> None:
+        """Drop the cached prompt so the next lookup hits the database"""
+        self._prompt_template = None
+
+    def _load_prompt_template(self) -> str:
+        """Load the active database prompt template, falling back to a basic prompt"""
         try:
             active_prompt = self.prompt_service.get_active_prompt()
             if active_prompt:
-                # Replace the {text_chunk} placeholder with actual text
-                return active_prompt.prompt_text.replace("{text_chunk}", text_chunk)
-            else:
-                logger.warning("No active prompt found, ensure default prompts are loaded")
-                # Fallback to a basic prompt if no active prompt exists
-                return f"Extract genealogical data from this Dutch text: {text_chunk}. Return JSON with families and isolated_individuals arrays."
+                return active_prompt.prompt_text
+            logger.warning("No active prompt found, ensure default prompts are loaded")
         except Exception as e:
             logger.error(f"Failed to get active prompt from database: {e}")
-            # Fallback to basic prompt on error
-            return f"Extract genealogical data from this Dutch text: {text_chunk}. Return JSON with families and isolated_individuals arrays."
+        # Fallback to a basic prompt if no active prompt exists
+        return FALLBACK_PROMPT_TEMPLATE
+
+    def create_genealogy_prompt(self, text_chunk: str) -> str:
+        """Create a specialized prompt for genealogical data extraction using active database prompt"""
+        return self.get_prompt_template().replace("{text_chunk}", text_chunk)
 
     def extract_from_chunk(self, text_chunk: str, custom_prompt: str = None) -> dict:
         """Extract genealogical data from a text chunk using LLM"""
@@ -96,8 +257,17 @@ class LLMGenealogyExtractor:
         else:
             prompt = self.create_genealogy_prompt(text_chunk)
 
-        # Try Ollama first
-        response = self.query_ollama(prompt)
+        cache_key = hashlib.blake2b(f"{self.ollama_model}:{prompt}".encode(), digest_size=16).hexdigest()
+        cached = self.extraction_cache.get(cache_key)
+        if cached is None and self.cache_dir:
+            cached = self._read_cached_result(cache_key)
+            if cached is not None:
+                self.extraction_cache[cache_key] = cached
+        if cached is not None:
+            # Callers annotate the returned dicts, so never hand out the cached copy
+            return copy.deepcopy(cached)
+
+        response = self.query_llm(prompt)
 
         if not response:
             logger.warning("LLM extraction failed for chunk")
@@ -106,16 +276,18 @@ class LLMGenealogyExtractor:
         try:
             # Try to parse JSON from response
             # Sometimes LLMs add extra text, so find the JSON part
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                data = json.loads(json_str)
+            data = extract_json_object(response)
+            if data is not None:
                 # Ensure proper structure
                 if isinstance(data, dict):
-                    return {
+                    result = {
                         "families": data.get("families", []),
                         "isolated_individuals": data.get("isolated_individuals", [])
                     }
+                    self.extraction_cache[cache_key] = copy.deepcopy(result)
+                    if self.cache_dir:
+                        self._write_cached_result(cache_key, result)
+                    return result
                 else:
                     logger.warning("Response is not a dictionary")
                     return {"families": [], "isolated_individuals": []}
@@ -128,40 +300,165 @@ class LLMGenealogyExtractor:
             logger.error(f"Response was: {response[:500]}...")
             return {"families": [], "isolated_individuals": []}
 
+    def _read_cached_result(self, cache_key: str) -> dict | None:
+        """Load a persisted extraction result, if one exists"""
+        try:
+            with open(self.cache_dir / f"{cache_key}.json", 'rb') as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable LLM cache entry {cache_key}: {e}")
+            return None
+
+    def _write_cached_result(self, cache_key: str, result: dict) -> None:
+        """Persist an extraction result atomically so readers never see a partial file"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_dir,
+                                             suffix='.tmp', delete=False) as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(f.name, self.cache_dir / f"{cache_key}.json")
+        except OSError as e:
+            logger.warning(f"Failed to write LLM cache entry {cache_key}: {e}")
+
     def split_text_intelligently(self, text: str) -> list[str]:
         """Split text into meaningful chunks for LLM processing"""
-        # Remove file markers and clean up
-        text = re.sub(r'=== PAGE \d+ ===', '', text)
-        text = re.sub(r'### FILE: \d+\.txt ###', '', text)
-        text = re.sub(r'={20,}', '', text)
-
-        chunks = []
+        # Remove file markers and clean up in a single pass
+        text = _CLEANUP_RE.sub('', text)
 
         # Split by generation headers first
-        generation_splits = re.split(r'(EERSTE|TWEEDE|DERDE|VIERDE|VIJFDE|ZESDE)\s+GENERATIE', text, flags=re.IGNORECASE)
+        chunks = list(self._chunks_from_sections(_GENERATION_SPLIT_RE.split(text)))
+
+        logger.info(f"Created {len(chunks)} text chunks for analysis")
+        return chunks
+
+    def iter_chunks(self, file_path: str | Path | None = None):
+        """Yield the same chunks as split_text_intelligently while streaming the file
+
+        The file is memory-mapped and decoded one generation section at a
+        time, so memory stays proportional to a section rather than the book.
+        """
+        path = Path(file_path) if file_path else self.text_file
+        if path.stat().st_size == 0:
+            return
 
+        def cleaned_blocks(mm):
+            # Blocks end at a newline so no marker is cut in two
+            start, size = 0, len(mm)
+            while start < size:
+                end = min(start + _STREAM_BLOCK_SIZE, size)
+                if end < size:
+                    cut = mm.rfind(b'\n', start, end)
+                    if cut == -1:
+                        cut = mm.find(b'\n', end)
+                    end = size if cut == -1 else cut + 1
+                yield _CLEANUP_RE.sub('', mm[start:end].decode('utf-8'))
+                start = end
+
+        def sections(mm):
+            # Markers are removed before splitting, as in split_text_intelligently.
+            # Mirrors re.split with a capturing group: text, header, text, ...
+            # Only the tail that could still become a header is scanned again;
+            # the rest of a section is collected and joined once it is complete
+            parts, tail = [], ''
+            for block in cleaned_blocks(mm):
+                text = tail + block
+                position = 0
+                for match in _GENERATION_SPLIT_RE.finditer(text):
+                    parts.append(text[position:match.start()])
+                    yield ''.join(parts)
+                    parts = []
+                    yield match.group(1)
+                    position = match.end()
+
+                # Keep back a partial generation word or an unfinished header
+                cut = max(position, len(text) - 5)
+                partial = _PARTIAL_GENERATION_RE.search(text, position)
+                if partial:
+                    cut = min(cut, partial.start())
+                parts.append(text[position:cut])
+                tail = text[cut:]
+            parts.append(tail)
+            yield ''.join(parts)
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from self._chunks_from_sections(sections(mm))
+
+    def _chunks_from_sections(self, generation_splits):
+        """Turn generation-split sections into LLM-sized chunks"""
         current_generation = ""
-        for _i, section in enumerate(generation_splits):
+        for section in generation_splits:
             section = section.strip()
             if not section:
                 continue
 
             # Check if this is a generation header
-            if re.match(r'(EERSTE|TWEEDE|DERDE|VIERDE|VIJFDE|ZESDE)', section, re.IGNORECASE):
+            if _GENERATION_HEADER_RE.match(section):
                 current_generation = section + " GENERATIE"
                 continue
 
             # Split further by family groups or natural breaks
-            family_splits = re.split(r'(\d+\.?\d*\.\s+Kinderen van [^:]+:)', section)
+            family_splits = _FAMILY_SPLIT_RE.split(section)
 
-            for _j, subsection in enumerate(family_splits):
+            for subsection in family_splits:
                 subsection = subsection.strip()
                 if len(subsection) > 100:  # Only process substantial chunks
-                    chunk_text = f"{current_generation}\n\n{subsection}" if current_generation else subsection
-                    chunks.append(chunk_text[:4000])  # Limit chunk size for LLM
-
-        logger.info(f"Created {len(chunks)} text chunks for analysis")
-        return chunks
+                    for piece in self._split_to_token_budget(subsection):
+                        yield f"{current_generation}\n\n{piece}" if current_generation else piece
+
+    def count_tokens(self, text: str) -> int:
+        """Count LLM tokens in text, estimating from its length without tiktoken"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return -(-len(text) // self.CHARS_PER_TOKEN)
+
+    def _split_to_token_budget(self, text: str):
+        """Yield pieces of text that each fit MAX_CHUNK_TOKENS
+
+        Pieces end at the last paragraph, line or sentence break before the
+        limit so records are not cut off mid-way.
+        """
+        while text:
+            tokens = self.count_tokens(text)
+            if tokens <= self.MAX_CHUNK_TOKENS:
+                yield text
+                return
+
+            boundary = len(text) * self.MAX_CHUNK_TOKENS // tokens
+            while boundary > 1 and self.count_tokens(text[:boundary]) > self.MAX_CHUNK_TOKENS:
+                boundary = boundary * 9 // 10
+
+            cut = boundary
+            for separator in _CHUNK_BREAKS:
+                position = text.rfind(separator, boundary // 2, boundary)
+                if position != -1:
+                    cut = position + len(separator)
+                    break
+
+            piece = text[:cut].strip()
+            if piece:
+                yield piece
+            text = text[cut:].strip()
+
+    @staticmethod
+    def _annotate_chunk_data(chunk_data: dict, chunk_id: int) -> tuple[list, list]:
+        """Tag every entity in a chunk's result with its chunk, returning (families, isolated_individuals)"""
+        families = chunk_data.get("families", [])
+        for family in families:
+            family['chunk_id'] = chunk_id
+            family['extraction_method'] = 'llm'
+            parents = family.get('parents') or {}
+            for member in (parents.get('father'), parents.get('mother'), *family.get('children', ())):
+                if member:
+                    member['chunk_id'] = chunk_id
+
+        isolated_individuals = chunk_data.get("isolated_individuals", [])
+        for person in isolated_individuals:
+            person['chunk_id'] = chunk_id
+            person['extraction_method'] = 'llm'
+
+        return families, isolated_individuals
 
     def process_all_text(self) -> None:
         """Process the entire family book text"""
@@ -169,53 +466,44 @@ class LLMGenealogyExtractor:
             logger.error(f"Text file not found: {self.text_file}")
             return
 
-        with open(self.text_file, encoding='utf-8') as f:
-            content = f.read()
-
-        chunks = self.split_text_intelligently(content)
-
         all_families = []
         all_isolated_individuals = []
 
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Processing chunk {i+1}/{len(chunks)}")
-
-            chunk_data = self.extract_from_chunk(chunk)
-
-            # Add chunk metadata to families
-            for family in chunk_data.get("families", []):
-                family['chunk_id'] = i
-                family['extraction_method'] = 'llm'
-                # Add chunk metadata to family members
-                if 'parents' in family:
-                    if 'father' in family['parents'] and family['parents']['father']:
-                        family['parents']['father']['chunk_id'] = i
-                    if 'mother' in family['parents'] and family['parents']['mother']:
-                        family['parents']['mother']['chunk_id'] = i
-                for child in family.get('children', []):
-                    child['chunk_id'] = i
-
-            # Add chunk metadata to isolated individuals
-            for person in chunk_data.get("isolated_individuals", []):
-                person['chunk_id'] = i
-                person['extraction_method'] = 'llm'
-
-            all_families.extend(chunk_data.get("families", []))
-            all_isolated_individuals.extend(chunk_data.get("isolated_individuals", []))
-
-            # Small delay to be nice to the LLM
-            import time
-            time.sleep(1)
+        # Resolve the prompt once here; worker threads have no app context
+        prompt_template = self.get_prompt_template()
+
+        def extract(i, chunk):
+            logger.info(f"Processing chunk {i+1}")
+            # Annotate in the worker so the collecting thread only extends lists
+            return self._annotate_chunk_data(self.extract_from_chunk(chunk, custom_prompt=prompt_template), i)
+
+        def collect(annotated):
+            families, isolated_individuals = annotated
+            all_families.extend(families)
+            all_isolated_individuals.extend(isolated_individuals)
+
+        # Only keep a bounded window of chunks in flight so reading the file
+        # overlaps with LLM latency without materialising every chunk up front
+        window = self.max_concurrent_requests * 2
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            for i, chunk in enumerate(self.iter_chunks()):
+                pending.append(executor.submit(extract, i, chunk))
+                if len(pending) >= window:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
 
         self.results = {
             "families": all_families,
             "isolated_individuals": all_isolated_individuals
         }
 
-        total_people = sum(len(f.get('children', [])) for f in all_families)
-        total_people += sum(1 for f in all_families if f.get('parents', {}).get('father'))
-        total_people += sum(1 for f in all_families if f.get('parents', {}).get('mother'))
-        total_people += len(all_isolated_individuals)
+        total_people = len(all_isolated_individuals)
+        for family in all_families:
+            parents = family.get('parents') or {}
+            total_people += len(family.get('children', ()))
+            total_people += bool(parents.get('father')) + bool(parents.get('mother'))
 
         logger.info(f"Extraction complete: found {len(all_families)} families, {len(all_isolated_individuals)} isolated individuals, {total_people} total people")
 
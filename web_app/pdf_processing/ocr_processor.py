@@ -4,17 +4,21 @@ OCR processor for family book PDFs with rotation detection and Dutch/English sup
 """
 
 import logging
+import math
 import os
-import tempfile
+import re
+import shutil
+import threading
 import time
-from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
-import cv2
 import fitz  # PyMuPDF
 import numpy as np
 import pytesseract
-from langdetect import LangDetectException, detect
+from langdetect import DetectorFactory, LangDetectException, detect
 from PIL import Image, ImageOps
 
 from web_app.repositories.ocr_repository import OcrRepository
@@ -23,11 +27,78 @@ from web_app.repositories.ocr_repository import OcrRepository
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# langdetect is randomised by default; a fixed seed keeps results repeatable
+DetectorFactory.seed = 0
+
+# Consolidated text framing, pre-encoded so page files are copied as raw bytes
+_CONSOLIDATED_HEADER = ("FAMILY BOOK - CONSOLIDATED TEXT\n" + "=" * 50 + "\n\n").encode()
+_CONSOLIDATED_SEPARATOR = ("\n" + "=" * 50 + "\n\n").encode()
+
+# Frequent words unique to each language of the corpus; words both languages
+# share ("in", "is", "was", "die") are left out so they never tip the count
+_DUTCH_WORDS = frozenset({
+    'de', 'het', 'een', 'van', 'en', 'te', 'op', 'met', 'voor', 'zijn', 'niet',
+    'dat', 'dit', 'deze', 'werd', 'bij', 'naar', 'uit', 'ook', 'als', 'aan',
+    'om', 'maar', 'hij', 'zij', 'haar', 'heeft', 'geboren', 'overleden',
+    'gehuwd', 'zoon', 'dochter', 'kinderen',
+})
+_ENGLISH_WORDS = frozenset({
+    'the', 'and', 'of', 'to', 'that', 'with', 'this', 'for', 'from', 'his',
+    'he', 'she', 'they', 'are', 'were', 'an', 'about', 'which', 'who', 'born',
+    'died', 'married', 'son', 'daughter', 'children', 'have', 'has', 'not',
+    'but', 'by', 'at', 'it',
+})
+# Fewest stopword hits that decide the language without langdetect
+_MIN_LANGUAGE_HITS = 3
+_WORD_RE = re.compile(r"[a-zà-ÿ]+")
+
+
+def _page_sort_key(path: Path) -> float:
+    """Order numbered page files numerically; other names sort last"""
+    return int(path.stem) if path.stem.isdigit() else math.inf
+
+
 class PDFOCRProcessor:
-    def __init__(self, output_dir: str = "extracted_text"):
+    # Average word confidence below which a reused page rotation is re-detected
+    MIN_ROTATION_CONFIDENCE = 50
+
+    # Longest side, in pixels, of the image used for orientation detection;
+    # orientation only needs a little legible text, not full resolution
+    ORIENTATION_MAX_SIDE = 1200
+
+    # Percent of darkest and lightest pixels autocontrast ignores, so specks
+    # and scanner margins don't pin the range and leave faded ink low-contrast
+    AUTOCONTRAST_CUTOFF = 2
+
+    # Pages whose embedded text layer has more characters than this skip OCR
+    MIN_TEXT_LAYER_CHARS = 50
+
+    # Candidate page render scales, highest first; 2x is about 144 DPI
+    RENDER_SCALES = (2.0, 1.5)
+    # Confidence points a lower scale may lose and still be chosen
+    RENDER_SCALE_TOLERANCE = 2.0
+
+    def __init__(self, output_dir: str = "extracted_text", max_workers: int | None = None,
+                 render_scale: float | None = None, force_ocr: bool = False, enhance: bool = True):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
 
+        # OCR every page even when the PDF carries its own text layer
+        self.force_ocr = force_ocr
+
+        # Grayscale + autocontrast pages before OCR; Tesseract binarizes
+        # internally, so clean scans can skip this preprocessing
+        self.enhance = enhance
+
+        # Page render scale; None calibrates it on the first page processed.
+        # The lock keeps callers rendering on several threads on one scale
+        self.render_scale = render_scale
+        self._render_scale_lock = threading.Lock()
+
+        # Pages OCR'd at once; pytesseract runs tesseract as a subprocess,
+        # so threads keep every core busy without the GIL getting in the way
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+
         # Repository for database operations
         self.ocr_repository = OcrRepository()
 
@@ -36,9 +107,13 @@ class PDFOCRProcessor:
 
     def detect_text_orientation(self, image: Image.Image) -> int:
         """Detect if text is upside down and return rotation angle needed"""
-        # Convert PIL to OpenCV format
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+        # OSD only needs a little legible text, so run it on a small grayscale copy
+        gray_image = image if image.mode == "L" else image.convert("L")
+        scale = self.ORIENTATION_MAX_SIDE / max(gray_image.size)
+        if scale < 1:
+            width, height = gray_image.size
+            gray_image = gray_image.resize((round(width * scale), round(height * scale)), Image.Resampling.BOX)
+        gray = np.asarray(gray_image)
 
         # Try OCR with orientation detection
         try:
@@ -52,118 +127,247 @@ class PDFOCRProcessor:
                     rotation = int(line.split(':')[1].strip())
                     logger.info(f"Detected rotation: {rotation} degrees")
                     return rotation
+            logger.warning("Orientation detection returned no rotation, assuming 0 degrees")
         except Exception as e:
-            logger.warning(f"Could not detect orientation, trying confidence method: {e}")
+            # Typically too little text on the page; a full OCR pass per
+            # candidate rotation would cost far more than the page itself
+            logger.warning(f"Could not detect orientation, assuming 0 degrees: {e}")
 
-        # Fallback: try different rotations and pick the one with highest confidence
-        best_rotation = 0
-        best_confidence = 0
+        return 0
 
-        for rotation in [0, 90, 180, 270]:
-            try:
-                rotated = image.rotate(rotation, expand=True)
-                cv_rotated = cv2.cvtColor(np.array(rotated), cv2.COLOR_RGB2BGR)
-                gray_rotated = cv2.cvtColor(cv_rotated, cv2.COLOR_BGR2GRAY)
-
-                # Get confidence data
-                data = pytesseract.image_to_data(gray_rotated, config=self.tesseract_config, output_type=pytesseract.Output.DICT)
-                confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-
-                if confidences:
-                    avg_confidence = sum(confidences) / len(confidences)
-                    logger.info(f"Rotation {rotation}°: avg confidence {avg_confidence:.1f}")
-
-                    if avg_confidence > best_confidence:
-                        best_confidence = avg_confidence
-                        best_rotation = rotation
-
-            except Exception as e:
-                logger.warning(f"Error testing rotation {rotation}: {e}")
-                continue
+    def extract_text_from_image(self, image: Image.Image, rotation: int | None = None) -> str:
+        """Extract text from a PIL Image using OCR
 
-        logger.info(f"Best rotation: {best_rotation}° (confidence: {best_confidence:.1f})")
-        return best_rotation
-
-    def extract_text_from_image(self, image: Image.Image) -> str:
-        """Extract text from a PIL Image using OCR"""
+        Args:
+            image: Page image
+            rotation: Known rotation, e.g. from an earlier page of the same
+                document. Orientation detection is skipped unless the OCR
+                confidence at that rotation is low.
+        """
         try:
-            # Detect and correct orientation
-            rotation = self.detect_text_orientation(image)
+            hinted = rotation is not None
+            if not hinted:
+                # Detect and correct orientation
+                rotation = self.detect_text_orientation(image)
+
+            page = image
+            if self.enhance:
+                # Enhance image for better OCR; done before rotating so the
+                # rotation only moves a single channel. Rendered PDF pages are
+                # already grayscale, so only other images are converted
+                if page.mode != "L":
+                    page = ImageOps.grayscale(page)
+                page = ImageOps.autocontrast(page, cutoff=self.AUTOCONTRAST_CUTOFF)
+
             if rotation != 0:
-                image = image.rotate(rotation, expand=True)
+                # Quarter turns are lossless transposes in Pillow, not resamples
+                page = page.rotate(rotation, expand=True)
                 logger.info(f"Rotated image by {rotation} degrees")
 
-            # Enhance image for better OCR
-            image = ImageOps.grayscale(image)
-            image = ImageOps.autocontrast(image)
+            if not hinted:
+                # Extract text
+                text = pytesseract.image_to_string(page, config=self.tesseract_config)
+                return text.strip()
 
-            # Extract text
-            text = pytesseract.image_to_string(image, config=self.tesseract_config)
-            return text.strip()
+            # One pass yields both the text and the confidence to verify the rotation
+            data = pytesseract.image_to_data(page, config=self.tesseract_config,
+                                             output_type=pytesseract.Output.DICT)
+            confidences = [float(conf) for conf in data['conf'] if float(conf) > 0]
+            if not confidences or sum(confidences) / len(confidences) < self.MIN_ROTATION_CONFIDENCE:
+                logger.info(f"Low OCR confidence at {rotation} degrees, re-detecting orientation")
+                return self.extract_text_from_image(image)
+            return self._text_from_ocr_data(data)
 
         except Exception as e:
             logger.error(f"Error extracting text from image: {e}")
             return ""
 
-    def process_pdf(self, pdf_path: Path) -> str:
-        """Process a single PDF file and extract text from all pages"""
-        logger.info(f"Processing PDF: {pdf_path.name}")
-
-        try:
-            pdf_document = fitz.open(str(pdf_path))
-            all_text = []
-
-            for page_num in range(len(pdf_document)):
-                logger.info(f"Processing page {page_num + 1}/{len(pdf_document)}")
-
-                page = pdf_document.load_page(page_num)
-
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x scale for better quality
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("ppm")
-
-                # Create PIL Image
-                with tempfile.NamedTemporaryFile(suffix=".ppm", delete=False) as temp_file:
-                    temp_file.write(img_data)
-                    temp_file.flush()
+    @staticmethod
+    def _text_from_ocr_data(data: dict) -> str:
+        """Rebuild image_to_string style text from image_to_data word boxes"""
+        paragraphs = {}
+        for i, word in enumerate(data['text']):
+            if word.strip():
+                lines = paragraphs.setdefault((data['block_num'][i], data['par_num'][i]), {})
+                lines.setdefault(data['line_num'][i], []).append(word)
+        return "\n\n".join(
+            "\n".join(" ".join(words) for words in lines.values())
+            for lines in paragraphs.values()
+        )
 
-                    image = Image.open(temp_file.name)
-                    text = self.extract_text_from_image(image)
+    def process_pdf(self, pdf_path: Path, executor: ThreadPoolExecutor | None = None) -> str:
+        """Process a single PDF file and extract text from all pages
 
-                    if text:
-                        all_text.append(f"=== PAGE {page_num + 1} ===\n{text}\n")
+        Args:
+            pdf_path: PDF to process
+            executor: OCR pool to share with other work; a private pool of
+                max_workers threads is used otherwise
+        """
+        logger.info(f"Processing PDF: {pdf_path.name}")
 
-                    os.unlink(temp_file.name)
+        with ThreadPoolExecutor(max_workers=self.max_workers) if executor is None else nullcontext(executor) as executor:
+            return self._join_page_results(self._submit_pdf_pages(pdf_path, executor, deque()))
 
-            pdf_document.close()
+    def _submit_pdf_pages(self, pdf_path: Path, executor: ThreadPoolExecutor, outstanding: deque) -> list:
+        """Render a PDF's pages on this thread and queue their OCR on executor
 
-            return "\n".join(all_text)
+        Returns (page number, text or pending OCR result) pairs in page order,
+        or an empty list when the PDF can't be read.
+        """
+        try:
+            pdf_document = fitz.open(str(pdf_path))
+            try:
+                return self._submit_document_pages(pdf_document, executor, outstanding)
+            finally:
+                # Free MuPDF's document buffers even when a page fails; the
+                # rendered images don't depend on the document
+                pdf_document.close()
 
         except Exception as e:
             logger.error(f"Error processing PDF {pdf_path}: {e}")
-            return ""
+            return []
+
+    def _submit_document_pages(self, pdf_document, executor: ThreadPoolExecutor, outstanding: deque) -> list:
+        """Render every page of an open PDF and queue its OCR, in page order
+
+        Args:
+            outstanding: OCR results not yet waited for, possibly shared with
+                other PDFs; it bounds how many rendered pages are held in memory
+        """
+        page_count = len(pdf_document)
+        results = []
+
+        # Set up on the first page that actually needs OCR
+        mat = None
+
+        # Orientation is nearly always constant within a document, so it is
+        # detected once and reused; pages with low OCR confidence re-detect
+        rotation = None
+
+        # PyMuPDF documents aren't thread-safe, so pages are rendered here
+        # and only OCR runs in the pool
+        window = self.max_workers * 2
+        for page_num in range(page_count):
+            logger.info(f"Processing page {page_num + 1}/{page_count}")
+
+            page = pdf_document.load_page(page_num)
+            if not self.force_ocr:
+                embedded_text = page.get_text("text").strip()
+                if len(embedded_text) > self.MIN_TEXT_LAYER_CHARS:
+                    results.append((page_num, embedded_text))
+                    continue
+
+            if mat is None:
+                with self._render_scale_lock:
+                    if self.render_scale is None:
+                        self.render_scale = self._calibrate_render_scale(page)
+                mat = fitz.Matrix(self.render_scale, self.render_scale)
+
+            image = self._render_page(page, mat)
+            if rotation is None:
+                try:
+                    rotation = self.detect_text_orientation(image)
+                except Exception as e:
+                    logger.warning(f"Could not detect orientation on page {page_num + 1}: {e}")
+            while len(outstanding) >= window:
+                outstanding.popleft().result()
+            future = executor.submit(self.extract_text_from_image, image, rotation)
+            outstanding.append(future)
+            results.append((page_num, future))
+
+        return results
+
+    @staticmethod
+    def _join_page_results(results: list) -> str:
+        """Wait for queued page OCR and join the page texts in order"""
+        all_text = []
+        for page_num, result in results:
+            # Either text from the PDF's own text layer or a pending OCR result
+            text = result if isinstance(result, str) else result.result()
+            if text:
+                all_text.append(f"=== PAGE {page_num + 1} ===\n{text}\n")
+        return "\n".join(all_text)
+
+    def _calibrate_render_scale(self, page) -> float:
+        """Pick the lowest render scale that OCRs about as confidently as the highest
 
-    def process_all_pdfs(self, pdf_dir: Path) -> None:
-        """Process all numbered PDFs in the directory"""
-        pdf_files = sorted([f for f in pdf_dir.glob("*.pdf") if f.name.replace('.pdf', '').isdigit()])
+        Tesseract's cost grows with pixel count, so clean scans are rendered
+        smaller when that costs less than RENDER_SCALE_TOLERANCE points of
+        average word confidence.
+        """
+        scores = {}
+        try:
+            for scale in self.RENDER_SCALES:
+                image = self._render_page(page, fitz.Matrix(scale, scale))
+                data = pytesseract.image_to_data(image, config=self.tesseract_config,
+                                                 output_type=pytesseract.Output.DICT)
+                confidences = [float(conf) for conf in data['conf'] if float(conf) > 0]
+                scores[scale] = sum(confidences) / len(confidences) if confidences else 0.0
+        except Exception as e:
+            logger.warning(f"Could not calibrate render scale, using {self.RENDER_SCALES[0]}x: {e}")
+            return self.RENDER_SCALES[0]
+
+        best = max(scores.values())
+        scale = min(scale for scale, score in scores.items() if score >= best - self.RENDER_SCALE_TOLERANCE)
+        logger.info(f"Rendering pages at {scale}x (confidence by scale: {scores})")
+        return scale
+
+    def _render_page(self, page, matrix) -> Image.Image:
+        """Rasterize a PDF page straight into a grayscale PIL Image
+
+        OCR only uses grayscale, so MuPDF renders one channel instead of
+        three, and the pixmap's raw samples are wrapped rather than encoding
+        and decoding an intermediate PPM.
+        """
+        pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+        return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+    def process_all_pdfs(self, pdf_dir: Path, skip_existing: bool = True) -> None:
+        """Process all numbered PDFs in the directory
+
+        Args:
+            pdf_dir: Directory containing the numbered PDFs
+            skip_existing: Reuse a PDF's text file when it is newer than the
+                PDF, so re-runs only OCR new or changed files
+        """
+        pdf_files = sorted((f for f in pdf_dir.glob("*.pdf") if f.stem.isdigit()), key=_page_sort_key)
 
         logger.info(f"Found {len(pdf_files)} numbered PDF files to process")
 
+        to_process = []
         for pdf_file in pdf_files:
-            logger.info(f"Processing {pdf_file.name}...")
-
-            text = self.process_pdf(pdf_file)
+            output_file = self.output_dir / f"{pdf_file.stem}.txt"
+            if skip_existing and output_file.exists() and output_file.stat().st_mtime >= pdf_file.stat().st_mtime:
+                logger.info(f"Skipping {pdf_file.name}, text is up to date")
+                continue
+            to_process.append((pdf_file, output_file))
 
+        def save(pdf_file, output_file, results):
+            text = self._join_page_results(results)
             if text:
                 # Save extracted text
-                output_file = self.output_dir / f"{pdf_file.stem}.txt"
                 with open(output_file, 'w', encoding='utf-8') as f:
                     f.write(text)
                 logger.info(f"Saved text to {output_file}")
             else:
                 logger.warning(f"No text extracted from {pdf_file.name}")
 
+        # Books are often split into one-page PDFs, so the next PDFs are
+        # rendered while earlier ones are still being OCR'd. Rendering stays on
+        # this thread because PyMuPDF isn't thread-safe; all pages share one
+        # OCR pool and one window of outstanding pages, and finished PDFs are
+        # saved in order
+        outstanding = deque()
+        started = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ocr_pool:
+            for pdf_file, output_file in to_process:
+                logger.info(f"Processing {pdf_file.name}...")
+                started.append((pdf_file, output_file, self._submit_pdf_pages(pdf_file, ocr_pool, outstanding)))
+                while started and all(isinstance(result, str) or result.done() for _, result in started[0][2]):
+                    save(*started.popleft())
+            while started:
+                save(*started.popleft())
+
         # Create consolidated file
         self.create_consolidated_text()
 
@@ -171,21 +375,21 @@ class PDFOCRProcessor:
         """Combine all extracted text files into one consolidated file"""
         logger.info("Creating consolidated text file...")
 
-        txt_files = sorted(self.output_dir.glob("*.txt"),
-                          key=lambda x: int(x.stem) if x.stem.isdigit() else float('inf'))
+        txt_files = sorted(self.output_dir.glob("*.txt"), key=_page_sort_key)
 
         consolidated_path = self.output_dir / "consolidated_text.txt"
 
-        with open(consolidated_path, 'w', encoding='utf-8') as consolidated:
-            consolidated.write("FAMILY BOOK - CONSOLIDATED TEXT\n")
-            consolidated.write("=" * 50 + "\n\n")
+        # Page files are UTF-8 already, so copy bytes without decoding them;
+        # a large write buffer coalesces the many small page writes
+        with open(consolidated_path, 'wb', buffering=1 << 20) as consolidated:
+            consolidated.write(_CONSOLIDATED_HEADER)
 
             for txt_file in txt_files:
                 if txt_file.name != "consolidated_text.txt":
-                    with open(txt_file, encoding='utf-8') as f:
-                        consolidated.write(f"### FILE: {txt_file.name} ###\n")
-                        consolidated.write(f.read())
-                        consolidated.write("\n" + "="*50 + "\n\n")
+                    with open(txt_file, 'rb') as f:
+                        consolidated.write(f"### FILE: {txt_file.name} ###\n".encode())
+                        shutil.copyfileobj(f, consolidated, length=1 << 20)
+                        consolidated.write(_CONSOLIDATED_SEPARATOR)
 
         logger.info(f"Consolidated text saved to {consolidated_path}")
 
@@ -240,9 +444,7 @@ class PDFOCRProcessor:
         try:
             page = pdf_document.load_page(0)
             mat = fitz.Matrix(2, 2)  # 2x scale for better quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("ppm")
-            image = Image.open(BytesIO(img_data))
+            image = self._render_page(page, mat)
 
             return {'success': True, 'image': image}
 
@@ -256,16 +458,13 @@ class PDFOCRProcessor:
         try:
             ocr_data = pytesseract.image_to_data(image, lang='nld+eng', output_type=pytesseract.Output.DICT)
 
-            text_parts = []
-            confidences = []
+            # Keep non-blank words; Tesseract reports -1 confidence for layout boxes
+            words = np.asarray(ocr_data['text'], dtype=str)
+            mask = np.char.str_len(np.char.strip(words)) > 0
+            confidences = np.asarray(ocr_data['conf'], dtype=float)[mask]
 
-            for i, word in enumerate(ocr_data['text']):
-                if word.strip():
-                    text_parts.append(word)
-                    confidences.append(int(ocr_data['conf'][i]))
-
-            text = ' '.join(text_parts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+            text = ' '.join(words[mask].tolist())
+            avg_confidence = float(confidences.mean()) if confidences.size else 0.0
 
             # Detect language
             detected_lang = self._detect_language(text)
@@ -285,6 +484,14 @@ class PDFOCRProcessor:
         if not text or len(text.strip()) < 10:
             return 'unknown'
 
+        # The corpus is Dutch or English, which stopword counts settle far
+        # faster than langdetect's n-gram model; it only breaks ties
+        words = _WORD_RE.findall(text.lower())
+        dutch_hits = sum(word in _DUTCH_WORDS for word in words)
+        english_hits = sum(word in _ENGLISH_WORDS for word in words)
+        if max(dutch_hits, english_hits) >= _MIN_LANGUAGE_HITS and dutch_hits != english_hits:
+            return 'nl' if dutch_hits > english_hits else 'en'
+
         try:
             return detect(text)
         except LangDetectException:
@@ -3,6 +3,7 @@ Base repository classes to eliminate duplication and standardize patterns
 """
 
 from abc import ABC
+from collections import OrderedDict
 from collections.abc import Callable
 from typing import Any, TypeVar
 
@@ -15,6 +16,30 @@ from web_app.shared.logging_config import get_project_logger
 # Generic type for model classes
 ModelType = TypeVar('ModelType')
 
+# Default number of entries kept by repository caches
+CACHE_MAX_SIZE = 10_000
+
+
+class LRUCache(OrderedDict):
+    """Dict capped at max_size entries, evicting the least recently used one"""
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        """Return the value for key and mark it as recently used"""
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
 
 class BaseRepository(ABC):
     """
@@ -32,13 +57,16 @@ class BaseRepository(ABC):
         self.db_session = db_session or db.session
         self.logger = get_project_logger(self.__class__.__name__)
 
-    def safe_operation(self, operation: Callable[[], Any], operation_name: str = "operation") -> Any:
+    def safe_operation(self, operation: Callable[[], Any], operation_name: str = "operation",
+                       flush: bool = True) -> Any:
         """
         Execute database operation with standard error handling
 
         Args:
             operation: Function to execute (should return result)
             operation_name: Description for logging purposes
+            flush: Flush afterwards; pass False to leave pending changes for
+                the caller's next flush while keeping rollback on error
 
         Returns:
             Result of the operation
@@ -48,7 +76,8 @@ class BaseRepository(ABC):
         """
         try:
             result = operation()
-            self.db_session.flush()  # Standard pattern: flush instead of commit
+            if flush:
+                self.db_session.flush()  # Standard pattern: flush instead of commit
             self.logger.debug(f"Repository {operation_name} completed successfully")
             return result
         except SQLAlchemyError as e:
@@ -181,7 +210,7 @@ class CacheableMixin:
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._cache = {}
+        self._cache = LRUCache()
 
     def clear_cache(self):
         """Clear the internal cache"""
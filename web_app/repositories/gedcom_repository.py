@@ -12,6 +12,16 @@ class GedcomRepository(GenealogyBaseRepository):
     def __init__(self, db_session=None):
         super().__init__(db_session)
 
+    def prefetch_places(self, persons: list[dict], families: list[dict]) -> None:
+        """Resolve every place used by parsed GEDCOM records in one batch"""
+        place_names = [
+            person_data.get(field, '')
+            for person_data in persons
+            for field in ('birth_place', 'baptism_place', 'death_place')
+        ]
+        place_names.extend(family_data.get('marriage_place', '') for family_data in families)
+        self.prefetch_place_ids(place_names)
+
     def create_person(self, person_data: dict) -> Person:
         """Create a person from parsed GEDCOM data"""
         def _create_person():
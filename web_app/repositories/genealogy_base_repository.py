@@ -2,8 +2,12 @@
 Base repository for genealogy operations - shared functionality for all genealogy repositories
 """
 
+import uuid
+
+from sqlalchemy import func, select
+
 from web_app.database.models import Event, Family, Marriage, Person, Place
-from web_app.repositories.base_repository import BaseRepository
+from web_app.repositories.base_repository import BaseRepository, LRUCache
 
 
 class GenealogyBaseRepository(BaseRepository):
@@ -11,18 +15,25 @@ class GenealogyBaseRepository(BaseRepository):
 
     def __init__(self, db_session=None):
         super().__init__(db_session)
-        self.place_cache: dict[str, Place] = {}
+        # Bounded so long imports don't pin every Place object in memory
+        self.place_cache: LRUCache = LRUCache()
+        # Place ids resolved in bulk for the current job, keyed by Place.normalize_name
+        self.place_id_cache: dict[str, uuid.UUID] = {}
+        # Places this repository inserted, as opposed to found already stored
+        self.places_created = 0
 
     def get_or_create_place(self, place_name: str) -> Place | None:
         """Get or create a Place object, return the Place"""
         if not place_name or not place_name.strip():
             return None
 
-        place_name = place_name.strip()
+        # Same normalization as the batch path, so both resolve to one row
+        place_name = Place.normalize_name(place_name)
 
         # Check cache first
-        if place_name in self.place_cache:
-            return self.place_cache[place_name]
+        cached_place = self.place_cache.get(place_name)
+        if cached_place:
+            return cached_place
 
         def _get_or_create_place():
             # Check if place exists in database
@@ -31,19 +42,48 @@ class GenealogyBaseRepository(BaseRepository):
                 self.place_cache[place_name] = existing_place
                 return existing_place
 
-            # Create new place
-            new_place = Place(name=place_name)
+            # Create new place with a client-side id so callers can reference it
+            # right away; the INSERT waits for the caller's next flush
+            new_place = Place(id=uuid.uuid4(), name=place_name)
             self.db_session.add(new_place)
-            # safe_operation will flush after this function returns
+            self.places_created += 1
             return new_place
 
-        result = self.safe_operation(_get_or_create_place, f"get or create place {place_name}")
+        result = self.safe_operation(_get_or_create_place, f"get or create place {place_name}", flush=False)
 
         # Cache the result and return it
         if result:
             self.place_cache[place_name] = result
         return result
 
+    def prefetch_place_ids(self, place_names) -> dict[str, uuid.UUID]:
+        """Resolve all given place names in one batch and remember their ids for this job"""
+        pending = {
+            Place.normalize_name(name) for name in place_names
+            if name and name.strip()
+        } - self.place_id_cache.keys()
+        if pending:
+            created = set()
+            resolved = self.safe_operation(
+                lambda: Place.get_or_create_many(pending, session=self.db_session, created=created),
+                f"resolve {len(pending)} places"
+            )
+            self.place_id_cache.update(resolved)
+            self.places_created += len(created)
+        return self.place_id_cache
+
+    def get_place_id(self, place_name: str) -> uuid.UUID | None:
+        """Return the id for a place name, using prefetched ids before falling back to a lookup"""
+        if not place_name or not place_name.strip():
+            return None
+
+        place_id = self.place_id_cache.get(Place.normalize_name(place_name))
+        if place_id:
+            return place_id
+
+        place = self.get_or_create_place(place_name)
+        return place.id if place else None
+
     def clear_all_genealogy_data(self) -> None:
         """Clear all genealogy data from database"""
         def _clear_all_data():
@@ -55,6 +95,8 @@ class GenealogyBaseRepository(BaseRepository):
             Place.query.delete()
             # Clear cache as well
             self.place_cache.clear()
+            self.place_id_cache.clear()
+            self.places_created = 0
             self.logger.info("All genealogy data cleared from database")
 
         self.safe_operation(_clear_all_data, "clear all genealogy data")
@@ -62,41 +104,40 @@ class GenealogyBaseRepository(BaseRepository):
     def get_database_stats(self) -> dict[str, int]:
         """Get database statistics"""
         def _get_stats():
-            return {
-                'total_people': Person.query.count(),
-                'total_families': Family.query.count(),
-                'total_marriages': Marriage.query.count(),
-                'total_events': Event.query.count(),
-                'total_places': Place.query.count()
+            # One round trip: each count is a scalar subquery in a single SELECT
+            counts = {
+                'total_people': Person,
+                'total_families': Family,
+                'total_marriages': Marriage,
+                'total_events': Event,
+                'total_places': Place
             }
+            stmt = select(*(
+                select(func.count()).select_from(model).scalar_subquery().label(key)
+                for key, model in counts.items()
+            ))
+            return dict(self.db_session.execute(stmt).one()._mapping)
 
         return self.safe_query(_get_stats, "get database stats")
 
+    def basic_person_fields(self, person_data: dict) -> dict:
+        """Column values common to both data formats, with places resolved to ids"""
+        return {
+            'given_names': person_data.get('given_names', ''),
+            'surname': person_data.get('surname', ''),
+            'tussenvoegsel': person_data.get('tussenvoegsel', ''),
+            'birth_date': person_data.get('birth_date', ''),
+            'baptism_date': person_data.get('baptism_date', ''),
+            'death_date': person_data.get('death_date', ''),
+            'notes': person_data.get('notes', '').strip(),
+            'birth_place_id': self.get_place_id(person_data.get('birth_place', '')),
+            'baptism_place_id': self.get_place_id(person_data.get('baptism_place', '')),
+            'death_place_id': self.get_place_id(person_data.get('death_place', '')),
+        }
+
     def create_basic_person(self, person_data: dict) -> Person:
         """Create a Person with common fields - to be extended by subclasses"""
-        person = Person()
-
-        # Set common fields that exist in both data formats
-        person.given_names = person_data.get('given_names', '')
-        person.surname = person_data.get('surname', '')
-        person.tussenvoegsel = person_data.get('tussenvoegsel', '')
-        person.birth_date = person_data.get('birth_date', '')
-        person.baptism_date = person_data.get('baptism_date', '')
-        person.death_date = person_data.get('death_date', '')
-        person.notes = person_data.get('notes', '').strip()
-
-        # Handle places
-        if person_data.get('birth_place'):
-            birth_place = self.get_or_create_place(person_data['birth_place'])
-            person.birth_place_id = birth_place.id if birth_place else None
-        if person_data.get('baptism_place'):
-            baptism_place = self.get_or_create_place(person_data['baptism_place'])
-            person.baptism_place_id = baptism_place.id if baptism_place else None
-        if person_data.get('death_place'):
-            death_place = self.get_or_create_place(person_data['death_place'])
-            person.death_place_id = death_place.id if death_place else None
-
-        return person
+        return Person(**self.basic_person_fields(person_data))
 
     def create_basic_family(self, family_data: dict) -> Family:
         """Create a Family with common fields - to be extended by subclasses"""
@@ -108,7 +149,6 @@ class GenealogyBaseRepository(BaseRepository):
 
         # Handle marriage place
         if family_data.get('marriage_place'):
-            marriage_place = self.get_or_create_place(family_data['marriage_place'])
-            family.marriage_place_id = marriage_place.id if marriage_place else None
+            family.marriage_place_id = self.get_place_id(family_data['marriage_place'])
 
         return family
@@ -2,10 +2,16 @@
 Repository for genealogy data operations - separated from business logic
 """
 
+from sqlalchemy import insert
+
 from web_app.database.models import Family, Marriage, Person
 from web_app.repositories.genealogy_base_repository import GenealogyBaseRepository
 
 
+# Families added between flushes; relationships wire up foreign keys at flush time
+FLUSH_BATCH_SIZE = 500
+
+
 class GenealogyDataRepository(GenealogyBaseRepository):
     """Repository for genealogy data operations"""
 
@@ -23,6 +29,9 @@ class GenealogyDataRepository(GenealogyBaseRepository):
             # Clear existing data first
             self.clear_all_data()
 
+            # Resolve every mentioned place up front so person/family creation hits the cache
+            self.prefetch_place_ids(self._collect_place_names(families, isolated_individuals))
+
             # Create families
             family_count = 0
             for family_data in families:
@@ -30,19 +39,19 @@ class GenealogyDataRepository(GenealogyBaseRepository):
                 if family:
                     self.db_session.add(family)
                     family_count += 1
+                    if family_count % FLUSH_BATCH_SIZE == 0:
+                        self.db_session.flush()
 
-            # Create isolated individuals
-            person_count = 0
-            for person_data in isolated_individuals:
-                person = self._create_person_from_data(person_data)
-                if person:
-                    self.db_session.add(person)
-                    person_count += 1
+            # Insert isolated individuals in one executemany, skipping per-object bookkeeping
+            person_rows = [self._person_fields_from_data(person_data) for person_data in isolated_individuals]
+            if person_rows:
+                self.db_session.execute(insert(Person), person_rows)
+            person_count = len(person_rows)
 
             result = {
                 'families_created': family_count,
                 'people_created': person_count,
-                'places_created': len(self.place_cache)
+                'places_created': self.places_created
             }
 
             self.logger.info(f"Saved extraction data: {result}")
@@ -50,6 +59,23 @@ class GenealogyDataRepository(GenealogyBaseRepository):
 
         return self.safe_operation(_save_extraction_data, "save extraction data")
 
+    @staticmethod
+    def _collect_place_names(families: list[dict], isolated_individuals: list[dict]) -> set[str]:
+        """Collect every place name mentioned in extraction data"""
+        people = list(isolated_individuals)
+        names = set()
+        for family_data in families:
+            parents = family_data.get('parents', {})
+            names.add(parents.get('marriage_place', ''))
+            people.extend(parents[role] for role in ('father', 'mother') if parents.get(role))
+            people.extend(family_data.get('children', []))
+
+        for person_data in people:
+            for field in ('birth_place', 'baptism_place', 'death_place'):
+                names.add(person_data.get(field, ''))
+
+        return {name for name in names if name}
+
     def _create_family_from_data(self, family_data: dict) -> Family | None:
         """Create Family object from extracted data"""
         # Use base class to create family with common fields
@@ -73,22 +99,20 @@ class GenealogyDataRepository(GenealogyBaseRepository):
                 father = self._create_person_from_data(parents['father'])
                 if father:
                     self.db_session.add(father)
-                    self.db_session.flush()  # Get the ID
-                    family.father_id = father.id
+                    family.father = father
 
             # Create mother
             if 'mother' in parents:
                 mother = self._create_person_from_data(parents['mother'])
                 if mother:
                     self.db_session.add(mother)
-                    self.db_session.flush()  # Get the ID
-                    family.mother_id = mother.id
+                    family.mother = mother
 
             # Create marriage record if we have both parents
-            if family.father_id and family.mother_id:
+            if family.father and family.mother:
                 marriage = Marriage(
-                    person1_id=family.father_id,
-                    person2_id=family.mother_id,
+                    person1=family.father,
+                    person2=family.mother,
                     marriage_date=parents.get('marriage_date', ''),
                     notes=parents.get('notes', '')
                 )
@@ -96,9 +120,7 @@ class GenealogyDataRepository(GenealogyBaseRepository):
                 # Handle marriage place
                 marriage_place_name = parents.get('marriage_place', '')
                 if marriage_place_name:
-                    marriage_place = self.get_or_create_place(marriage_place_name)
-                    if marriage_place:
-                        marriage.marriage_place_id = marriage_place.id
+                    marriage.marriage_place_id = self.get_place_id(marriage_place_name)
 
                 self.db_session.add(marriage)
 
@@ -108,14 +130,13 @@ class GenealogyDataRepository(GenealogyBaseRepository):
                 child = self._create_person_from_data(child_data)
                 if child:
                     self.db_session.add(child)
-                    self.db_session.flush()  # Get the ID
                     family.children.append(child)
 
-        self.logger.debug(f"Created family: {family.family_identifier or family.id}")
+        self.logger.debug(f"Created family: {family.family_identifier or 'unnamed'}")
         return family
 
-    def _create_person_from_data(self, person_data: dict) -> Person | None:
-        """Create Person object from extracted data"""
+    def _person_fields_from_data(self, person_data: dict) -> dict:
+        """Build Person column values from extracted data"""
         # Parse name components first
         given_names, tussenvoegsel, surname = self._parse_dutch_name(person_data)
 
@@ -133,11 +154,14 @@ class GenealogyDataRepository(GenealogyBaseRepository):
             'notes': person_data.get('notes', '')
         }
 
-        # Use base class to create person with common fields
-        person = self.create_basic_person(person_common_data)
+        # Use base class for common fields, then add extraction-specific ones
+        fields = self.basic_person_fields(person_common_data)
+        fields['confidence_score'] = person_data.get('confidence_score', 0.0)
+        return fields
 
-        # Add extraction-specific fields
-        person.confidence_score = person_data.get('confidence_score', 0.0)
+    def _create_person_from_data(self, person_data: dict) -> Person | None:
+        """Create Person object from extracted data"""
+        person = Person(**self._person_fields_from_data(person_data))
 
         self.logger.debug(f"Created person: {person.given_names} {person.surname}")
         return person
@@ -4,7 +4,9 @@ Repository for RAG (Retrieval-Augmented Generation) database operations
 
 import uuid
 
-from sqlalchemy import delete, func, select, text
+import numpy as np
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import bindparam, delete, func, select, text
 
 from web_app.database.models import ExtractionPrompt, Query, SourceText, TextCorpus
 from web_app.repositories.base_repository import BaseRepository
@@ -84,6 +86,10 @@ class RAGRepository(BaseRepository):
             else:
                 corpus_id_uuid = corpus_id
 
+            # Store the norm once so similarity math against this chunk can skip it
+            embedding = kwargs.get('embedding')
+            embedding_norm = float(np.linalg.norm(embedding)) if embedding is not None else None
+
             source_text = SourceText(
                 corpus_id=corpus_id_uuid,
                 filename=kwargs.get('filename'),
@@ -91,7 +97,8 @@ class RAGRepository(BaseRepository):
                 chunk_number=kwargs.get('chunk_number'),
                 content=kwargs.get('content'),
                 content_hash=kwargs.get('content_hash'),
-                embedding=kwargs.get('embedding'),
+                embedding=embedding,
+                embedding_norm=embedding_norm,
                 embedding_model=kwargs.get('embedding_model'),
                 token_count=kwargs.get('token_count'),
                 dm_codes=kwargs.get('dm_codes'),
@@ -106,7 +113,7 @@ class RAGRepository(BaseRepository):
 
         return self.safe_operation(_create_source_text, f"create source text for corpus {corpus_id}")
 
-    def get_source_text_by_hash(self, corpus_id: str | uuid.UUID, content_hash: str) -> SourceText | None:
+    def get_source_text_by_hash(self, corpus_id: str | uuid.UUID, content_hash: bytes) -> SourceText | None:
         """Check if source text with content hash already exists"""
         def _get_by_hash():
             if isinstance(corpus_id, str):
@@ -134,6 +141,15 @@ class RAGRepository(BaseRepository):
             if isinstance(conversation_id, str):
                 kwargs['conversation_id'] = uuid.UUID(conversation_id)
 
+            if kwargs.get('conversation_id') and kwargs.get('message_sequence') is None:
+                # Serialize writers to this conversation until commit, then number the
+                # message inside the INSERT so concurrent requests cannot reuse a sequence
+                self.db_session.execute(
+                    text("SELECT pg_advisory_xact_lock(hashtext(:conversation_id))"),
+                    {'conversation_id': str(kwargs['conversation_id'])}
+                )
+                kwargs['message_sequence'] = Query.next_sequence_expression(kwargs['conversation_id'])
+
             query = Query(**kwargs)
             self.db_session.add(query)
             return query
@@ -306,22 +322,11 @@ class RAGRepository(BaseRepository):
 
         return self.safe_query(_get_by_name_type, f"get prompt by name {name} and type {prompt_type}")
 
-    def find_similar(self, query_embedding, corpus_id: str | uuid.UUID = None, limit: int = 5, similarity_threshold: float = 0.7) -> list[tuple[SourceText, float]]:
-        """Find text chunks similar to the query embedding using cosine similarity"""
-        from sqlalchemy import text
+    def find_similar(self, query_embedding, corpus_id: str | uuid.UUID = None, limit: int = 5, similarity_threshold: float = 0.7,
+                     keywords: str | None = None) -> list[tuple[SourceText, float]]:
+        """Find text chunks similar to the query embedding, optionally restricted to keyword matches"""
 
         def _find_similar():
-            # Convert numpy array to list for pgvector compatibility
-            if hasattr(query_embedding, 'tolist'):
-                query_embedding_list = query_embedding.tolist()
-            elif isinstance(query_embedding, list):
-                query_embedding_list = query_embedding
-            else:
-                query_embedding_list = list(query_embedding)
-
-            # Convert embedding to vector string for PostgreSQL
-            vector_str = '[' + ','.join(map(str, query_embedding_list)) + ']'
-
             if isinstance(corpus_id, str):
                 corpus_id_uuid = uuid.UUID(corpus_id)
             else:
@@ -330,23 +335,35 @@ class RAGRepository(BaseRepository):
             # Build query with optional corpus filter
             where_clause = "WHERE embedding IS NOT NULL"
             params = {
+                'query_vector': np.asarray(query_embedding, dtype=np.float32),
                 'limit': limit,
-                'similarity_threshold': similarity_threshold
+                'max_distance': 1.0 - similarity_threshold
             }
 
             if corpus_id_uuid:
                 where_clause += " AND corpus_id = :corpus_id"
                 params['corpus_id'] = corpus_id_uuid
 
+            if keywords:
+                where_clause += " AND content_tsvector @@ plainto_tsquery('dutch', :keywords)"
+                params['keywords'] = keywords
+
+            # The query vector is bound once as a halfvec parameter rather than formatted into the SQL
             query = text(f"""
-                SELECT *, (1 - (embedding <=> '{vector_str}'::vector)) as similarity
+                SELECT id, corpus_id, filename, page_number, chunk_number, content, content_hash,
+                       embedding_model, token_count, created_at, updated_at, content_tsvector,
+                       dm_codes, generation_number, generation_text, family_context, birth_years,
+                       chunk_type,
+                       (1 - (embedding <=> CAST(:query_vector AS halfvec))) as similarity
                 FROM source_texts
                 {where_clause}
-                AND (1 - (embedding <=> '{vector_str}'::vector)) >= :similarity_threshold
-                ORDER BY embedding <=> '{vector_str}'::vector
+                AND embedding <=> CAST(:query_vector AS halfvec) <= :max_distance
+                ORDER BY embedding <=> CAST(:query_vector AS halfvec)
                 LIMIT :limit
-            """)
+            """).bindparams(bindparam('query_vector', type_=HALFVEC(1024)))
 
+            # Widen the HNSW candidate list for this transaction only
+            self.db_session.execute(text(f"SET LOCAL hnsw.ef_search = {SourceText.HNSW_EF_SEARCH}"))
             result = self.db_session.execute(query, params)
 
             # Convert results to SourceText objects with similarity scores
@@ -359,8 +376,7 @@ class RAGRepository(BaseRepository):
                     page_number=row.page_number,
                     chunk_number=row.chunk_number,
                     content=row.content,
-                    content_hash=row.content_hash,
-                    embedding=row.embedding,
+                    content_hash=bytes(row.content_hash) if row.content_hash is not None else None,
                     embedding_model=row.embedding_model,
                     token_count=row.token_count,
                     created_at=row.created_at,
@@ -409,15 +425,6 @@ class RAGRepository(BaseRepository):
             else:
                 corpus_id_uuid = corpus_id
 
-            # Convert embedding to vector string for PostgreSQL
-            if hasattr(query_embedding, 'tolist'):
-                query_embedding_list = query_embedding.tolist()
-            elif isinstance(query_embedding, list):
-                query_embedding_list = query_embedding
-            else:
-                query_embedding_list = list(query_embedding)
-            vector_str = '[' + ','.join(map(str, query_embedding_list)) + ']'
-
             # Convert DM codes array to PostgreSQL array literal
             if query_dm_codes:
                 dm_codes_str = "ARRAY[" + ",".join(f"'{code}'" for code in query_dm_codes) + "]"
@@ -429,7 +436,7 @@ class RAGRepository(BaseRepository):
                 WITH
                 params AS (
                   SELECT
-                    '{vector_str}'::vector AS q_vec,
+                    CAST(:query_vector AS halfvec) AS q_vec,
                     plainto_tsquery('dutch', :query_text) AS q_ts,
                     {dm_codes_str} AS q_dm
                 ),
@@ -483,23 +490,24 @@ class RAGRepository(BaseRepository):
                 )
 
                 SELECT st.id, st.corpus_id, st.filename, st.page_number, st.chunk_number,
-                       st.content, st.content_hash, st.embedding, st.embedding_model,
+                       st.content, st.content_hash, st.embedding_model,
                        st.token_count, st.created_at, st.updated_at, st.content_tsvector,
                        st.dm_codes, st.generation_number, st.generation_text, st.family_context,
                        st.birth_years, st.chunk_type, SUM(rrf.score) as combined_score
                 FROM   rrf
                 JOIN   source_texts st ON rrf.id = st.id
                 GROUP  BY st.id, st.corpus_id, st.filename, st.page_number, st.chunk_number,
-                          st.content, st.content_hash, st.embedding, st.embedding_model,
+                          st.content, st.content_hash, st.embedding_model,
                           st.token_count, st.created_at, st.updated_at, st.content_tsvector,
                           st.dm_codes, st.generation_number, st.generation_text, st.family_context,
                           st.birth_years, st.chunk_type
                 ORDER  BY SUM(rrf.score) DESC
                 LIMIT  :limit
-            """)
+            """).bindparams(bindparam('query_vector', type_=HALFVEC(1024)))
 
             # Execute the query
             result = self.db_session.execute(hybrid_query, {
+                'query_vector': np.asarray(query_embedding, dtype=np.float32),
                 'query_text': query_text,
                 'corpus_id': corpus_id_uuid,
                 'vec_limit': vec_limit,
@@ -520,8 +528,7 @@ class RAGRepository(BaseRepository):
                     page_number=row.page_number,
                     chunk_number=row.chunk_number,
                     content=row.content,
-                    content_hash=row.content_hash,
-                    embedding=row.embedding,
+                    content_hash=bytes(row.content_hash) if row.content_hash is not None else None,
                     embedding_model=row.embedding_model,
                     token_count=row.token_count,
                     created_at=row.created_at,
@@ -109,6 +109,9 @@ class GedcomService:
             repo = GedcomRepository()
             persons = {}
 
+            # Resolve all places up front instead of one lookup per record
+            repo.prefetch_places(list(parsed_data['persons'].values()), list(parsed_data['families'].values()))
+
             # Create persons first
             for gedcom_id, person_data in parsed_data['persons'].items():
                 person = repo.create_person(person_data)
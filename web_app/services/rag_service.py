@@ -170,7 +170,7 @@ class RAGService:
             raise NotFoundError(f"Corpus not found: {corpus_id}")
 
         # Generate content hash for deduplication (using raw content)
-        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        content_hash = hashlib.sha256(content.encode()).digest()
 
         # Check if this content already exists using repository
         existing = self.rag_repository.get_source_text_by_hash(corpus_id, content_hash)
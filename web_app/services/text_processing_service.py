@@ -267,7 +267,7 @@ class TextProcessingService:
                 'genealogical_context': self._get_chunk_genealogical_context(
                     chunk_content, chunk_start, anchors
                 ),
-                'content_hash': hashlib.sha256(chunk_content.encode()).hexdigest()
+                'content_hash': hashlib.sha256(chunk_content.encode()).digest()
             }
 
             enriched_chunks.append(enriched_chunk)
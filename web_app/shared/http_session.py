@@ -0,0 +1,38 @@
+"""
+Pooled HTTP sessions for talking to Ollama and other local services
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Statuses that mean "busy, try again later" rather than a failed request
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def create_http_session(pool_connections: int = 10, pool_maxsize: int = 20,
+                        retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """Create a requests session that keeps connections alive between calls
+
+    pool_maxsize should be at least the number of threads sharing the session,
+    otherwise extra connections are opened and discarded after each request.
+    Requests answered with a busy status are retried with exponential backoff
+    (honouring Retry-After), so callers don't need fixed pauses between calls.
+    """
+    retry = Retry(
+        total=retries,
+        connect=0,
+        read=0,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # Ollama generate calls are POSTs
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Connection': 'keep-alive', 'Accept-Encoding': 'gzip'})
+    return session
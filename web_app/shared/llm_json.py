@@ -0,0 +1,144 @@
+"""
+Helpers for pulling JSON out of free-form LLM responses
+"""
+
+import json
+
+
+try:
+    import orjson
+except ImportError:  # Optional faster parser; the stdlib json module is used instead
+    orjson = None
+
+
+_decoder = json.JSONDecoder()
+
+
+def loads(data: str | bytes):
+    """Parse JSON with orjson when available
+
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch
+    the same exception either way.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def extract_json_object(text: str):
+    """Decode the first JSON object embedded in an LLM response
+
+    Decodes from the first '{' and ignores anything after the object closes,
+    so trailing notes containing braces don't break parsing. When that fails,
+    a brace-balanced scan tries each later '{...}' object in turn, skipping
+    prose such as "{unsure}" before the JSON.
+
+    Returns:
+        The decoded object, or None if the text contains no '{'
+
+    Raises:
+        json.JSONDecodeError: If no balanced '{...}' span is valid JSON
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    # Common case: the response is nothing but the JSON object
+    if orjson is not None and text.rstrip().endswith('}'):
+        try:
+            return orjson.loads(text[start:])
+        except orjson.JSONDecodeError:
+            pass
+
+    try:
+        obj, _ = _decoder.raw_decode(text, start)
+        return obj
+    except json.JSONDecodeError:
+        scanner = JsonObjectScanner()
+        if not scanner.feed(text[start:]):
+            raise
+        return scanner.value
+
+
+class JsonObjectScanner:
+    """Incrementally detect when a streamed response contains a complete JSON object
+
+    Tracks brace depth outside of strings as fragments arrive. When the
+    outermost object closes it is test-parsed, so stray braces in
+    text before the JSON don't end the stream early. The decoded object
+    is kept in ``value``.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._length = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.complete = False
+        self.value = None
+
+    def feed(self, fragment: str) -> bool:
+        """Add a fragment and return whether a complete object has been seen"""
+        if self.complete:
+            return True
+
+        offset = self._length
+        self._buffer.append(fragment)
+        self._length += len(fragment)
+
+        for i, char in enumerate(fragment, start=offset):
+            if self._start is None:
+                if char == '{':
+                    self._start = i
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    text = ''.join(self._buffer)
+                    try:
+                        self.value = loads(text[self._start:i + 1])
+                    except json.JSONDecodeError:
+                        # Not the JSON payload; keep looking for the next object
+                        self._start = None
+                        continue
+                    self.complete = True
+                    return True
+        return False
+
+
+def read_streamed_generation(response) -> str:
+    """Collect a streamed Ollama /api/generate response
+
+    Stops reading as soon as the response contains a complete JSON object;
+    closing the response drops the connection, which makes Ollama stop
+    generating the remaining tokens.
+    """
+    scanner = JsonObjectScanner()
+    parts = []
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = loads(line)
+            fragment = data.get('response', '')
+            parts.append(fragment)
+            if scanner.feed(fragment) or data.get('done'):
+                break
+    finally:
+        response.close()
+    return ''.join(parts)
@@ -46,7 +46,9 @@ class ExtractionTaskManager(BaseTaskManager):
             text_file=str(self.text_file),
             ollama_host=os.environ.get('OLLAMA_HOST', '192.168.1.234'),
             ollama_port=int(os.environ.get('OLLAMA_PORT', 11434)),
-            ollama_model=os.environ.get('OLLAMA_MODEL', 'aya:35b-23')
+            ollama_model=os.environ.get('OLLAMA_MODEL', 'aya:35b-23'),
+            backend=os.environ.get('LLM_BACKEND', 'ollama'),
+            cache_dir=os.environ.get('LLM_CACHE_DIR') or None
         )
 
     def _load_and_split_text(self):
@@ -185,54 +187,58 @@ class ExtractionTaskManager(BaseTaskManager):
         self.update_progress('initializing', 0)
 
         self.extractor = self._create_extractor()
-        self._load_and_split_text()
+        try:
+            self._load_and_split_text()
 
-        self.update_progress(
-            'processing', 5,
-            total_chunks=len(self.chunks),
-            current_chunk=0
-        )
+            self.update_progress(
+                'processing', 5,
+                total_chunks=len(self.chunks),
+                current_chunk=0
+            )
+
+            # Get active prompt once
+            active_prompt = self._get_active_prompt()
 
-        # Get active prompt once
-        active_prompt = self._get_active_prompt()
+            # Process chunks
+            for i, chunk in enumerate(self.chunks):
+                current_chunk = i + 1
+                progress = int((i / len(self.chunks)) * 85) + 5  # 5-90% for processing
 
-        # Process chunks
-        for i, chunk in enumerate(self.chunks):
-            current_chunk = i + 1
-            progress = int((i / len(self.chunks)) * 85) + 5  # 5-90% for processing
+                logger.info(f"Processing chunk {current_chunk}/{len(self.chunks)}")
 
-            logger.info(f"Processing chunk {current_chunk}/{len(self.chunks)}")
+                self.update_progress(
+                    'processing', progress,
+                    total_chunks=len(self.chunks),
+                    current_chunk=current_chunk
+                )
 
+                chunk_data = self._process_chunk(i, chunk, active_prompt)
+                self.all_families.extend(chunk_data.get("families", []))
+                self.all_isolated_individuals.extend(chunk_data.get("isolated_individuals", []))
+
+            # Save to database
             self.update_progress(
-                'processing', progress,
+                'saving', 95,
                 total_chunks=len(self.chunks),
-                current_chunk=current_chunk
+                current_chunk=len(self.chunks)
             )
 
-            chunk_data = self._process_chunk(i, chunk, active_prompt)
-            self.all_families.extend(chunk_data.get("families", []))
-            self.all_isolated_individuals.extend(chunk_data.get("isolated_individuals", []))
-
-        # Save to database
-        self.update_progress(
-            'saving', 95,
-            total_chunks=len(self.chunks),
-            current_chunk=len(self.chunks)
-        )
-
-        save_result = self._save_to_database()
-
-        # Return results
-        return {
-            'success': True,
-            'total_families': len(self.all_families),
-            'total_isolated_individuals': len(self.all_isolated_individuals),
-            'total_people': self._count_total_people(),
-            'families_created': save_result['families_created'],
-            'people_created': save_result['people_created'],
-            'places_created': save_result['places_created'],
-            'summary': self._calculate_summary()
-        }
+            save_result = self._save_to_database()
+
+            # Return results
+            return {
+                'success': True,
+                'total_families': len(self.all_families),
+                'total_isolated_individuals': len(self.all_isolated_individuals),
+                'total_people': self._count_total_people(),
+                'families_created': save_result['families_created'],
+                'people_created': save_result['people_created'],
+                'places_created': save_result['places_created'],
+                'summary': self._calculate_summary()
+            }
+        finally:
+            # Release the extractor's pooled HTTP connections
+            self.extractor.close()
 
     def _calculate_summary(self) -> dict:
         """Calculate extraction summary statistics"""
@@ -258,7 +258,7 @@ def process_chunk(self, corpus_id: str, chunk_text: str, chunk_number: int, file
         chunk_number: Index of this chunk
         filename: Source filename
         page_number: Page number (optional)
-        content_hash: Content hash for deduplication
+        content_hash: Hex-encoded SHA-256 content hash for deduplication
 
     Returns:
         dict: Processing results for this chunk
@@ -301,7 +301,7 @@ def process_chunk(self, corpus_id: str, chunk_text: str, chunk_number: int, file
             page_number=page_number,
             chunk_number=chunk_number,
             content=chunk_text,
-            content_hash=content_hash,
+            content_hash=bytes.fromhex(content_hash) if content_hash else None,
             embedding=embedding,
             embedding_model=corpus.embedding_model,
             token_count=len(chunk_text.split()),
@@ -444,7 +444,7 @@ def process_corpus_parallel(self, corpus_id: str):
             task_manager.corpus.raw_content, spellfix=False
         )
 
-        # Generate content hash for deduplication
+        # Generate content hash for deduplication (hex so it survives JSON task serialization)
         content_hash = hashlib.sha256(cleaned_content.encode()).hexdigest()
 
         # Create chunks using the text processor